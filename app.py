@@ -1,17 +1,9 @@
 import streamlit as st
 import time
-from core import auth, db
+from core import assets, auth, db, instrumentation, scheduler
 from core.admin_dashboard import admin_dashboard
 from core.member_dashboard import member_dashboard
 from streamlit_lottie import st_lottie
-import json
-import requests
-
-def load_lottieurl(url: str):
-    r = requests.get(url)
-    if r.status_code != 200:
-        return None
-    return r.json()
 
 def load_css(file_name):
     with open(file_name) as f:
@@ -48,7 +40,7 @@ def login_page():
             st.rerun()
 
     with col2:
-        lottie_login = load_lottieurl("https://assets5.lottiefiles.com/packages/lf20_jcikwtux.json")
+        lottie_login = assets.load_lottie("login")
         if lottie_login:
             st_lottie(lottie_login, height=300)
         else:
@@ -83,12 +75,22 @@ def registration_page():
         st.session_state['page'] = 'login'
         st.rerun()
 
+def show_rerun_summary(rerun_counters):
+    """Shows admins how much database work this run of the script did."""
+    totals, rows = instrumentation.summarize_rerun(rerun_counters)
+    with st.sidebar.expander(f"This run: {totals['statements']} queries, {totals['time'] * 1000:.0f} ms"):
+        st.caption(f"{totals['calls']} db calls · {totals['rows']} rows · {totals['connections_opened']} connections opened")
+        for row in rows:
+            st.caption(f"{row['function']}: {row['calls']}× · {row['statements']} queries · {row['time'] * 1000:.1f} ms")
+
 def main():
     """Main function to run the Streamlit app."""
     st.set_page_config(page_title="Welfare Fund Management", layout="wide")
     load_css('style.css')
+    rerun_counters = instrumentation.begin_rerun()
     
     db.setup_database()
+    scheduler.start_in_app() # Rolls recurring dues forward in the background
 
     # Initialize session state for page navigation
     if 'page' not in st.session_state:
@@ -111,13 +113,15 @@ def main():
         # Role-based page rendering
         if st.session_state['role'] == 'Admin':
             admin_dashboard()
+            show_rerun_summary(rerun_counters)
         elif st.session_state['role'] == 'Member':
             member_dashboard()
         else:
             st.error("Unknown role. Please contact support.")
     
     elif st.session_state['page'] == 'login':
-        login_page()
+        with instrumentation.section("Login"):
+            login_page()
     elif st.session_state['page'] == 'register':
         registration_page()
 
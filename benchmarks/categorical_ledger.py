@@ -0,0 +1,61 @@
+"""
+Compares the memory of a ledger DataFrame shaped like db.get_all_payment_logs with Status,
+ListName and Username as Python strings against the categorical encoding core.db returns,
+and times the dashboard-style filters on both.
+
+Usage: python -m benchmarks.categorical_ledger [--rows 1000000] [--users 25000] [--funds 10]
+"""
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from core import db
+
+def build_ledger(rows, users, funds, seed=3):
+    """A synthetic ledger with object-dtype label columns, as pd.read_sql_query returns them."""
+    rng = np.random.default_rng(seed)
+    user_ids = rng.integers(1, users + 1, rows)
+    list_ids = rng.integers(1, funds + 1, rows)
+    statuses = np.array(['Paid', 'Unpaid', 'Pending Verification', 'Rejected'])[rng.choice(4, rows, p=[0.8, 0.15, 0.03, 0.02])]
+    # Each row gets its own str object, as it does when read from SQLite
+    return pd.DataFrame({
+        'Log_ID': np.arange(1, rows + 1),
+        'User_ID': user_ids,
+        'List_ID': list_ids,
+        'Amount': rng.choice([250.0, 500.0, 1000.0, 1500.0], rows),
+        'Status': [str(status) for status in statuses],
+        'Username': [f"member{user_id}" for user_id in user_ids.tolist()],
+        'ListName': [f"Fund {list_id}" for list_id in list_ids.tolist()],
+    })
+
+def time_filters(df, repeat=5):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        df[df['Status'].isin(['Unpaid', 'Rejected', 'Pending Verification'])]
+        df[df['List_ID'] == 3]
+        df[df['ListName'] == 'Fund 3']
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=25_000)
+    parser.add_argument("--funds", type=int, default=10)
+    args = parser.parse_args()
+
+    object_df = build_ledger(args.rows, args.users, args.funds)
+    categorical_df = db.categorize_ledger(object_df.copy())
+
+    print(f"{args.rows:,} rows, {args.users:,} members, {args.funds} funds")
+    print(f"{'column':<10} {'object MB':>10} {'category MB':>12}")
+    object_usage = object_df.memory_usage(deep=True, index=False)
+    categorical_usage = categorical_df.memory_usage(deep=True, index=False)
+    for column in ('Status', 'Username', 'ListName'):
+        print(f"{column:<10} {object_usage[column] / 1024 ** 2:>10.1f} {categorical_usage[column] / 1024 ** 2:>12.1f}")
+    print(f"{'total':<10} {object_usage.sum() / 1024 ** 2:>10.1f} {categorical_usage.sum() / 1024 ** 2:>12.1f}")
+    print(f"filters    {time_filters(object_df) * 1000:>8.1f} ms {time_filters(categorical_df) * 1000:>10.1f} ms")
+
+if __name__ == "__main__":
+    main()
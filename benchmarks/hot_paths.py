@@ -0,0 +1,225 @@
+"""
+Times the core.db and core.dues_logic hot paths against a synthetic database and emits JSON
+with p50/p95 latency, peak Python allocations and SQL statement counts per operation (trigger
+statements included), plus the run's peak RSS.
+
+Usage:
+    python -m benchmarks.hot_paths run [--users 2000 ...] [--repeat 10] [--output results.json]
+    python -m benchmarks.hot_paths compare BASELINE.json CANDIDATE.json [--threshold 0.10]
+
+`compare` exits with status 1 when any operation's p50 regressed by more than the threshold,
+so it can gate a change.
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+import pandas as pd
+from core import db, dues_logic
+from benchmarks.seed import seed_database
+
+class StatementCounter:
+    """Counts SQL statements executed on every pooled connection."""
+
+    def __init__(self):
+        self.count = 0
+
+    def attach(self, conn):
+        conn.set_trace_callback(self._trace)
+
+    def _trace(self, statement):
+        self.count += 1
+
+def _percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, max(0, round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+def build_operations(rng):
+    """
+    Returns (name, setup, operation, mutates) for each hot path. setup() runs untimed before each
+    repetition and returns the operation's arguments; mutating operations get a fresh database copy.
+    """
+    member_ids = [row['User_ID'] for row in db.get_member_users().values()]
+
+    def verify_setup():
+        unverified_df = db.get_unverified_transactions()
+        # Most submissions are on the statement with the right amount; the rest are mismatched or missing
+        statement = unverified_df.sample(frac=0.9, random_state=rng.randint(0, 10 ** 6))
+        amounts = statement['Amount'].where(statement.index % 10 != 0, statement['Amount'] + 1)
+        bank_df = pd.DataFrame({'Reference': statement['Transaction_ID'].astype(str), 'Credit': amounts.astype(str)})
+        return (bank_df.to_csv(index=False),)
+
+    def verify(statement_csv):
+        # The admin "Bulk Verification" flow: import the statement into the ledger, then match against it
+        success, _, error_message = db.import_bank_statement(io.StringIO(statement_csv), 'Reference', 'Credit')
+        if not success:
+            raise RuntimeError(error_message)
+        return db.match_bank_transactions()
+
+    def enroll_setup():
+        ok, error = db.create_fund(f"Bench Fund {rng.random()}", 750.0, 'Monthly', time.strftime('%Y-%m-01'), None)
+        if not ok:
+            raise RuntimeError(error)
+        list_id = int(db.get_fund_options()['List_ID'].max())
+        phone_numbers = list(db.get_member_users().keys())
+        return (list_id, phone_numbers)
+
+    def enroll(list_id, phone_numbers):
+        # The admin "Enroll Members" flow
+        return db.bulk_enroll_members(list_id, phone_numbers)
+
+    return [
+        ("get_all_payment_logs", lambda: (), db.get_all_payment_logs, False),
+        ("get_member_dues", lambda: (rng.choice(member_ids),), db.get_member_dues, False),
+        ("get_reminders_to_send", lambda: (), db.get_reminders_to_send, False),
+        ("get_reminder_digests", lambda: (), db.get_reminder_digests, False),
+        ("update_recurring_dues", lambda: (), dues_logic.update_recurring_dues, True),
+        ("match_bank_transactions", verify_setup, verify, True),
+        ("enroll_members", enroll_setup, enroll, True),
+    ]
+
+def run_benchmarks(db_path, repeat, seed=1):
+    rng = random.Random(seed)
+    work_path = db_path + ".work"
+    counter = StatementCounter()
+
+    def use_copy(source):
+        db.configure_database(work_path).add_connect_hook(counter.attach)
+        # Drop the previous run's WAL files so they are not replayed into the fresh copy
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(work_path + suffix):
+                os.remove(work_path + suffix)
+        shutil.copyfile(source, work_path)
+
+    use_copy(db_path)
+    results = {}
+    for name, setup, operation, mutates in build_operations(rng):
+        timings, statements = [], []
+        peak_alloc = 0
+        for iteration in range(repeat + 1):
+            if mutates:
+                use_copy(db_path)
+            args = setup()
+            counter.count = 0
+            # The extra last iteration runs under tracemalloc, which would distort the timings
+            traced = iteration == repeat
+            if traced:
+                tracemalloc.start()
+            started = time.perf_counter()
+            operation(*args)
+            elapsed = time.perf_counter() - started
+            if traced:
+                peak_alloc = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+            else:
+                timings.append(elapsed)
+                statements.append(counter.count)
+
+        timings.sort()
+        results[name] = {
+            'runs': repeat,
+            'p50_ms': round(_percentile(timings, 0.50) * 1000, 3),
+            'p95_ms': round(_percentile(timings, 0.95) * 1000, 3),
+            'mean_ms': round(statistics.mean(timings) * 1000, 3),
+            'statements': round(statistics.mean(statements), 1),
+            'peak_alloc_mb': round(peak_alloc / 1024 ** 2, 2),
+        }
+        print(f"{name:<24} p50 {results[name]['p50_ms']:>10.2f} ms  p95 {results[name]['p95_ms']:>10.2f} ms  "
+              f"statements {results[name]['statements']:>8}  alloc {results[name]['peak_alloc_mb']:>8.2f} MB", file=sys.stderr)
+
+    db.configure_database(db_path)
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(work_path + suffix):
+            os.remove(work_path + suffix)
+    return results
+
+def run(args):
+    scale = {'users': args.users, 'funds': args.funds, 'funds_per_user': args.funds_per_user,
+             'years': args.years, 'pending': args.pending, 'lag_months': args.lag_months}
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        print(f"Seeding {scale}...", file=sys.stderr)
+        counts = seed_database(db_path, **scale)
+        operations = run_benchmarks(db_path, args.repeat)
+
+    report = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'scale': scale,
+        'rows': counts,
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        'operations': operations,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+    return 0
+
+def compare(args):
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+    if baseline.get('scale') != candidate.get('scale'):
+        print("Warning: the runs used different scales; comparisons may not be meaningful.", file=sys.stderr)
+
+    regressions = []
+    print(f"{'operation':<24} {'base p50':>10} {'new p50':>10} {'change':>8} {'base st':>8} {'new st':>8}")
+    for name, base in baseline['operations'].items():
+        new = candidate['operations'].get(name)
+        if new is None:
+            print(f"{name:<24} missing from candidate")
+            continue
+        change = (new['p50_ms'] - base['p50_ms']) / base['p50_ms'] if base['p50_ms'] else 0.0
+        flag = ""
+        if change > args.threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:<24} {base['p50_ms']:>10.2f} {new['p50_ms']:>10.2f} {change:>+8.1%} "
+              f"{base['statements']:>8} {new['statements']:>8}{flag}")
+
+    if regressions:
+        print(f"\n{len(regressions)} operation(s) regressed by more than {args.threshold:.0%}: {', '.join(regressions)}")
+        return 1
+    return 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="Seed a database, time every hot path and emit JSON.")
+    run_parser.add_argument("--users", type=int, default=2000)
+    run_parser.add_argument("--funds", type=int, default=10)
+    run_parser.add_argument("--funds-per-user", type=int, default=4)
+    run_parser.add_argument("--years", type=int, default=3)
+    run_parser.add_argument("--pending", type=int, default=500)
+    run_parser.add_argument("--lag-months", type=int, default=2)
+    run_parser.add_argument("--repeat", type=int, default=10, help="Timed runs per operation")
+    run_parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    run_parser.set_defaults(handler=run)
+
+    compare_parser = subparsers.add_parser("compare", help="Compare two JSON reports.")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("candidate")
+    compare_parser.add_argument("--threshold", type=float, default=0.10, help="Allowed p50 slowdown, as a fraction")
+    compare_parser.set_defaults(handler=compare)
+
+    args = parser.parse_args(argv)
+    return args.handler(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
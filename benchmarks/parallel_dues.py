@@ -0,0 +1,56 @@
+"""
+Times recurring dues computation on a synthetic 10-year backlog serially and across process
+pools of increasing size, and checks that every parallel run produces exactly the serial rows.
+Only the computation is timed; the single-writer insert is the same in both modes.
+
+Usage: python -m benchmarks.parallel_dues [--users 5000] [--funds 10] [--years 10] [--max-workers N]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import date
+from core import db, dues_logic
+from benchmarks.seed import seed_database
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--funds", type=int, default=10)
+    parser.add_argument("--funds-per-user", type=int, default=4)
+    parser.add_argument("--years", type=int, default=10)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "dues.db")
+        # History stops a month after it starts, so nearly the whole span is backlog
+        seed_database(db_path, users=args.users, funds=args.funds, funds_per_user=args.funds_per_user,
+                      years=args.years, pending=0, lag_months=args.years * 12 - 1)
+        db.configure_database(db_path)
+        latest_logs = db.get_latest_recurring_payment_logs()
+        db.configure_database(os.path.join(tmp, "unused.db"))
+
+    today = date.today()
+    started = time.perf_counter()
+    serial = dues_logic.compute_recurring_dues(latest_logs, today)
+    serial_time = time.perf_counter() - started
+    print(f"{len(latest_logs):,} members x funds, {len(serial):,} new logs")
+    print(f"{'workers':>8} {'seconds':>9} {'speed-up':>9}")
+    print(f"{'serial':>8} {serial_time:>9.2f} {1.0:>8.2f}x")
+
+    workers = 1
+    identical = True
+    while workers <= args.max_workers:
+        started = time.perf_counter()
+        parallel = dues_logic.compute_recurring_dues_parallel(latest_logs, today, workers)
+        elapsed = time.perf_counter() - started
+        identical &= parallel == serial
+        print(f"{workers:>8} {elapsed:>9.2f} {serial_time / elapsed:>8.2f}x{'' if parallel == serial else '  MISMATCH'}")
+        workers *= 2
+
+    return 0 if identical else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,117 @@
+"""
+Compares query plans and timings of the hot Payment_Logs queries before and after
+the index migration, on a synthetic ledger.
+
+Usage: python -m benchmarks.payment_indexes [--rows 1000000] [--repeat 20]
+"""
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from datetime import date
+from dateutil.relativedelta import relativedelta
+from core import db
+
+STATUSES = ['Paid', 'Paid', 'Paid', 'Unpaid', 'Pending Verification', 'Rejected']
+
+# (label, sql, params) for the queries the new indexes are meant to serve
+QUERIES = [
+    ("payment_log_exists",
+     "SELECT 1 FROM Payment_Logs WHERE User_ID = ? AND List_ID = ? AND DueDate = ?",
+     (1234, 3, '2020-06-01')),
+    ("get_latest_payment_log",
+     "SELECT * FROM Payment_Logs WHERE User_ID = ? AND List_ID = ? ORDER BY DueDate DESC LIMIT 1",
+     (1234, 3)),
+    ("get_member_dues",
+     """SELECT pl.Log_ID, fl.ListName, pl.Amount, pl.DueDate, pl.Status
+        FROM Payment_Logs pl JOIN Fund_Lists fl ON pl.List_ID = fl.List_ID
+        WHERE pl.User_ID = ? AND pl.Status IN ('Unpaid', 'Rejected', 'Pending Verification', 'Flagged')
+        ORDER BY pl.DueDate ASC""",
+     (1234,)),
+    ("get_reminders_preview",
+     """SELECT u.Username, u.PhoneNumber FROM Payment_Logs pl JOIN Users u ON pl.User_ID = u.User_ID
+        WHERE pl.Status = 'Unpaid' AND pl.List_ID = ?""",
+     (3,)),
+    ("unverified_by_log",
+     "SELECT ID, Transaction_ID FROM Unverified_Transaction_IDs WHERE Log_ID = ?",
+     (4321,)),
+]
+
+def seed(conn, rows, funds=20):
+    """Fills a fresh database with one log per (member, fund, month) until `rows` logs exist."""
+    rng = random.Random(42)
+    c = conn.cursor()
+    db.MIGRATIONS[0](c)
+    c.executemany("INSERT INTO Fund_Lists (ListName, Amount, Interval_Type, DueDate) VALUES (?, ?, 'Monthly', '2015-01-01')",
+                  [(f"Fund {i}", 500.0) for i in range(1, funds + 1)])
+
+    months = 120
+    members = max(1, rows // (funds * months))
+    c.executemany("INSERT INTO Users (Username, PasswordHash, Role, PhoneNumber) VALUES (?, 'x', 'Member', ?)",
+                  [(f"member{i}", f"+9100000{i:05d}") for i in range(1, members + 1)])
+    user_ids = [r[0] for r in c.execute("SELECT User_ID FROM Users WHERE Role = 'Member'")]
+    due_dates = [(date(2015, 1, 1) + relativedelta(months=m)).strftime('%Y-%m-%d') for m in range(months)]
+
+    def logs():
+        produced = 0
+        for user_id in user_ids:
+            for list_id in range(1, funds + 1):
+                for due_date in due_dates:
+                    if produced >= rows:
+                        return
+                    produced += 1
+                    yield (user_id, list_id, 500.0, due_date, rng.choice(STATUSES))
+
+    c.executemany("INSERT INTO Payment_Logs (User_ID, List_ID, Amount, DueDate, Status) VALUES (?, ?, ?, ?, ?)", logs())
+    c.execute("""
+        INSERT INTO Unverified_Transaction_IDs (Log_ID, Transaction_ID)
+        SELECT Log_ID, printf('%012d', Log_ID) FROM Payment_Logs WHERE Status = 'Pending Verification'
+    """)
+    c.execute("PRAGMA user_version = 1")
+    conn.commit()
+    c.execute("ANALYZE")
+
+def measure(conn, repeat):
+    results = {}
+    for label, sql, params in QUERIES:
+        plan = [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params)]
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            conn.execute(sql, params).fetchall()
+            timings.append(time.perf_counter() - started)
+        timings.sort()
+        results[label] = (plan, timings[len(timings) // 2])
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000, help="Payment_Logs rows to generate")
+    parser.add_argument("--repeat", type=int, default=20, help="Timed runs per query")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = sqlite3.connect(os.path.join(tmp, "bench.db"))
+        print(f"Seeding {args.rows:,} payment logs...")
+        seed(conn, args.rows)
+
+        before = measure(conn, args.repeat)
+        started = time.perf_counter()
+        db.run_migrations(conn)
+        conn.execute("ANALYZE")
+        print(f"Migrations applied in {time.perf_counter() - started:.2f}s\n")
+        after = measure(conn, args.repeat)
+        conn.close()
+
+    for label, _, _ in QUERIES:
+        plan_before, time_before = before[label]
+        plan_after, time_after = after[label]
+        print(f"== {label}: {time_before * 1000:.2f} ms -> {time_after * 1000:.2f} ms "
+              f"({time_before / max(time_after, 1e-9):.0f}x)")
+        print("   before: " + " | ".join(plan_before))
+        print("   after:  " + " | ".join(plan_after))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Generates a synthetic society database at a configurable scale.
+
+Usage: python -m benchmarks.seed OUTPUT.db [--users 2000] [--funds 10] [--funds-per-user 4]
+                                          [--years 3] [--pending 500] [--lag-months 2]
+"""
+import argparse
+import hashlib
+import os
+import random
+import sqlite3
+from datetime import date
+from dateutil.relativedelta import relativedelta
+from core import db, dues_logic
+
+INTERVALS = ['Monthly', 'Monthly', 'Monthly', 'Quarterly', 'Yearly', 'Weekly', 'One-Time']
+
+def seed_database(path, users=2000, funds=10, funds_per_user=4, years=3, pending=500, lag_months=2, seed=42):
+    """
+    Creates a fresh database at `path`. Every member belongs to `funds_per_user` funds and has
+    `years` of payment logs that stop `lag_months` before today, so recurring dues generation
+    has a backlog to catch up on. The latest `pending` logs are submitted for verification.
+    Returns a dict describing what was generated.
+    """
+    rng = random.Random(seed)
+    if os.path.exists(path):
+        os.remove(path)
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    db.run_migrations(conn)
+    c = conn.cursor()
+
+    today = date.today()
+    start = today - relativedelta(years=years)
+    history_end = today - relativedelta(months=lag_months)
+
+    password_hash = hashlib.sha256(b"member123").hexdigest()
+    c.executemany("INSERT INTO Users (Username, PasswordHash, Role, PhoneNumber, Email) VALUES (?, ?, 'Member', ?, ?)",
+                  [(f"member{i}", password_hash, f"+91{9000000000 + i}", f"member{i}@example.com" if i % 3 else None)
+                   for i in range(1, users + 1)])
+    user_ids = [row[0] for row in c.execute("SELECT User_ID FROM Users WHERE Role = 'Member'")]
+
+    fund_rows = [(f"Fund {i}", float(rng.choice([250, 500, 1000, 1500])), INTERVALS[i % len(INTERVALS)],
+                  f"fund{i}@upi", start.strftime('%Y-%m-%d')) for i in range(1, funds + 1)]
+    c.executemany("INSERT INTO Fund_Lists (ListName, Amount, Interval_Type, VPA, DueDate) VALUES (?, ?, ?, ?, ?)", fund_rows)
+    fund_info = [(row['List_ID'], row['Amount'], row['Interval_Type'])
+                 for row in c.execute("SELECT List_ID, Amount, Interval_Type FROM Fund_Lists")]
+
+    # Each fund's schedule of due dates up to the end of the generated history
+    schedules = {}
+    for list_id, _, interval in fund_info:
+        due_dates = [start]
+        while interval != 'One-Time':
+            next_due = dues_logic.get_next_due_date(due_dates[-1], interval)
+            if next_due > history_end:
+                break
+            due_dates.append(next_due)
+        schedules[list_id] = [d.strftime('%Y-%m-%d') for d in due_dates]
+
+    memberships = []
+    for user_id in user_ids:
+        for list_id, _, _ in rng.sample(fund_info, min(funds_per_user, len(fund_info))):
+            memberships.append((user_id, list_id))
+    c.executemany("INSERT INTO Memberships (User_ID, List_ID) VALUES (?, ?)", memberships)
+
+    amounts = {list_id: amount for list_id, amount, _ in fund_info}
+
+    def payment_logs():
+        for user_id, list_id in memberships:
+            schedule = schedules[list_id]
+            for index, due_date in enumerate(schedule):
+                recent = index >= len(schedule) - 2
+                if not recent or rng.random() < 0.6:
+                    yield (user_id, list_id, amounts[list_id], due_date, due_date, 'Paid')
+                else:
+                    yield (user_id, list_id, amounts[list_id], due_date, None, 'Unpaid')
+
+    c.executemany("INSERT INTO Payment_Logs (User_ID, List_ID, Amount, DueDate, PaymentDate, Status) VALUES (?, ?, ?, ?, ?, ?)",
+                  payment_logs())
+
+    pending_ids = [row[0] for row in c.execute(
+        "SELECT Log_ID FROM Payment_Logs WHERE Status = 'Unpaid' ORDER BY Log_ID DESC LIMIT ?", (pending,))]
+    submissions = [(log_id, f"{400000000000 + log_id:012d}") for log_id in pending_ids]
+    c.executemany("UPDATE Payment_Logs SET Status = 'Pending Verification', Transaction_ID = ? WHERE Log_ID = ?",
+                  [(txn_id, log_id) for log_id, txn_id in submissions])
+    c.executemany("INSERT INTO Unverified_Transaction_IDs (Log_ID, Transaction_ID) VALUES (?, ?)", submissions)
+
+    conn.commit()
+    counts = {table: c.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+              for table in ('Users', 'Fund_Lists', 'Memberships', 'Payment_Logs', 'Unverified_Transaction_IDs')}
+    c.execute("ANALYZE")
+    conn.close()
+    return counts
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("output", help="Database file to create (overwritten if it exists)")
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--funds", type=int, default=10)
+    parser.add_argument("--funds-per-user", type=int, default=4)
+    parser.add_argument("--years", type=int, default=3)
+    parser.add_argument("--pending", type=int, default=500)
+    parser.add_argument("--lag-months", type=int, default=2, help="How far behind today the generated history stops")
+    args = parser.parse_args()
+
+    counts = seed_database(args.output, args.users, args.funds, args.funds_per_user, args.years, args.pending, args.lag_months)
+    for table, count in counts.items():
+        print(f"{table:<28} {count:>10,}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Compares peak memory and time of reconciling a large bank statement loaded whole with
+pd.read_csv against the chunked streaming reader. Each mode runs in its own process so
+peak RSS is measured independently.
+
+Usage: python -m benchmarks.statement_ingestion [--size-mb 1024] [--pending 5000]
+"""
+import argparse
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import pandas as pd
+from core import reconciliation
+
+def generate_statement(path, size_mb, pending, seed=7):
+    """Writes a statement CSV of roughly `size_mb` MB and returns `pending` submissions drawn from it."""
+    rng = random.Random(seed)
+    target = size_mb * 1024 * 1024
+    submissions = []
+    with open(path, "w") as f:
+        f.write("Date,Narration,Reference No,Value Date,Withdrawal Amt,Deposit Amt,Closing Balance\n")
+        line_no = 0
+        while f.tell() < target:
+            rows = []
+            for _ in range(10_000):
+                line_no += 1
+                txn_id = str(100_000_000_000 + line_no)
+                amount = rng.choice(["500", "1000", "1500.50", "250"])
+                rows.append(f"2025-{line_no % 12 + 1:02d}-{line_no % 28 + 1:02d},UPI/{txn_id}/PAYMENT FROM MEMBER {line_no % 5000}/OKAXIS,"
+                            f"{txn_id},2025-01-01,,{amount},{1_000_000 + line_no}.00\n")
+                if len(submissions) < pending and rng.random() < 0.001:
+                    submissions.append((txn_id, float(amount)))
+            f.writelines(rows)
+    return submissions
+
+def run_mode(mode, path, pending_path):
+    unverified_df = pd.read_csv(pending_path, dtype={'Transaction_ID': str})
+    started = time.perf_counter()
+    if mode == "full":
+        bank_df = pd.read_csv(path)
+        lookup = reconciliation.build_statement_lookup(bank_df, "Reference No", "Deposit Amt")
+    else:
+        with open(path, "rb") as f:
+            lookup = reconciliation.stream_statement_lookup(f, "Reference No", "Deposit Amt",
+                                                            wanted_ids=unverified_df['Transaction_ID'])
+    result = reconciliation.reconcile(unverified_df, lookup)
+    elapsed = time.perf_counter() - started
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(f"{mode},{elapsed:.2f},{peak_kb},{int(result['Approved'].sum())}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=int, default=1024, help="Approximate statement size to generate")
+    parser.add_argument("--pending", type=int, default=5000, help="Pending submissions to reconcile")
+    parser.add_argument("--run-mode", choices=["full", "streaming"], help=argparse.SUPPRESS)
+    parser.add_argument("--statement", help=argparse.SUPPRESS)
+    parser.add_argument("--pending-file", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_mode:
+        run_mode(args.run_mode, args.statement, args.pending_file)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        statement_path = os.path.join(tmp, "statement.csv")
+        pending_path = os.path.join(tmp, "pending.csv")
+        print(f"Generating a {args.size_mb} MB statement...")
+        submissions = generate_statement(statement_path, args.size_mb, args.pending)
+        pd.DataFrame({
+            'ID': range(1, len(submissions) + 1),
+            'Log_ID': range(1, len(submissions) + 1),
+            'Transaction_ID': [txn_id for txn_id, _ in submissions],
+            'Username': 'member',
+            'ListName': 'Maintenance',
+            'Amount': [amount for _, amount in submissions],
+        }).to_csv(pending_path, index=False)
+        print(f"Statement: {os.path.getsize(statement_path) / 1024 ** 2:.0f} MB, {len(submissions)} pending submissions\n")
+
+        print(f"{'mode':<10} {'seconds':>8} {'peak RSS (MB)':>14} {'approved':>9}")
+        for mode in ("full", "streaming"):
+            output = subprocess.run(
+                [sys.executable, "-m", "benchmarks.statement_ingestion", "--run-mode", mode,
+                 "--statement", statement_path, "--pending-file", pending_path],
+                capture_output=True, text=True, check=True,
+            ).stdout.strip().splitlines()[-1]
+            _, seconds, peak_kb, approved = output.split(",")
+            print(f"{mode:<10} {float(seconds):>8.2f} {int(peak_kb) / 1024:>14.0f} {approved:>9}")
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,8 @@
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
 import streamlit as st
 import pandas as pd
 from datetime import datetime
-import webbrowser
-from urllib.parse import quote
-import time
-from core import db
+from core import assets, db, instrumentation, notifications, qr_cache, reconciliation, scheduler
+from core.widgets import paged_dataframe
 
 def create_dashboard_card(icon, title, value, description):
     st.markdown(
@@ -22,40 +17,109 @@ def create_dashboard_card(icon, title, value, description):
         unsafe_allow_html=True,
     )
 
+PHONE_COLUMN_NAMES = ('phonenumber', 'phone number', 'phone')
+
+def read_phone_number_csv(uploaded_file, chunksize=10_000):
+    """
+    Returns a generator over the phone numbers in an uploaded CSV, read in chunks and kept as text.
+    The first row is a header only if it names a phone column; otherwise the first column is read
+    from the first row on. Errors in the first row, e.g. an empty file, are raised here.
+    """
+    first_row = [str(cell).strip().lower() for cell in pd.read_csv(uploaded_file, header=None, nrows=1, dtype=str).iloc[0]]
+    uploaded_file.seek(0)
+    column = next((i for i, cell in enumerate(first_row) if cell in PHONE_COLUMN_NAMES), None)
+    has_header = column is not None
+    return _phone_numbers(uploaded_file, column if has_header else 0, 1 if has_header else 0, chunksize)
+
+def _phone_numbers(uploaded_file, column, skiprows, chunksize):
+    for chunk in pd.read_csv(uploaded_file, header=None, skiprows=skiprows, usecols=[column], dtype=str, chunksize=chunksize):
+        for phone_number in chunk[column].dropna():
+            phone_number = phone_number.strip()
+            if phone_number:
+                yield phone_number
+
+@st.fragment(run_every=3)
+def reminder_progress(batch_id):
+    """Polls the outbox for the progress of the last reminder batch without rerunning the whole page."""
+    notifications.get_dispatcher() # Restarts delivery if the process was restarted since queueing
+    progress_df = db.get_outbox_progress(batch_id)
+    if progress_df.empty:
+        return
+
+    counts = progress_df.groupby('Status')['Messages'].sum()
+    total = int(counts.sum())
+    done = int(counts.get('Sent', 0) + counts.get('Failed', 0))
+    st.progress(done / total, text=f"Reminders processed: {done} of {total}")
+    st.dataframe(progress_df.pivot_table(index='Channel', columns='Status', values='Messages', fill_value=0), width='stretch')
+
+    if done == total:
+        st.success(f"All reminders processed! Sent {int(counts.get('Sent', 0))} message(s).")
+        failures_df = db.get_outbox_failures(batch_id)
+        if not failures_df.empty:
+            st.warning("The following reminders could not be delivered:")
+            st.dataframe(failures_df, width='stretch')
+
+@st.fragment(run_every=5)
+def dues_run_status():
+    """Shows the latest dues generation runs, refreshing while one is in progress."""
+    scheduler.start_in_app() # Starts the scheduler if this process hasn't yet
+    runs_df = db.get_dues_runs()
+    if runs_df.empty:
+        st.caption("Dues have not been generated yet.")
+        return
+
+    latest = runs_df.iloc[0]
+    if latest['Status'] == 'Running':
+        progress = latest['Funds_Processed'] / latest['Funds_Total'] if latest['Funds_Total'] else 0.0
+        st.progress(progress, text=f"Generating dues: {latest['Funds_Processed']} of {latest['Funds_Total']} funds, {latest['Logs_Created']} new log(s)")
+    elif latest['Status'] == 'Failed':
+        st.error(f"The last run failed at {latest['Finished_At']}: {latest['Error']}")
+    else:
+        st.caption(f"Last run {latest['Status'].lower()} at {latest['Finished_At']} UTC in {latest['Duration_Seconds'] or 0:.1f} s, creating {latest['Logs_Created']} new payment log(s).")
+    with st.expander("Run History"):
+        st.dataframe(runs_df, width='stretch', hide_index=True)
+
 def admin_dashboard():
     st.header(f"Admin Dashboard | Welcome, {st.session_state['username']}")
 
-    all_logs_df = db.get_all_payment_logs()
-
-    tab1, tab2, tab3, tab4 = st.tabs(["📊 Dashboard", "👥 Management", "🔔 Notifications", "🏦 Bulk Verification"])
-
-    # --- FINANCIAL DASHBOARD ---
-    with tab1:
+    # Only the selected section runs, unlike st.tabs which runs every tab on each rerun. Each section
+    # is a fragment too, so a widget inside one reruns just that section and its own queries.
+    selected = st.segmented_control("Section", list(ADMIN_SECTIONS), default="📊 Dashboard",
+                                    key="admin_section", label_visibility="collapsed")
+    # Clicking the selected option again clears it; keep showing the dashboard rather than nothing
+    ADMIN_SECTIONS[selected or "📊 Dashboard"]()
+
+@st.fragment
+def financial_overview():
+    """Totals, collection trends and the outstanding members of a fund."""
+    with instrumentation.section("Admin / Dashboard"):
         st.subheader("Financial Overview")
+
+        status_totals_df = db.get_status_totals().set_index('Status')
         
-        if all_logs_df.empty:
+        if status_totals_df.empty:
             st.info("No financial data available yet.")
         else:
-            total_logs = len(all_logs_df)
-            paid_logs = all_logs_df[all_logs_df['Status'] == 'Paid']
-            total_paid_count = len(paid_logs)
+            total_logs = status_totals_df['LogCount'].sum()
+            total_paid_count = status_totals_df['LogCount'].get('Paid', 0)
             collection_rate = (total_paid_count / total_logs) * 100 if total_logs > 0 else 0
-            total_collected = paid_logs['Amount'].sum()
-            total_delinquency = all_logs_df[all_logs_df['Status'].isin(['Unpaid', 'Pending Verification', 'Rejected'])]['Amount'].sum()
+            total_collected = status_totals_df['TotalAmount'].get('Paid', 0)
+            total_delinquency = status_totals_df['TotalAmount'].reindex(['Unpaid', 'Pending Verification', 'Rejected']).sum()
 
             col1, col2, col3 = st.columns(3)
             with col1:
-                create_dashboard_card("https://img.icons8.com/plasticine/100/000000/money-bag.png", "Collection Rate", f"{collection_rate:.2f}%", "of total dues collected")
+                create_dashboard_card(assets.icon_url("money-bag"), "Collection Rate", f"{collection_rate:.2f}%", "of total dues collected")
             with col2:
-                create_dashboard_card("https://img.icons8.com/plasticine/100/000000/initiate-money-transfer.png", "Total Collected", f"₹{total_collected:,.2f}", "in total revenue")
+                create_dashboard_card(assets.icon_url("initiate-money-transfer"), "Total Collected", f"₹{total_collected:,.2f}", "in total revenue")
             with col3:
-                create_dashboard_card("https://img.icons8.com/plasticine/100/000000/request-money.png", "Outstanding Dues", f"₹{total_delinquency:,.2f}", "in outstanding payments")
+                create_dashboard_card(assets.icon_url("request-money"), "Outstanding Dues", f"₹{total_delinquency:,.2f}", "in outstanding payments")
 
             st.divider()
             st.subheader("Collection Trends")
-            if not paid_logs.empty:
-                paid_logs['PaymentDate'] = pd.to_datetime(paid_logs['PaymentDate'])
-                monthly_collections = paid_logs.set_index('PaymentDate').groupby(pd.Grouper(freq='M'))['Amount'].sum()
+            monthly_df = db.get_monthly_collections()
+            if not monthly_df.empty:
+                monthly_df['Month'] = pd.to_datetime(monthly_df['Month'], format='%Y-%m')
+                monthly_collections = monthly_df.set_index('Month')['Amount'].resample('M').sum()
                 st.bar_chart(monthly_collections)
             else:
                 st.info("No paid transactions to display trends.")
@@ -67,13 +131,22 @@ def admin_dashboard():
                 fund_map_financials = dict(zip(fund_options_financials['ListName'], fund_options_financials['List_ID']))
                 selected_fund_name_financials = st.selectbox("Select a fund to view outstanding members", fund_options_financials['ListName'])
                 selected_list_id_financials = fund_map_financials[selected_fund_name_financials]
-                outstanding_df = all_logs_df[(all_logs_df['List_ID'] == selected_list_id_financials) & (all_logs_df['Status'].isin(['Unpaid', 'Pending Verification', 'Rejected']))]
-                st.dataframe(outstanding_df[['Username', 'PhoneNumber', 'Amount', 'DueDate', 'Status']], width='stretch')
+                outstanding_statuses = ['Unpaid', 'Pending Verification', 'Rejected']
+                st.caption(f"{db.count_ledger_rows(statuses=outstanding_statuses, list_id=selected_list_id_financials)} outstanding payment log(s)")
+                paged_dataframe(
+                    "outstanding_members",
+                    lambda cursor, page_size: db.get_ledger_page(statuses=outstanding_statuses, list_id=selected_list_id_financials,
+                                                                 cursor=cursor, page_size=page_size, as_arrow=True),
+                    filters=(selected_list_id_financials,),
+                    columns=['Username', 'PhoneNumber', 'Amount', 'DueDate', 'Status'],
+                )
             else:
                 st.warning("No funds available to filter by.")
 
-    # --- MEMBER & FUND MANAGEMENT ---
-    with tab2:
+@st.fragment
+def management_panel():
+    """Funds, enrollment, recurring dues generation and membership removal."""
+    with instrumentation.section("Admin / Management"):
         fund_options = db.get_fund_options()
         fund_map = {row.ListName: row.List_ID for row in fund_options.itertuples(index=False)}
 
@@ -102,36 +175,30 @@ def admin_dashboard():
         st.subheader("Bulk Member Enrollment")
         if not fund_options.empty:
             selected_fund_name_enroll = st.selectbox("Select Fund to Enroll Members In", fund_options['ListName'], key="enroll_fund_select")
-            member_ids_str = st.text_area("Enter Member Phone Numbers (comma-separated)", help="Paste a list of registered member phone numbers, separated by commas. e.g., +11234567890,+12345678901")
+            phone_csv = st.file_uploader("Upload Member Phone Numbers (CSV file)", type=['csv'], key="enroll_csv",
+                                         help="One phone number per row. A column headed 'PhoneNumber' (or 'Phone') is used if present, otherwise the first column, with no header row.")
+            member_ids_str = st.text_area("Or enter Member Phone Numbers (comma-separated)", help="Paste a list of registered member phone numbers, separated by commas. e.g., +11234567890,+12345678901")
             if st.button("Enroll Members"):
-                if selected_fund_name_enroll and member_ids_str:
-                    member_phone_numbers = [phone.strip() for phone in member_ids_str.split(',') if phone.strip()]
+                if selected_fund_name_enroll and (phone_csv or member_ids_str):
+                    member_phone_numbers, error_message = None, None
+                    if phone_csv:
+                        try:
+                            member_phone_numbers = read_phone_number_csv(phone_csv)
+                        except (pd.errors.ParserError, pd.errors.EmptyDataError, UnicodeDecodeError) as e:
+                            error_message = f"Could not read the phone number CSV: {e}"
+                    else:
+                        member_phone_numbers = (phone.strip() for phone in member_ids_str.split(',') if phone.strip())
                     selected_list_id = fund_map[selected_fund_name_enroll]
-                    
-                    fund_info = db.get_fund_details(selected_list_id)
-                    due_amount = fund_info['Amount']
-                    due_date = fund_info['DueDate']
-                    
-                    member_users = db.get_member_users()
-
-                    users_to_enroll = []
-                    failed_enrollments = []
-                    for phone_number in member_phone_numbers:
-                        if phone_number in member_users:
-                            users_to_enroll.append((member_users[phone_number]['User_ID'], selected_list_id))
-                        else:
-                            failed_enrollments.append(phone_number)
 
-                    newly_enrolled_user_ids = [u[0] for u in users_to_enroll]
-                    payment_logs_to_create = []
-                    for user_id in newly_enrolled_user_ids:
-                        if not db.payment_log_exists(user_id, selected_list_id, due_date):
-                            payment_logs_to_create.append((user_id, selected_list_id, due_amount, due_date, 'Unpaid'))
-                    
-                    success, error_message = db.enroll_members(users_to_enroll, payment_logs_to_create)
+                    if member_phone_numbers is None:
+                        success = False
+                    else:
+                        last_log_id = db.get_max_log_id()
+                        success, enrolled, failed_enrollments, error_message = db.bulk_enroll_members(selected_list_id, member_phone_numbers)
 
                     if success:
-                        successful_enrollments = [f"{member_users[phone]['Username']} ({phone})" for phone in member_phone_numbers if phone not in failed_enrollments]
+                        qr_cache.pregenerate_in_background(db.get_unpaid_payment_details(last_log_id))
+                        successful_enrollments = [f"{username} ({phone})" for username, phone in enrolled]
                         if successful_enrollments:
                             st.success(f"Successfully enrolled {len(successful_enrollments)} members: {', '.join(successful_enrollments)}")
                         if failed_enrollments:
@@ -144,21 +211,20 @@ def admin_dashboard():
         st.divider()
 
         st.subheader("Recurring Dues Generation")
-        st.info("This will check all recurring funds (Yearly, Monthly, etc.) and generate new payment logs for members if the next billing period has arrived. It will also compound any unpaid dues from the previous period.")
-        if st.button("Generate Recurring Dues"):
-            with st.spinner("Processing... This may take a moment."):
-                try:
-                    from core import dues_logic
-                    new_logs = dues_logic.update_recurring_dues()
-                    if new_logs > 0:
-                        st.success(f"Recurring dues updated successfully. {new_logs} new payment log(s) were created.")
-                    else:
-                        st.info("No new recurring dues to generate at this time.")
-                    time.sleep(2) 
-                    st.rerun()
-                except Exception as e:
-                    st.error(f"An error occurred while generating dues: {e}")
-        
+        st.info("Recurring funds (Yearly, Monthly, etc.) are checked in the background on the cadence below, and new payment logs are generated for members once the next billing period has arrived. Unpaid dues from the previous period are compounded.")
+        with st.expander("Configure Schedule"):
+            with st.form("dues_schedule_form"):
+                cadences = {interval_type: st.number_input(f"{interval_type} funds: check every (hours, 0 to disable)",
+                                                           min_value=0.0, value=scheduler.get_cadence_hours(interval_type), step=1.0)
+                            for interval_type in scheduler.INTERVAL_TYPES}
+                if st.form_submit_button("Save Schedule"):
+                    for interval_type, hours in cadences.items():
+                        db.set_setting(f"dues_cadence_hours_{interval_type}", str(hours))
+                    st.success("Schedule saved!")
+        if st.button("Generate Recurring Dues Now"):
+            scheduler.request_run()
+            st.toast("Dues generation started in the background.")
+        dues_run_status()
         st.divider()
 
         # --- Remove Member from Fund ---
@@ -207,8 +273,10 @@ def admin_dashboard():
         else:
             st.warning("No funds to delete.")
 
-    # --- NOTIFICATIONS TAB ---
-    with tab3:
+@st.fragment
+def notifications_panel():
+    """SMTP settings and payment reminders."""
+    with instrumentation.section("Admin / Notifications"):
         st.subheader("Email Reminder Configuration")
         with st.expander("Configure SMTP Server"):
             with st.form("smtp_config_form"):
@@ -224,7 +292,7 @@ def admin_dashboard():
                     st.success("SMTP configuration saved!")
                     
         st.subheader("Send Payment Reminders")
-        st.warning("This will attempt to open the WhatsApp desktop app for **each** reminder and send emails if configured. Please ensure you are logged into WhatsApp.")
+        st.warning("Reminders are queued and sent in the background: the WhatsApp desktop app is opened for **each** message and emails are sent if configured. Please ensure you are logged into WhatsApp.")
         
         fund_options_reminders = db.get_fund_options()
         fund_list_reminders = {row.ListName: row.List_ID for row in fund_options_reminders.itertuples(index=False)}
@@ -233,85 +301,56 @@ def admin_dashboard():
         selected_fund_name_reminder = st.selectbox("Select Fund to Send Reminders For", options=list(fund_list_reminders.keys()), index=len(fund_list_reminders)-1)
         
         selected_list_id_reminder = fund_list_reminders[selected_fund_name_reminder]
-        
-        reminders_preview_df = db.get_reminders_preview(selected_list_id_reminder or None)
 
-        if not reminders_preview_df.empty:
-            with st.expander(f"Members to be notified ({len(reminders_preview_df)}):"):
-                st.dataframe(reminders_preview_df, width='stretch')
+        digest_mode = st.toggle("Send one digest per member", value=True,
+                                help="Combines all of a member's unpaid dues into a single message instead of one message per payment log.")
+        if digest_mode:
+            window_hours = st.number_input("Skip members reminded in the last (hours, 0 to remind everyone)",
+                                           min_value=0.0, value=notifications.get_reminder_window_hours(), step=1.0)
+            if window_hours != notifications.get_reminder_window_hours():
+                db.set_setting("reminder_window_hours", str(window_hours))
+            digests_df = db.get_reminder_digests(selected_list_id_reminder or None, window_hours)
+            if not digests_df.empty:
+                with st.expander(f"Members to be notified ({len(digests_df)}, covering {int(digests_df['Periods'].sum())} unpaid or rejected log(s)):"):
+                    st.dataframe(digests_df[['Username', 'PhoneNumber', 'Funds', 'Periods', 'Total_Amount']], width='stretch')
+            else:
+                st.info("No members with unpaid dues who have not been reminded recently.")
         else:
-            st.info("No members with unpaid dues for the selected fund.")
+            reminders_preview_df = db.get_reminders_preview(selected_list_id_reminder or None)
 
-        if st.button("Send Reminders"):
-            smtp_server_val = db.get_setting("smtp_server")
-            smtp_port_val = db.get_setting("smtp_port")
-            smtp_user_val = db.get_setting("smtp_user")
-            smtp_password_val = db.get_setting("smtp_password")
+            if not reminders_preview_df.empty:
+                with st.expander(f"Members to be notified ({len(reminders_preview_df)}):"):
+                    st.dataframe(reminders_preview_df, width='stretch')
+            else:
+                st.info("No members with unpaid dues for the selected fund.")
 
-            reminders_to_send = db.get_reminders_to_send(selected_list_id_reminder or None)
+        if st.button("Send Reminders"):
+            if digest_mode:
+                reminders_to_send = db.get_reminder_digests(selected_list_id_reminder or None, window_hours).to_dict('records')
+            else:
+                reminders_to_send = db.get_reminders_to_send(selected_list_id_reminder or None)
 
             if not reminders_to_send:
                 st.info("No reminders due to be sent for the selected criteria.")
             else:
-                st.info(f"Preparing to send {len(reminders_to_send)} reminders...")
-
-                whatsapp_reminders = 0
-                email_reminders = 0
-
-                # Set up SMTP connection if configured
-                server = None
-                if smtp_server_val and smtp_port_val and smtp_user_val and smtp_password_val:
-                    try:
-                        server = smtplib.SMTP(smtp_server_val, int(smtp_port_val))
-                        server.starttls()
-                        server.login(smtp_user_val, smtp_password_val)
-                        st.write("✅ SMTP server connected.")
-                    except Exception as e:
-                        st.error(f"Could not connect to SMTP server: {e}")
-                
-                for reminder in reminders_to_send:
-                    # --- WhatsApp Reminder ---
-                    message = f"Hi {reminder['Username']}, this is a friendly reminder that your contribution of ₹{reminder['Amount']} for '{reminder['ListName']}' is due. Please pay via the portal. Thank you!"
-                    encoded_message = quote(message)
-                    whatsapp_url = f"whatsapp://send?phone={reminder['PhoneNumber']}&text={encoded_message}"
-                    
-                    try:
-                        with st.spinner(f"Opening WhatsApp for {reminder['Username']}..."):
-                            webbrowser.open(whatsapp_url)
-                            time.sleep(10)
-                        
-                        db.log_notification(reminder['User_ID'], reminder['List_ID'])
-                        st.write(f"✅ WhatsApp reminder for {reminder['Username']} prepared.")
-                        whatsapp_reminders += 1
-
-                    except Exception as e:
-                        st.error(f"Could not open WhatsApp for {reminder['Username']}: {e}")
-
-                    # --- Email Reminder ---
-                    if reminder['Email'] and server:
-                        try:
-                            msg = MIMEMultipart()
-                            msg['From'] = smtp_user_val
-                            msg['To'] = reminder['Email']
-                            msg['Subject'] = f"Payment Reminder: {reminder['ListName']}"
-                            
-                            body = f"Dear {reminder['Username']},\n\nThis is a friendly reminder that your contribution of ₹{reminder['Amount']} for '{reminder['ListName']}' is due.\n\nPlease make the payment at your earliest convenience.\n\nThank you,\nSociety Welfare Committee"
-                            msg.attach(MIMEText(body, 'plain'))
-                            
-                            server.send_message(msg)
-                            st.write(f"✅ Email reminder sent to {reminder['Username']} at {reminder['Email']}.")
-                            email_reminders += 1
-                        except Exception as e:
-                            st.error(f"Could not send email to {reminder['Username']}: {e}")
-
-                if server:
-                    server.quit()
-
-                st.success(f"All reminders processed! Sent {whatsapp_reminders} WhatsApp reminders and {email_reminders} email reminders.")
-    # --- BULK VERIFICATION TAB ---
-    with tab4:
+                email_enabled = bool(db.get_setting("smtp_server") and db.get_setting("smtp_port"))
+                enqueue = notifications.enqueue_reminder_digests if digest_mode else notifications.enqueue_reminders
+                try:
+                    batch_id, queued = enqueue(reminders_to_send, email_enabled)
+                    st.session_state['reminder_batch_id'] = batch_id
+                    st.success(f"Queued {queued} message(s) for {len(reminders_to_send)} reminder(s). They are sent in the background; you can keep working.")
+                except Exception as e:
+                    st.error(f"Could not queue reminders: {e}")
+
+        if st.session_state.get('reminder_batch_id'):
+            reminder_progress(st.session_state['reminder_batch_id'])
+
+@st.fragment
+def bulk_verification_panel():
+    """Cross-verifies submitted transaction IDs against an uploaded bank statement."""
+    with instrumentation.section("Admin / Bulk Verification"):
         st.subheader("Transaction ID Bulk Verification")
-        st.info("Here you can verify payments submitted with just a transaction ID by uploading your bank statement.")
+        st.info("Import your bank statements here. Their lines are kept in a bank ledger, so overlapping exports only add the new lines, and payments submitted later are verified against the ledger as soon as they arrive.")
         
         unverified_txns_df = db.get_unverified_transactions()
         
@@ -320,42 +359,50 @@ def admin_dashboard():
         else:
             st.write(f"**{len(unverified_txns_df)} transactions pending verification:**")
             st.dataframe(unverified_txns_df[['Transaction_ID', 'Username', 'ListName', 'Amount']], width='stretch')
+
+        ledger = db.get_bank_ledger_summary()
+        if ledger['lines']:
+            st.caption(f"Bank ledger: {ledger['lines']:,} statement line(s), last imported {ledger['last_imported']} (UTC). Submissions not on it yet stay pending until a later import.")
         
-            st.divider()
+        st.divider()
+    
+        uploaded_statement = st.file_uploader("Upload Bank Statement (CSV file)", type=['csv'])
         
-            uploaded_statement = st.file_uploader("Upload Bank Statement (CSV file)", type=['csv'])
-            
-            if uploaded_statement:
-                try:
-                    bank_df = pd.read_csv(uploaded_statement)
-                    st.write("**Bank Statement Preview:**")
-                    st.dataframe(bank_df.head(), width='stretch')
+        if uploaded_statement:
+            try:
+                preview_df = reconciliation.read_statement_preview(uploaded_statement)
+                st.write("**Bank Statement Preview:**")
+                st.dataframe(preview_df, width='stretch')
+
+                txn_id_column = st.selectbox("Which column contains the Transaction IDs?", preview_df.columns)
+                amount_column = st.selectbox("Which column contains the Amount?", preview_df.columns)
+                
+                if st.button("Import Statement and Verify"):
+                    if txn_id_column and amount_column:
+                        uploaded_statement.seek(0)
+                        success, imported, error_message = db.import_bank_statement(uploaded_statement, txn_id_column, amount_column, uploaded_statement.name)
+                        if success:
+                            st.info(f"Imported {imported} new statement line(s); lines already in the ledger were skipped.")
+                            success, found_txns_details, rejected_txns, error_message = db.match_bank_transactions()
 
-                    txn_id_column = st.selectbox("Which column contains the Transaction IDs?", bank_df.columns)
-                    amount_column = st.selectbox("Which column contains the Amount?", bank_df.columns)
-                    
-                    if st.button("Cross-Verify Transactions"):
-                        if txn_id_column and amount_column:
-                            success, found_txns_details, rejected_txns, error_message = db.verify_transactions(unverified_txns_df, bank_df, txn_id_column, amount_column)
-
-                            if success:
-                                st.success(f"Verification complete! {len(found_txns_details)} transactions were approved and {len(rejected_txns)} were rejected.")
-                                
-                                if found_txns_details:
-                                    st.subheader("Newly Verified Transactions")
-                                    st.dataframe(pd.DataFrame(found_txns_details), width='stretch')
-                                
-                                if rejected_txns:
-                                    st.warning("The following transactions were rejected:")
-                                    st.dataframe(pd.DataFrame(rejected_txns))
-                                
-                                if st.button("Acknowledge and Refresh"):
-                                    st.rerun()
-                            else:
-                                st.error(f"An error occurred during verification: {error_message}")
-        
-                except Exception as e:
-                    st.error(f"Failed to process the uploaded file: {e}")
+                        if success:
+                            st.success(f"Verification complete! {len(found_txns_details)} transactions were approved and {len(rejected_txns)} were rejected.")
+                            
+                            if found_txns_details:
+                                st.subheader("Newly Verified Transactions")
+                                st.dataframe(pd.DataFrame(found_txns_details), width='stretch')
+                            
+                            if rejected_txns:
+                                st.warning("The following transactions were rejected:")
+                                st.dataframe(pd.DataFrame(rejected_txns))
+                            
+                            if st.button("Acknowledge and Refresh"):
+                                st.rerun()
+                        else:
+                            st.error(f"An error occurred during verification: {error_message}")
+    
+            except Exception as e:
+                st.error(f"Failed to process the uploaded file: {e}")
 
         st.divider()
         
@@ -376,4 +423,59 @@ def admin_dashboard():
                     st.success("Successfully cleared all verified transaction history!")
                     st.rerun()
                 else:
-                    st.error(f"An error occurred: {error_message}")
\ No newline at end of file
+                    st.error(f"An error occurred: {error_message}")
+
+@st.fragment
+def diagnostics_panel():
+    with instrumentation.section("Admin / Diagnostics"):
+        st.subheader("Query Diagnostics")
+        st.caption(f"Cumulative since the app started or was last reset. Statements slower than {instrumentation.SLOW_QUERY_MS} ms are logged below.")
+
+        stats_df = pd.DataFrame(instrumentation.function_stats())
+        if stats_df.empty:
+            st.info("No queries recorded yet.")
+        else:
+            stats_df['time_ms'] = (stats_df['time'] * 1000).round(1)
+            stats_df['statement_time_ms'] = (stats_df['statement_time'] * 1000).round(1)
+            by_function = stats_df.groupby('function')[['calls', 'statements', 'rows', 'connections_opened', 'time_ms', 'statement_time_ms']].sum()
+            st.write("**By function**")
+            st.dataframe(by_function.sort_values('time_ms', ascending=False), width='stretch')
+            st.write("**By page / tab**")
+            st.dataframe(stats_df.groupby('section')[['calls', 'statements', 'rows', 'time_ms']].sum(), width='stretch')
+
+        sections_df = pd.DataFrame(instrumentation.section_stats())
+        if not sections_df.empty:
+            st.write("**Section render time**")
+            sections_df['avg_ms'] = (sections_df['time'] / sections_df['renders'] * 1000).round(1)
+            sections_df['max_ms'] = (sections_df['max_time'] * 1000).round(1)
+            sections_df['last_ms'] = (sections_df['last_time'] * 1000).round(1)
+            st.dataframe(sections_df.set_index('section')[['renders', 'avg_ms', 'max_ms', 'last_ms']], width='stretch')
+
+        st.subheader("Slow Query Log")
+        slow_queries = instrumentation.slow_queries()
+        if not slow_queries:
+            st.info("No slow queries recorded.")
+        for entry in reversed(slow_queries):
+            with st.expander(f"{entry['ms']} ms · {entry['function']} · {entry['section']} · {entry['logged_at']}"):
+                st.code(entry['sql'], language='sql')
+                st.text("\n".join(entry['plan']) or "No query plan available.")
+
+        col1, col2 = st.columns(2)
+        with col1:
+            st.write("**Connection pool**")
+            st.json(db.get_pool_stats())
+        with col2:
+            st.write("**Read cache**")
+            st.dataframe(pd.DataFrame(db.get_cache_stats()).T, width='stretch')
+
+        if st.button("Reset Diagnostics"):
+            instrumentation.reset()
+            st.rerun()
+
+ADMIN_SECTIONS = {
+    "📊 Dashboard": financial_overview,
+    "👥 Management": management_panel,
+    "🔔 Notifications": notifications_panel,
+    "🏦 Bulk Verification": bulk_verification_panel,
+    "🩺 Diagnostics": diagnostics_panel,
+}
@@ -0,0 +1,147 @@
+"""
+Columnar archive of closed (Paid) payment logs.
+
+Archived logs are written as Parquet files under Year=YYYY/ directories, one file per archive
+batch and year, sorted by User_ID and DueDate so row-group statistics let scans skip most of a
+file for member lookups. Which files are live is recorded in the Archive_Files table by core.db;
+a file written by a batch that never committed is not listed there and is ignored.
+"""
+import os
+import uuid
+from datetime import date
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+import pandas as pd
+import config
+
+# Defaults to a directory next to the database file; set PAYMENT_ARCHIVE_DIR in config.py to move it
+ARCHIVE_DIR = getattr(config, 'PAYMENT_ARCHIVE_DIR', None)
+
+SCHEMA = pa.schema([
+    ('Log_ID', pa.int64()),
+    ('User_ID', pa.int64()),
+    ('List_ID', pa.int64()),
+    ('Amount', pa.float64()),
+    ('DueDate', pa.date32()),
+    ('PaymentDate', pa.date32()),
+    ('Status', pa.dictionary(pa.int8(), pa.string())),
+    ('Transaction_ID', pa.string()),
+])
+DATE_COLUMNS = ('DueDate', 'PaymentDate')
+
+def archive_dir(db_file):
+    return ARCHIVE_DIR or os.path.splitext(os.path.abspath(db_file))[0] + "_archive"
+
+def _to_date(value):
+    return value if isinstance(value, date) else date.fromisoformat(str(value)[:10])
+
+def write_year_files(directory, rows_df):
+    """
+    Writes payment logs (a DataFrame with the Payment_Logs columns) as one Parquet file per due-date year.
+    Returns a dict per file: Path (relative to directory), Year, Rows, Total_Amount, Min_DueDate and Max_DueDate.
+    """
+    rows_df = rows_df.assign(**{column: rows_df[column].map(_to_date, na_action='ignore') for column in DATE_COLUMNS})
+    batch = uuid.uuid4().hex[:12]
+    written = []
+    for year, year_df in rows_df.groupby(rows_df['DueDate'].map(lambda d: d.year)):
+        year_df = year_df.sort_values(['User_ID', 'DueDate', 'Log_ID'])
+        table = pa.Table.from_pandas(year_df[SCHEMA.names], schema=SCHEMA, preserve_index=False)
+        relative_path = os.path.join(f"Year={year}", f"logs-{batch}.parquet")
+        path = os.path.join(directory, relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Written under a temporary name so a crash never leaves a truncated file behind
+        pq.write_table(table, path + ".tmp", row_group_size=64 * 1024, compression='zstd')
+        os.replace(path + ".tmp", path)
+        written.append({'Path': relative_path, 'Year': int(year), 'Rows': len(year_df),
+                        'Total_Amount': float(year_df['Amount'].sum()),
+                        'Min_DueDate': year_df['DueDate'].min().isoformat(), 'Max_DueDate': year_df['DueDate'].max().isoformat()})
+    return written
+
+def remove_files(directory, relative_paths):
+    for relative_path in relative_paths:
+        try:
+            os.remove(os.path.join(directory, relative_path))
+        except FileNotFoundError:
+            pass
+
+def remove_orphans(directory, live_paths):
+    """Deletes Parquet files that no committed batch refers to, e.g. from a batch interrupted mid-way."""
+    live_paths = set(live_paths)
+    removed = 0
+    for root, _, files in os.walk(directory):
+        for name in files:
+            relative_path = os.path.relpath(os.path.join(root, name), directory)
+            if relative_path not in live_paths:
+                os.remove(os.path.join(root, name))
+                removed += 1
+    return removed
+
+def rewrite_excluding(directory, relative_paths, exclude):
+    """
+    Rewrites the given files without the rows matching the Arrow expression `exclude`; files without
+    such rows are left alone. Returns (written, replaced): entries for the new files, as from
+    write_year_files, and the paths they supersede, which the caller removes once its transaction commits.
+    """
+    written, replaced = [], []
+    for relative_path in relative_paths:
+        # Row-group statistics usually rule a file out without reading it
+        if scan(directory, [relative_path], exclude, columns=['Log_ID']).num_rows == 0:
+            continue
+        replaced.append(relative_path)
+        remaining = scan(directory, [relative_path], ~exclude)
+        if remaining.num_rows:
+            written.extend(write_year_files(directory, to_pandas(remaining)))
+    return written, replaced
+
+def build_filter(user_id=None, list_id=None, due_from=None, due_to=None):
+    """An Arrow expression for the ledger filters; pushed down to Parquet row-group statistics when scanning."""
+    expression = None
+    conditions = []
+    if user_id:
+        conditions.append(pc.field('User_ID') == int(user_id))
+    if list_id:
+        conditions.append(pc.field('List_ID') == int(list_id))
+    if due_from:
+        conditions.append(pc.field('DueDate') >= _to_date(due_from))
+    if due_to:
+        conditions.append(pc.field('DueDate') <= _to_date(due_to))
+    for condition in conditions:
+        expression = condition if expression is None else expression & condition
+    return expression
+
+def build_cursor_filter(sort_by, descending, cursor):
+    """An Arrow expression for the rows after a ledger keyset cursor (sort value, Log_ID)."""
+    sort_value = _to_date(cursor[0]) if sort_by in DATE_COLUMNS else cursor[0]
+    sort_field, log_id = pc.field(sort_by), int(cursor[1])
+    if descending:
+        return (sort_field < sort_value) | ((sort_field == sort_value) & (pc.field('Log_ID') < log_id))
+    return (sort_field > sort_value) | ((sort_field == sort_value) & (pc.field('Log_ID') > log_id))
+
+def scan(directory, relative_paths, filter=None, columns=None):
+    """Reads the given archive files as one pyarrow.Table, keeping only rows matching filter."""
+    if not relative_paths:
+        return SCHEMA.empty_table().select(columns) if columns else SCHEMA.empty_table()
+    dataset = ds.dataset([os.path.join(directory, path) for path in relative_paths], schema=SCHEMA, format='parquet')
+    return dataset.to_table(columns=columns, filter=filter)
+
+def to_pandas(table):
+    """Converts scanned rows to a DataFrame shaped like a Payment_Logs query result (dates as 'YYYY-MM-DD' text)."""
+    df = table.to_pandas()
+    for column in DATE_COLUMNS:
+        if column in df:
+            df[column] = df[column].map(lambda d: d.isoformat(), na_action='ignore')
+    if 'Status' in df:
+        df['Status'] = df['Status'].astype(object)
+    return df
+
+def sum_amount(table):
+    return pc.sum(table['Amount']).as_py() or 0
+
+def monthly_totals(directory, relative_paths):
+    """Totals archived logs by the month they were paid in, as a DataFrame of Month ('YYYY-MM') and Amount."""
+    table = scan(directory, relative_paths, pc.field('PaymentDate').is_valid(), columns=['PaymentDate', 'Amount'])
+    months = pc.strftime(table['PaymentDate'], format='%Y-%m')
+    totals = pa.table({'Month': months, 'Amount': table['Amount']}).group_by('Month').aggregate([('Amount', 'sum')])
+    return pd.DataFrame({'Month': totals['Month'].to_pylist(), 'Amount': totals['Amount_sum'].to_pylist()})
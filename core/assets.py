@@ -0,0 +1,90 @@
+"""
+Bundled static assets: the login animation and dashboard icons live in static/ and are served
+by Streamlit's static file server (server.enableStaticServing in .streamlit/config.toml), so
+pages render without reaching the internet.
+
+Usage: python -m core.assets fetch [--timeout 3]   # optionally replace the bundle with the upstream originals
+"""
+import argparse
+import functools
+import hashlib
+import json
+import os
+import sys
+import requests
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "static")
+FETCH_TIMEOUT = 3 # Seconds per request; the app never waits on these
+
+# Where each bundled asset originally came from
+REMOTE_ASSETS = {
+    "lottie/login.json": "https://assets5.lottiefiles.com/packages/lf20_jcikwtux.json",
+    "icons/money-bag.png": "https://img.icons8.com/plasticine/100/000000/money-bag.png",
+    "icons/initiate-money-transfer.png": "https://img.icons8.com/plasticine/100/000000/initiate-money-transfer.png",
+    "icons/request-money.png": "https://img.icons8.com/plasticine/100/000000/request-money.png",
+}
+
+@functools.lru_cache(maxsize=None)
+def _version(relative_path):
+    with open(os.path.join(STATIC_DIR, relative_path), "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()[:12]
+
+def static_url(relative_path):
+    """
+    The URL Streamlit serves a bundled file at. The content hash in ?v= lets browsers cache it
+    for good (Tornado sends a long max-age for versioned requests) and refetch only when it changes.
+    """
+    return f"app/static/{relative_path}?v={_version(relative_path)}"
+
+def icon_url(name):
+    return static_url(f"icons/{name}.png")
+
+@functools.lru_cache(maxsize=None)
+def _read_lottie(name):
+    with open(os.path.join(STATIC_DIR, "lottie", f"{name}.json")) as f:
+        return json.load(f)
+
+def load_lottie(name):
+    """Returns a bundled Lottie animation, read from disk once per process."""
+    try:
+        return _read_lottie(name)
+    except (OSError, ValueError):
+        return None
+
+def fetch_remote_assets(timeout=FETCH_TIMEOUT):
+    """
+    Downloads the upstream originals over the bundled copies. Each request gives up after
+    `timeout` seconds and a failure keeps the bundled file. Returns {path: error or None}.
+    """
+    results = {}
+    for relative_path, url in REMOTE_ASSETS.items():
+        try:
+            response = requests.get(url, timeout=timeout)
+            response.raise_for_status()
+            if relative_path.endswith(".json"):
+                response.json() # Don't replace a working animation with an error page
+        except (requests.RequestException, ValueError) as e:
+            results[relative_path] = str(e)
+            continue
+        path = os.path.join(STATIC_DIR, relative_path)
+        with open(path + ".tmp", "wb") as f:
+            f.write(response.content)
+        os.replace(path + ".tmp", path)
+        results[relative_path] = None
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m core.assets", description="Manage the bundled static assets.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    fetch_parser = subparsers.add_parser("fetch", help="Replace the bundled assets with the upstream originals.")
+    fetch_parser.add_argument("--timeout", type=float, default=FETCH_TIMEOUT, help="Seconds to wait for each download.")
+    args = parser.parse_args(argv)
+
+    failed = 0
+    for relative_path, error in fetch_remote_assets(args.timeout).items():
+        print(f"{relative_path}: {'kept bundled copy (' + error + ')' if error else 'updated'}")
+        failed += error is not None
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,22 +1,105 @@
+import logging
+import os
 import sqlite3
 import hashlib
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
 from config import DB_FILE
 from datetime import datetime
+import threading
+from contextlib import contextmanager
+from core.pool import ConnectionPool
+from core import archive, instrumentation, query_cache, reconciliation
+from core.query_cache import cached_query, invalidate
 
-def get_db_connection():
-    """Create and return a database connection."""
-    conn = sqlite3.connect(DB_FILE, check_same_thread=False)
-    conn.row_factory = sqlite3.Row
-    # Enable WAL mode for better concurrency
-    conn.execute("PRAGMA journal_mode=WAL;")
-    return conn
+logger = logging.getLogger(__name__)
 
-def setup_database():
-    """Set up the database tables if they don't exist."""
-    conn = get_db_connection()
+def _create_pool(db_file, **pool_options):
+    pool = ConnectionPool(db_file, connection_factory=instrumentation.InstrumentedConnection, **pool_options)
+    pool.add_connect_hook(instrumentation.count_connection_open)
+    return pool
+
+# One pool per process; Streamlit sessions run on separate threads and share it
+_pool = _create_pool(DB_FILE)
+
+@contextmanager
+def db_connection():
+    """Borrow a pooled database connection for the duration of a with-block."""
+    conn = _pool.acquire()
+    try:
+        yield conn
+    finally:
+        _pool.release(conn)
+
+# Arrow types for result columns whose SQLite storage class doesn't say what they hold
+_ARROW_DATE_COLUMNS = {'DueDate', 'PaymentDate'}
+_ARROW_FLOAT_COLUMNS = {'Amount', 'FundAmount', 'TotalAmount'}
+_ARROW_DICTIONARY_COLUMNS = {'Status', 'ListName', 'Username', 'Interval_Type'}
+
+# Repeated labels are returned as pandas categories, stored as small integer codes plus one copy of each label.
+# isin() and == on these columns compare codes rather than strings.
+STATUS_DTYPE = pd.CategoricalDtype(['Unpaid', 'Pending Verification', 'Paid', 'Rejected', 'Flagged'])
+_CATEGORICAL_COLUMNS = ('ListName', 'Username')
+
+def categorize_ledger(df):
+    """Converts the Status, ListName and Username columns of a ledger DataFrame to categoricals."""
+    if 'Status' in df:
+        df['Status'] = df['Status'].astype(STATUS_DTYPE)
+    for column in _CATEGORICAL_COLUMNS:
+        if column in df:
+            df[column] = df[column].astype('category')
+    return df
+
+def _arrow_table(names, columns):
+    """Builds a typed pyarrow.Table from Python column lists: ISO dates become date32, labels are dictionary-encoded."""
+    arrays = []
+    for name, values in zip(names, columns):
+        if name in _ARROW_DATE_COLUMNS:
+            array = pa.array(values, type=pa.string())
+            array = pc.strptime(array, format='%Y-%m-%d', unit='s', error_is_null=True).cast(pa.date32())
+        elif name in _ARROW_FLOAT_COLUMNS:
+            array = pa.array(values, type=pa.float64())
+        elif name in _ARROW_DICTIONARY_COLUMNS:
+            array = pa.array(values, type=pa.string()).dictionary_encode()
+        else:
+            array = pa.array(values)
+        arrays.append(array)
+    return pa.Table.from_arrays(arrays, names=list(names))
+
+def _read_sql(conn, query, params=(), as_arrow=False):
+    """
+    Runs a read query. Returns a DataFrame by default, or with as_arrow=True a typed pyarrow.Table
+    built straight from the cursor's rows, which Streamlit can display without a pandas round trip.
+    """
+    if not as_arrow:
+        return pd.read_sql_query(query, conn, params=params)
     c = conn.cursor()
+    c.execute(query, params)
+    names = [column[0] for column in c.description]
+    rows = c.fetchall()
+    return _arrow_table(names, list(zip(*rows)) if rows else [[] for _ in names])
+
+def configure_database(db_file, **pool_options):
+    """Points this process at another database file, e.g. for benchmarks or maintenance scripts."""
+    global _pool, _schema_ready
+    old_pool = _pool
+    _pool = _create_pool(db_file, **pool_options)
+    _schema_ready = False
+    old_pool.close_all()
+    query_cache.clear()
+    return _pool
+
+def get_pool_stats():
+    """Returns the connection pool's hit, miss and wait-time counters."""
+    return _pool.stats()
+
+def get_cache_stats():
+    """Returns the read cache's hits, misses and hit rate per cached query."""
+    return query_cache.stats()
 
+def _migrate_base_schema(c):
+    """Migration 1: the original tables, columns and default admin account."""
     # Add columns safely if they don't exist
     try:
         c.execute("ALTER TABLE Users ADD COLUMN PhoneNumber TEXT;")
@@ -86,7 +169,7 @@ def setup_database():
             FOREIGN KEY (List_ID) REFERENCES Fund_Lists(List_ID)
         )
     ''')
-    
+
     # Notification Log Table
     c.execute('''
         CREATE TABLE IF NOT EXISTS Notification_Log (
@@ -133,408 +216,1471 @@ def setup_database():
         c.execute("INSERT INTO Users (Username, PasswordHash, Role, PhoneNumber, Email) VALUES (?, ?, ?, ?, ?)",
                   ('admin', hashed_password, 'Admin', '+11234567890', 'admin@example.com')) # Placeholder email
 
+def _migrate_payment_indexes(c):
+    """Migration 2: indexes for the member dues, dues generation and reminder queries."""
+    # Makes payment_log_exists and the latest-log lookups an index probe
+    try:
+        c.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_payment_logs_user_list_due ON Payment_Logs (User_ID, List_ID, DueDate)")
+    except sqlite3.IntegrityError:
+        # Older databases may already hold duplicate periods; index them without the constraint
+        c.execute("CREATE INDEX IF NOT EXISTS idx_payment_logs_user_list_due ON Payment_Logs (User_ID, List_ID, DueDate)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_payment_logs_status ON Payment_Logs (Status, List_ID)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_unverified_log ON Unverified_Transaction_IDs (Log_ID)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_notification_user_list ON Notification_Log (User_ID, List_ID, SentTimestamp)")
+
+# Summary key for a log: Paid logs are bucketed by the month they were paid in, others by ''
+_SUMMARY_MONTH = "COALESCE(substr({row}.PaymentDate, 1, 7), '')"
 
+_SUMMARY_ADD = """
+    INSERT INTO Payment_Summary (List_ID, Status, Month, LogCount, TotalAmount)
+    VALUES (NEW.List_ID, NEW.Status, {month}, 1, NEW.Amount)
+    ON CONFLICT (List_ID, Status, Month) DO UPDATE SET
+        LogCount = LogCount + 1,
+        TotalAmount = TotalAmount + excluded.TotalAmount;
+""".format(month=_SUMMARY_MONTH.format(row='NEW'))
 
+_SUMMARY_SUBTRACT = """
+    UPDATE Payment_Summary SET LogCount = LogCount - 1, TotalAmount = TotalAmount - OLD.Amount
+    WHERE List_ID = OLD.List_ID AND Status = OLD.Status AND Month = {month};
+    DELETE FROM Payment_Summary
+    WHERE List_ID = OLD.List_ID AND Status = OLD.Status AND Month = {month} AND LogCount <= 0;
+""".format(month=_SUMMARY_MONTH.format(row='OLD'))
+
+# The totals Payment_Summary should hold, computed from scratch
+_SUMMARY_EXPECTED = """
+    SELECT List_ID, Status, {month} AS Month, COUNT(*) AS LogCount, SUM(Amount) AS TotalAmount
+    FROM Payment_Logs pl
+    GROUP BY List_ID, Status, {month}
+""".format(month=_SUMMARY_MONTH.format(row='pl'))
+
+def _rebuild_payment_summary(c):
+    c.execute("DELETE FROM Payment_Summary")
+    c.execute(f"INSERT INTO Payment_Summary (List_ID, Status, Month, LogCount, TotalAmount) {_SUMMARY_EXPECTED}")
+
+def _migrate_payment_summary(c):
+    """Migration 3: per-fund, per-status, per-month totals kept current by triggers on Payment_Logs."""
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS Payment_Summary (
+            List_ID INTEGER NOT NULL,
+            Status TEXT NOT NULL,
+            Month TEXT NOT NULL,
+            LogCount INTEGER NOT NULL,
+            TotalAmount REAL NOT NULL,
+            PRIMARY KEY (List_ID, Status, Month)
+        )
+    ''')
+    c.execute(f"CREATE TRIGGER IF NOT EXISTS trg_payment_summary_insert AFTER INSERT ON Payment_Logs BEGIN {_SUMMARY_ADD} END")
+    c.execute(f"CREATE TRIGGER IF NOT EXISTS trg_payment_summary_delete AFTER DELETE ON Payment_Logs BEGIN {_SUMMARY_SUBTRACT} END")
+    c.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_payment_summary_update
+        AFTER UPDATE OF List_ID, Amount, Status, PaymentDate ON Payment_Logs
+        BEGIN {_SUMMARY_SUBTRACT} {_SUMMARY_ADD} END
+    """)
+    _rebuild_payment_summary(c)
+
+def _migrate_notification_outbox(c):
+    """Migration 4: the outbox the background notification dispatcher drains."""
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS Notification_Outbox (
+            Outbox_ID INTEGER PRIMARY KEY AUTOINCREMENT,
+            Batch_ID TEXT NOT NULL,
+            Idempotency_Key TEXT UNIQUE NOT NULL,
+            User_ID INTEGER NOT NULL,
+            List_ID INTEGER NOT NULL,
+            Channel TEXT NOT NULL CHECK(Channel IN ('whatsapp', 'email')),
+            Recipient TEXT NOT NULL,
+            Subject TEXT,
+            Body TEXT NOT NULL,
+            Status TEXT NOT NULL DEFAULT 'Queued' CHECK(Status IN ('Queued', 'Sending', 'Sent', 'Failed')),
+            Attempts INTEGER NOT NULL DEFAULT 0,
+            Next_Attempt_At DATETIME DEFAULT CURRENT_TIMESTAMP,
+            Last_Error TEXT,
+            Created_At DATETIME DEFAULT CURRENT_TIMESTAMP,
+            Sent_At DATETIME,
+            FOREIGN KEY (User_ID) REFERENCES Users(User_ID),
+            FOREIGN KEY (List_ID) REFERENCES Fund_Lists(List_ID)
+        )
+    ''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_outbox_pending ON Notification_Outbox (Status, Channel, Next_Attempt_At)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_outbox_batch ON Notification_Outbox (Batch_ID, Status)")
+
+    # Each delivered outbox message is logged at most once, even if marking it sent is retried
+    try:
+        c.execute("ALTER TABLE Notification_Log ADD COLUMN Outbox_ID INTEGER REFERENCES Notification_Outbox(Outbox_ID);")
+    except sqlite3.OperationalError:
+        pass # Column already exists
+    c.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_notification_outbox ON Notification_Log (Outbox_ID)")
+
+def _migrate_dues_runs(c):
+    """Migration 5: run history and checkpoints for scheduled dues generation, and a lease table."""
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS Dues_Runs (
+            Run_ID INTEGER PRIMARY KEY AUTOINCREMENT,
+            Trigger TEXT NOT NULL CHECK(Trigger IN ('Scheduled', 'Manual')),
+            Interval_Types TEXT NOT NULL,
+            Status TEXT NOT NULL CHECK(Status IN ('Running', 'Succeeded', 'Failed', 'Interrupted')),
+            Started_At DATETIME DEFAULT CURRENT_TIMESTAMP,
+            Finished_At DATETIME,
+            Duration_Seconds REAL,
+            Funds_Total INTEGER NOT NULL DEFAULT 0,
+            Funds_Processed INTEGER NOT NULL DEFAULT 0,
+            Logs_Created INTEGER NOT NULL DEFAULT 0,
+            Checkpoint_List_ID INTEGER NOT NULL DEFAULT 0,
+            Error TEXT
+        )
+    ''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_dues_runs_status ON Dues_Runs (Status, Run_ID)")
+
+    # Named leases that keep two threads or processes from doing the same job at once
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS Job_Locks (
+            Name TEXT PRIMARY KEY,
+            Owner TEXT NOT NULL,
+            Expires_At DATETIME NOT NULL
+        )
+    ''')
+
+def _migrate_payment_archive(c):
+    """Migration 6: the Parquet files holding archived Paid logs, with per-file totals for pruning and dashboards."""
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS Archive_Files (
+            Path TEXT PRIMARY KEY,
+            Year INTEGER NOT NULL,
+            Rows INTEGER NOT NULL,
+            Total_Amount REAL NOT NULL,
+            Min_DueDate DATE NOT NULL,
+            Max_DueDate DATE NOT NULL,
+            Archived_At DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+def _migrate_reminder_digests(c):
+    """Migration 7: the funds each digest message covers, logged per fund once sent, and a per-member reminder index."""
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS Notification_Outbox_Funds (
+            Outbox_ID INTEGER NOT NULL,
+            List_ID INTEGER NOT NULL,
+            PRIMARY KEY (Outbox_ID, List_ID),
+            FOREIGN KEY (Outbox_ID) REFERENCES Notification_Outbox(Outbox_ID),
+            FOREIGN KEY (List_ID) REFERENCES Fund_Lists(List_ID)
+        ) WITHOUT ROWID
+    ''')
+    # A digest is logged once per fund it covers, so each outbox message may have several log rows
+    c.execute("DROP INDEX IF EXISTS idx_notification_outbox")
+    c.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_notification_outbox_fund ON Notification_Log (Outbox_ID, List_ID)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_notification_user_sent ON Notification_Log (User_ID, SentTimestamp)")
+
+def _migrate_bank_transactions(c):
+    """Migration 8: the ledger of imported bank statement lines, one per transaction ID, that submissions are matched against."""
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS Bank_Transactions (
+            Transaction_ID TEXT PRIMARY KEY,
+            Amount REAL NOT NULL,
+            Source TEXT,
+            Imported_At DATETIME DEFAULT CURRENT_TIMESTAMP
+        ) WITHOUT ROWID
+    ''')
 
-    conn.commit()
-    conn.close()
+def _migrate_bank_matches(c):
+    """Migration 9: the payment log each statement line settled, so a line is only ever used once."""
+    c.execute("ALTER TABLE Bank_Transactions ADD COLUMN Matched_Log_ID INTEGER REFERENCES Payment_Logs(Log_ID)")
 
+def _migrate_outbox_claims(c):
+    """Migration 10: when a message was claimed, so one stuck in Sending can be told from one in flight."""
+    c.execute("ALTER TABLE Notification_Outbox ADD COLUMN Claimed_At DATETIME")
+
+# Applied in order; a database's PRAGMA user_version records how many have run
+MIGRATIONS = [
+    _migrate_base_schema,
+    _migrate_payment_indexes,
+    _migrate_payment_summary,
+    _migrate_notification_outbox,
+    _migrate_dues_runs,
+    _migrate_payment_archive,
+    _migrate_reminder_digests,
+    _migrate_bank_transactions,
+    _migrate_bank_matches,
+    _migrate_outbox_claims,
+]
+
+_schema_lock = threading.Lock()
+_schema_ready = False
+
+def run_migrations(conn):
+    """Applies every migration newer than the database's user_version, each in its own transaction."""
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    for number, migration in enumerate(MIGRATIONS, start=1):
+        if number <= version:
+            continue
+        c = conn.cursor()
+        c.execute("BEGIN")
+        try:
+            migration(c)
+            c.execute(f"PRAGMA user_version = {number}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    return len(MIGRATIONS)
+
+def setup_database():
+    """Brings the database schema up to date. Only the first call in a process does any work."""
+    global _schema_ready
+    if _schema_ready:
+        return
+    with _schema_lock:
+        if _schema_ready:
+            return
+        with db_connection() as conn:
+            run_migrations(conn)
+        _schema_ready = True
+
+@cached_query('settings')
 def get_setting(key):
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute("SELECT value FROM Settings WHERE key = ?", (key,))
-    result = c.fetchone()
-    conn.close()
-    return result['value'] if result else None
+    with db_connection() as conn:
+        c = conn.cursor()
+        c.execute("SELECT value FROM Settings WHERE key = ?", (key,))
+        result = c.fetchone()
+        return result['value'] if result else None
 
 def set_setting(key, value):
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute("INSERT OR REPLACE INTO Settings (key, value) VALUES (?, ?)", (key, value))
-    conn.commit()
-    conn.close()
+    with db_connection() as conn:
+        c = conn.cursor()
+        c.execute("INSERT OR REPLACE INTO Settings (key, value) VALUES (?, ?)", (key, value))
+        conn.commit()
+    invalidate('settings')
+
+
+
+def get_all_payment_logs(as_arrow=False):
+    """Fetches all payment logs, archived ones included, with user and fund information."""
+    with db_connection() as conn:
+        query = """
+            SELECT pl.*, u.Username, u.PhoneNumber, fl.ListName 
+            FROM Payment_Logs pl
+            JOIN Users u ON pl.User_ID = u.User_ID
+            JOIN Fund_Lists fl ON pl.List_ID = fl.List_ID
+        """
+        df = _read_sql(conn, query, as_arrow=as_arrow)
+        archived_df = _read_archive(conn)
+    df = _union_archive(df, archived_df)
+    return df if as_arrow else categorize_ledger(df)
+
+# --- Archive of closed payment logs ---
+ARCHIVE_BATCH_ROWS = 100000 # Logs moved per transaction; the write lock is held while a batch's files are written
+ARCHIVE_LOCK = 'archive_paid_logs' # Held by anything that writes archive files
+
+def _archive_dir():
+    return archive.archive_dir(_pool.db_file)
+
+@cached_query('archive')
+def get_archive_files():
+    """Lists the committed archive files with their row counts, totals and due-date ranges."""
+    with db_connection() as conn:
+        df = pd.read_sql_query("SELECT * FROM Archive_Files ORDER BY Year, Path", conn)
+        return df
+
+def _archive_paths(due_from=None, due_to=None):
+    """Archive files that may hold logs due in the given range; the rest are never opened."""
+    files_df = get_archive_files()
+    if due_from:
+        files_df = files_df[files_df['Max_DueDate'] >= str(due_from)]
+    if due_to:
+        files_df = files_df[files_df['Min_DueDate'] <= str(due_to)]
+    return files_df['Path'].tolist()
+
+def _read_archive(conn, user_id=None, list_id=None, due_from=None, due_to=None, extra_filter=None):
+    """Scans the archive with the filters pushed down to Parquet and adds Username, PhoneNumber and ListName."""
+    paths = _archive_paths(due_from, due_to)
+    if not paths:
+        return pd.DataFrame()
+    row_filter = archive.build_filter(user_id, list_id, due_from, due_to)
+    if extra_filter is not None:
+        row_filter = extra_filter if row_filter is None else row_filter & extra_filter
+    archived_df = archive.to_pandas(archive.scan(_archive_dir(), paths, row_filter))
+    if archived_df.empty:
+        return pd.DataFrame()
+
+    users_df = pd.read_sql_query("SELECT User_ID, Username, PhoneNumber FROM Users", conn)
+    funds_df = pd.read_sql_query("SELECT List_ID, ListName FROM Fund_Lists", conn)
+    return archived_df.merge(users_df, on='User_ID').merge(funds_df, on='List_ID')
+
+def _union_archive(df, archived_df):
+    """Appends archived rows to a live query result (DataFrame or pyarrow.Table), in the live result's columns."""
+    if archived_df.empty:
+        return df
+    if isinstance(df, pa.Table):
+        archived = _arrow_table(df.column_names, [archived_df[name].tolist() for name in df.column_names])
+        return pa.concat_tables([df, archived], promote_options='default')
+    if df.empty:
+        return archived_df[df.columns].reset_index(drop=True)
+    return pd.concat([df, archived_df[df.columns]], ignore_index=True)
+
+def archive_paid_logs(before, batch_rows=ARCHIVE_BATCH_ROWS):
+    """
+    Moves Paid logs due before the given date into the Parquet archive, batch by batch.
+    Each membership keeps its latest log and its latest settled log in Payment_Logs, since dues
+    generation and the arrears audit start from them.
+    Returns (success, logs archived, error message).
+    """
+    directory = _archive_dir()
+    owner = f"{os.getpid()}:{threading.get_ident()}"
+    if not acquire_job_lock(ARCHIVE_LOCK, owner, 3600):
+        return False, 0, "Another archive run is in progress."
+    try:
+        return _archive_paid_batches(directory, before, batch_rows)
+    finally:
+        release_job_lock(ARCHIVE_LOCK, owner)
+
+def _archive_paid_batches(directory, before, batch_rows):
+    archived = 0
+    with db_connection() as conn:
+        c = conn.cursor()
+        if os.path.isdir(directory):
+            c.execute("SELECT Path FROM Archive_Files")
+            archive.remove_orphans(directory, [row['Path'] for row in c.fetchall()])
+        while True:
+            written = []
+            try:
+                # Taking the write lock first keeps the selected logs from changing before they are deleted
+                c.execute("BEGIN IMMEDIATE")
+                batch_df = pd.read_sql_query("""
+                    SELECT pl.Log_ID, pl.User_ID, pl.List_ID, pl.Amount, pl.DueDate, pl.PaymentDate, pl.Status, pl.Transaction_ID
+                    FROM Payment_Logs pl
+                    WHERE pl.Status = 'Paid' AND pl.DueDate < ?
+                      AND pl.DueDate < (SELECT MAX(DueDate) FROM Payment_Logs l WHERE l.User_ID = pl.User_ID AND l.List_ID = pl.List_ID)
+                      AND pl.DueDate < (SELECT MAX(DueDate) FROM Payment_Logs l WHERE l.User_ID = pl.User_ID AND l.List_ID = pl.List_ID
+                                          AND l.Status NOT IN ('Unpaid', 'Rejected'))
+                    ORDER BY pl.Log_ID
+                    LIMIT ?
+                """, conn, params=(str(before), batch_rows))
+                if batch_df.empty:
+                    conn.rollback()
+                    break
+
+                written = archive.write_year_files(directory, batch_df)
+                c.executemany("DELETE FROM Payment_Logs WHERE Log_ID = ?", [(log_id,) for log_id in batch_df['Log_ID'].tolist()])
+                c.executemany("""
+                    INSERT INTO Archive_Files (Path, Year, Rows, Total_Amount, Min_DueDate, Max_DueDate)
+                    VALUES (:Path, :Year, :Rows, :Total_Amount, :Min_DueDate, :Max_DueDate)
+                """, written)
+                conn.commit()
+                archived += len(batch_df)
+            except Exception as e:
+                conn.rollback()
+                archive.remove_files(directory, [entry['Path'] for entry in written])
+                invalidate('archive')
+                return False, archived, str(e)
+    invalidate('archive')
+    return True, archived, None
+
+# Columns a ledger page may be sorted by; Log_ID breaks ties so the keyset is unique
+LEDGER_SORT_COLUMNS = ('DueDate', 'Amount', 'Log_ID')
+HISTORY_STATUSES = ['Paid', 'Pending Verification', 'Rejected']
+MEMBER_HISTORY_PAGE_SIZE = 50 # Rows in the history page kept in each member snapshot
+
+def _ledger_filters(statuses=None, list_id=None, user_id=None, due_from=None, due_to=None):
+    """Builds the WHERE clauses and parameters shared by the ledger page and count queries."""
+    clauses, params = [], []
+    if statuses:
+        clauses.append(f"pl.Status IN ({', '.join('?' * len(statuses))})")
+        params.extend(statuses)
+    if list_id:
+        clauses.append("pl.List_ID = ?")
+        params.append(list_id)
+    if user_id:
+        clauses.append("pl.User_ID = ?")
+        params.append(user_id)
+    if due_from:
+        clauses.append("pl.DueDate >= ?")
+        params.append(str(due_from))
+    if due_to:
+        clauses.append("pl.DueDate <= ?")
+        params.append(str(due_to))
+    return clauses, params
 
+def get_ledger_page(statuses=None, list_id=None, user_id=None, due_from=None, due_to=None,
+                    sort_by='DueDate', descending=False, cursor=None, page_size=50, as_arrow=False):
+    """
+    Fetches one page of payment logs with user and fund information, filtered and sorted in SQL.
+    Pages are keyset-paginated: pass the returned cursor back to get the following page.
+    Returns (DataFrame, next_cursor), or a pyarrow.Table with as_arrow=True; next_cursor is None on the last page.
+    """
+    with db_connection() as conn:
+        return _ledger_page(conn, statuses, list_id, user_id, due_from, due_to, sort_by, descending, cursor, page_size, as_arrow)
 
+def _ledger_page(conn, statuses, list_id, user_id, due_from, due_to, sort_by, descending, cursor, page_size, as_arrow):
+    if sort_by not in LEDGER_SORT_COLUMNS:
+        raise ValueError(f"Cannot sort the ledger by {sort_by!r}.")
 
-def get_all_payment_logs():
-    """Fetches all payment logs with user and fund information."""
-    conn = get_db_connection()
-    query = """
-        SELECT pl.*, u.Username, u.PhoneNumber, fl.ListName 
+    clauses, params = _ledger_filters(statuses, list_id, user_id, due_from, due_to)
+    if cursor is not None:
+        clauses.append(f"(pl.{sort_by}, pl.Log_ID) {'<' if descending else '>'} (?, ?)")
+        params.extend(cursor)
+
+    direction = 'DESC' if descending else 'ASC'
+    query = f"""
+        SELECT pl.Log_ID, pl.User_ID, pl.List_ID, u.Username, u.PhoneNumber, fl.ListName,
+               pl.Amount, pl.DueDate, pl.PaymentDate, pl.Status, pl.Transaction_ID
         FROM Payment_Logs pl
         JOIN Users u ON pl.User_ID = u.User_ID
         JOIN Fund_Lists fl ON pl.List_ID = fl.List_ID
+        {'WHERE ' + ' AND '.join(clauses) if clauses else ''}
+        ORDER BY pl.{sort_by} {direction}, pl.Log_ID {direction}
+        LIMIT ?
     """
-    df = pd.read_sql_query(query, conn)
-    conn.close()
-    return df
+    # One extra row tells us whether another page follows
+    df = _read_sql(conn, query, params + [page_size + 1], as_arrow)
+    if not statuses or 'Paid' in statuses:
+        df = _merge_archive_page(conn, df, list_id, user_id, due_from, due_to, sort_by, descending, cursor, page_size)
+
+    next_cursor = None
+    if len(df) > page_size:
+        if as_arrow:
+            df = df.slice(0, page_size)
+            last_value = df[sort_by][page_size - 1].as_py()
+            # Dates come back as datetime.date; the cursor is compared with DueDate's ISO text
+            next_cursor = (last_value.isoformat() if sort_by in _ARROW_DATE_COLUMNS else last_value, df['Log_ID'][page_size - 1].as_py())
+        else:
+            df = df.iloc[:page_size]
+            next_cursor = (df[sort_by].tolist()[-1], df['Log_ID'].tolist()[-1])
+    return df, next_cursor
+
+def _merge_archive_page(conn, df, list_id, user_id, due_from, due_to, sort_by, descending, cursor, page_size):
+    """Merges the archived logs that belong on a ledger page into the live rows, in page order."""
+    cursor_filter = archive.build_cursor_filter(sort_by, descending, cursor) if cursor is not None else None
+    archived_df = _read_archive(conn, user_id, list_id, due_from, due_to, cursor_filter)
+    if archived_df.empty:
+        return df
+    merged = _union_archive(df, archived_df)
+    if isinstance(merged, pa.Table):
+        order = 'descending' if descending else 'ascending'
+        return merged.sort_by([(sort_by, order), ('Log_ID', order)]).slice(0, page_size + 1)
+    return merged.sort_values([sort_by, 'Log_ID'], ascending=not descending).head(page_size + 1).reset_index(drop=True)
+
+def count_ledger_rows(statuses=None, list_id=None, user_id=None, due_from=None, due_to=None):
+    """Counts the payment logs, archived ones included, matching the same filters as get_ledger_page."""
+    clauses, params = _ledger_filters(statuses, list_id, user_id, due_from, due_to)
+    with db_connection() as conn:
+        c = conn.cursor()
+        c.execute(f"SELECT COUNT(*) FROM Payment_Logs pl {'WHERE ' + ' AND '.join(clauses) if clauses else ''}", params)
+        count = c.fetchone()[0]
+    if not statuses or 'Paid' in statuses:
+        paths = _archive_paths(due_from, due_to)
+        if paths:
+            count += archive.scan(_archive_dir(), paths, archive.build_filter(user_id, list_id, due_from, due_to), columns=['Log_ID']).num_rows
+    return count
+
+def get_status_totals():
+    """Returns the number and total amount of payment logs per status, read from Payment_Summary and the archive."""
+    with db_connection() as conn:
+        query = """
+            SELECT Status, SUM(LogCount) AS LogCount, SUM(TotalAmount) AS TotalAmount
+            FROM (
+                SELECT Status, LogCount, TotalAmount FROM Payment_Summary
+                UNION ALL
+                SELECT 'Paid', Rows, Total_Amount FROM Archive_Files
+            )
+            GROUP BY Status
+        """
+        df = pd.read_sql_query(query, conn)
+        return df
+
+def get_monthly_collections():
+    """Returns the total amount paid in each month ('YYYY-MM'), read from Payment_Summary and the archive."""
+    with db_connection() as conn:
+        query = """
+            SELECT Month, SUM(TotalAmount) AS Amount
+            FROM Payment_Summary
+            WHERE Status = 'Paid' AND Month != ''
+            GROUP BY Month
+            ORDER BY Month
+        """
+        df = pd.read_sql_query(query, conn)
+    archived_df = get_archived_monthly_collections()
+    if archived_df.empty:
+        return df
+    df = pd.concat([df, archived_df]).groupby('Month', as_index=False)['Amount'].sum()
+    return df.sort_values('Month').reset_index(drop=True)
+
+@cached_query('archive')
+def get_archived_monthly_collections():
+    """Totals the archived logs by the month they were paid in; only changes when more logs are archived."""
+    return archive.monthly_totals(_archive_dir(), _archive_paths())
+
+def check_payment_summary(repair=False):
+    """
+    Recomputes the Payment_Summary totals from Payment_Logs and returns the rows that drifted,
+    with stored and expected counts and amounts side by side. With repair=True the summary is rebuilt.
+    """
+    with db_connection() as conn:
+        stored_df = pd.read_sql_query("SELECT List_ID, Status, Month, LogCount, TotalAmount FROM Payment_Summary", conn)
+        expected_df = pd.read_sql_query(_SUMMARY_EXPECTED, conn)
+
+        merged = stored_df.merge(expected_df, on=['List_ID', 'Status', 'Month'], how='outer',
+                                 suffixes=('_Stored', '_Expected')).fillna(0)
+        drift_df = merged[(merged['LogCount_Stored'] != merged['LogCount_Expected']) |
+                          ((merged['TotalAmount_Stored'] - merged['TotalAmount_Expected']).abs() > 0.005)]
+
+        if repair and not drift_df.empty:
+            c = conn.cursor()
+            try:
+                _rebuild_payment_summary(c)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        return drift_df.reset_index(drop=True)
 
+# Each member's trailing open (Unpaid or Rejected) logs after their last settled one, split into runs
+# numbered by period. Dues generation compounds an open log into the next period, so the n-th log of a
+# run should be the run's first amount plus n - 1 fund amounts. A log that was still pending when its
+# successor was generated is not carried forward, and that successor holds just the fund amount,
+# so a log of exactly the fund amount starts a new run.
+_ARREARS_RUNS = """
+    WITH settled AS (
+        SELECT User_ID, List_ID, MAX(DueDate) AS Settled_Due
+        FROM Payment_Logs
+        WHERE Status NOT IN ('Unpaid', 'Rejected')
+        GROUP BY User_ID, List_ID
+    ),
+    open_logs AS (
+        SELECT pl.Log_ID, pl.User_ID, pl.List_ID, pl.DueDate, pl.Amount, fl.Amount AS FundAmount,
+               ROW_NUMBER() OVER (PARTITION BY pl.User_ID, pl.List_ID ORDER BY pl.DueDate) AS Position
+        FROM Payment_Logs pl
+        JOIN Fund_Lists fl ON pl.List_ID = fl.List_ID
+        LEFT JOIN settled s ON s.User_ID = pl.User_ID AND s.List_ID = pl.List_ID
+        WHERE pl.Status IN ('Unpaid', 'Rejected') AND pl.DueDate > COALESCE(s.Settled_Due, '') {filters}
+    ),
+    segmented AS (
+        SELECT *, SUM(Position = 1 OR ABS(Amount - FundAmount) <= 0.005)
+                      OVER (PARTITION BY User_ID, List_ID ORDER BY DueDate) AS Run
+        FROM open_logs
+    ),
+    open_runs AS (
+        SELECT Log_ID, User_ID, List_ID, DueDate, Amount, FundAmount, Run,
+               ROW_NUMBER() OVER (PARTITION BY User_ID, List_ID, Run ORDER BY DueDate) AS Period,
+               COUNT(*) OVER (PARTITION BY User_ID, List_ID, Run) AS Run_Length,
+               FIRST_VALUE(Amount) OVER (PARTITION BY User_ID, List_ID, Run ORDER BY DueDate) AS First_Amount
+        FROM segmented
+    )
+"""
+
+def audit_arrears(user_id=None, list_id=None, repair=False):
+    """
+    Recomputes each member's outstanding arrears in closed form and returns the memberships whose
+    open logs disagree, with stored and expected amounts (the last log of each run, summed) side by
+    side. Pass user_id or list_id to audit one member or fund. With repair=True every drifted log is
+    set to its expected amount.
+    """
+    filters, params = " AND fl.Interval_Type != 'One-Time'", []
+    if user_id is not None:
+        filters += " AND pl.User_ID = ?"
+        params.append(user_id)
+    if list_id is not None:
+        filters += " AND pl.List_ID = ?"
+        params.append(list_id)
+    runs = _ARREARS_RUNS.format(filters=filters)
+
+    with db_connection() as conn:
+        query = runs + """
+            SELECT u.Username, fl.ListName, r.User_ID, r.List_ID, COUNT(*) AS Periods, MAX(r.DueDate) AS Latest_Due,
+                   SUM(CASE WHEN r.Period = r.Run_Length THEN r.Amount END) AS Outstanding,
+                   SUM(CASE WHEN r.Period = r.Run_Length THEN r.First_Amount + r.FundAmount * (r.Run_Length - 1) END) AS Expected,
+                   SUM(ABS(r.Amount - (r.First_Amount + r.FundAmount * (r.Period - 1))) > 0.005) AS Drifted_Logs
+            FROM open_runs r
+            JOIN Users u ON r.User_ID = u.User_ID
+            JOIN Fund_Lists fl ON r.List_ID = fl.List_ID
+            GROUP BY r.User_ID, r.List_ID
+            HAVING Drifted_Logs > 0
+            ORDER BY fl.ListName, u.Username
+        """
+        drift_df = pd.read_sql_query(query, conn, params=params)
+
+        if repair and not drift_df.empty:
+            c = conn.cursor()
+            try:
+                c.execute(runs + """
+                    UPDATE Payment_Logs
+                    SET Amount = (SELECT r.First_Amount + r.FundAmount * (r.Period - 1) FROM open_runs r WHERE r.Log_ID = Payment_Logs.Log_ID)
+                    WHERE Log_ID IN (SELECT Log_ID FROM open_runs WHERE ABS(Amount - (First_Amount + FundAmount * (Period - 1))) > 0.005)
+                """, params)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            _invalidate_members(drift_df['User_ID'].tolist())
+        return drift_df
+
+@cached_query('funds')
 def get_fund_options():
     """Fetches all fund lists for display in selectboxes."""
-    conn = get_db_connection()
-    df = pd.read_sql_query("SELECT List_ID, ListName FROM Fund_Lists", conn)
-    conn.close()
-    return df
+    with db_connection() as conn:
+        df = pd.read_sql_query("SELECT List_ID, ListName FROM Fund_Lists", conn)
+        return df
 
 def create_fund(list_name, amount, interval, due_date, vpa):
     """Creates a new fund list."""
-    conn = get_db_connection()
-    c = conn.cursor()
-    try:
-        c.execute("INSERT INTO Fund_Lists (ListName, Amount, Interval_Type, VPA, DueDate) VALUES (?, ?, ?, ?, ?)",
-                  (list_name, amount, interval, vpa, due_date))
-        conn.commit()
-        return True, None
-    except sqlite3.IntegrityError as e:
-        return False, str(e)
-    finally:
-        conn.close()
+    with db_connection() as conn:
+        c = conn.cursor()
+        try:
+            c.execute("INSERT INTO Fund_Lists (ListName, Amount, Interval_Type, VPA, DueDate) VALUES (?, ?, ?, ?, ?)",
+                      (list_name, amount, interval, vpa, due_date))
+            conn.commit()
+            invalidate('funds')
+            return True, None
+        except sqlite3.IntegrityError as e:
+            return False, str(e)
 
+@cached_query('funds')
 def get_all_funds():
     """Fetches all funds for display."""
-    conn = get_db_connection()
-    df = pd.read_sql_query("SELECT ListName, Amount, Interval_Type, DueDate, VPA FROM Fund_Lists", conn)
-    conn.close()
-    return df
+    with db_connection() as conn:
+        df = pd.read_sql_query("SELECT ListName, Amount, Interval_Type, DueDate, VPA FROM Fund_Lists", conn)
+        return df
 
+@cached_query('users')
 def get_member_users():
     """Fetches all users with the 'Member' role."""
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute("SELECT User_ID, Username, PhoneNumber, Email FROM Users WHERE Role = 'Member'")
-    members = {row['PhoneNumber']: {'User_ID': row['User_ID'], 'Username': row['Username'], 'Email': row['Email']} for row in c.fetchall()}
-    conn.close()
-    return members
+    with db_connection() as conn:
+        c = conn.cursor()
+        c.execute("SELECT User_ID, Username, PhoneNumber, Email FROM Users WHERE Role = 'Member'")
+        members = {row['PhoneNumber']: {'User_ID': row['User_ID'], 'Username': row['Username'], 'Email': row['Email']} for row in c.fetchall()}
+        return members
     
 def enroll_members(users_to_enroll, payment_logs_to_create):
     """Enrolls members in a fund and creates payment logs."""
-    conn = get_db_connection()
-    c = conn.cursor()
-    try:
-        if users_to_enroll:
-            c.executemany("INSERT OR IGNORE INTO Memberships (User_ID, List_ID) VALUES (?, ?)", users_to_enroll)
-        if payment_logs_to_create:
-            c.executemany("INSERT INTO Payment_Logs (User_ID, List_ID, Amount, DueDate, Status) VALUES (?, ?, ?, ?, ?)", payment_logs_to_create)
-        conn.commit()
-        return True, None
-    except Exception as e:
-        conn.rollback()
-        return False, str(e)
-    finally:
-        conn.close()
+    with db_connection() as conn:
+        c = conn.cursor()
+        try:
+            if users_to_enroll:
+                c.executemany("INSERT OR IGNORE INTO Memberships (User_ID, List_ID) VALUES (?, ?)", users_to_enroll)
+            if payment_logs_to_create:
+                c.executemany("INSERT INTO Payment_Logs (User_ID, List_ID, Amount, DueDate, Status) VALUES (?, ?, ?, ?, ?)", payment_logs_to_create)
+            conn.commit()
+            _invalidate_members(log[0] for log in payment_logs_to_create or ())
+            return True, None
+        except Exception as e:
+            conn.rollback()
+            return False, str(e)
+
+def bulk_enroll_members(list_id, phone_numbers, chunk_size=5000):
+    """
+    Enrolls members in a fund by phone number and creates their first-period payment logs,
+    using set-based SQL in one transaction. phone_numbers may be any iterable, e.g. a generator
+    reading an upload in chunks. Returns (success, enrolled, failed, error), where enrolled lists
+    (Username, PhoneNumber) and failed lists the phone numbers that are not registered members,
+    both in input order.
+    """
+    with db_connection() as conn:
+        c = conn.cursor()
+        try:
+            c.execute("CREATE TEMP TABLE IF NOT EXISTS Enroll_Phones (Position INTEGER PRIMARY KEY, PhoneNumber TEXT NOT NULL)")
+            c.execute("DELETE FROM temp.Enroll_Phones")
+            chunk = []
+            for phone_number in phone_numbers:
+                chunk.append((phone_number,))
+                if len(chunk) >= chunk_size:
+                    c.executemany("INSERT INTO temp.Enroll_Phones (PhoneNumber) VALUES (?)", chunk)
+                    chunk = []
+            if chunk:
+                c.executemany("INSERT INTO temp.Enroll_Phones (PhoneNumber) VALUES (?)", chunk)
+
+            c.execute("""
+                SELECT e.PhoneNumber, u.Username, u.User_ID
+                FROM temp.Enroll_Phones e
+                LEFT JOIN Users u ON u.PhoneNumber = e.PhoneNumber AND u.Role = 'Member'
+                ORDER BY e.Position
+            """)
+            enrolled, failed, enrolled_ids = [], [], set()
+            for row in c.fetchall():
+                if row['Username'] is None:
+                    failed.append(row['PhoneNumber'])
+                else:
+                    enrolled.append((row['Username'], row['PhoneNumber']))
+                    enrolled_ids.add(row['User_ID'])
+
+            # Only members new to the fund get a first-period log: an existing member's may have been archived
+            c.execute("""
+                INSERT INTO Payment_Logs (User_ID, List_ID, Amount, DueDate, Status)
+                SELECT DISTINCT u.User_ID, fl.List_ID, fl.Amount, fl.DueDate, 'Unpaid'
+                FROM temp.Enroll_Phones e
+                JOIN Users u ON u.PhoneNumber = e.PhoneNumber AND u.Role = 'Member'
+                JOIN Fund_Lists fl ON fl.List_ID = ?
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM Memberships m WHERE m.User_ID = u.User_ID AND m.List_ID = fl.List_ID
+                ) AND NOT EXISTS (
+                    SELECT 1 FROM Payment_Logs pl
+                    WHERE pl.User_ID = u.User_ID AND pl.List_ID = fl.List_ID AND pl.DueDate = fl.DueDate
+                )
+            """, (list_id,))
+            c.execute("""
+                INSERT OR IGNORE INTO Memberships (User_ID, List_ID)
+                SELECT DISTINCT u.User_ID, ?
+                FROM temp.Enroll_Phones e
+                JOIN Users u ON u.PhoneNumber = e.PhoneNumber AND u.Role = 'Member'
+            """, (list_id,))
+            c.execute("DELETE FROM temp.Enroll_Phones")
+            conn.commit()
+            _invalidate_members(enrolled_ids)
+            return True, enrolled, failed, None
+        except Exception as e:
+            conn.rollback()
+            return False, [], [], str(e)
 
 def get_members_in_fund(list_id):
     """Fetches all members enrolled in a specific fund."""
-    conn = get_db_connection()
-    query = "SELECT u.User_ID, u.Username, u.PhoneNumber FROM Users u JOIN Memberships m ON u.User_ID = m.User_ID WHERE m.List_ID = ?"
-    df = pd.read_sql_query(query, conn, params=(list_id,))
-    conn.close()
-    return df
+    with db_connection() as conn:
+        query = "SELECT u.User_ID, u.Username, u.PhoneNumber FROM Users u JOIN Memberships m ON u.User_ID = m.User_ID WHERE m.List_ID = ?"
+        df = pd.read_sql_query(query, conn, params=(list_id,))
+        return df
 
 def remove_member_from_fund(user_id, list_id):
     """Removes a member from a fund and deletes their unpaid logs."""
-    conn = get_db_connection()
-    c = conn.cursor()
-    try:
-        c.execute("DELETE FROM Memberships WHERE User_ID = ? AND List_ID = ?", (user_id, list_id))
-        c.execute("DELETE FROM Payment_Logs WHERE User_ID = ? AND List_ID = ? AND Status = 'Unpaid'", (user_id, list_id))
-        conn.commit()
-        return True, None
-    except Exception as e:
-        conn.rollback()
-        return False, str(e)
-    finally:
-        conn.close()
+    with db_connection() as conn:
+        c = conn.cursor()
+        try:
+            c.execute("DELETE FROM Memberships WHERE User_ID = ? AND List_ID = ?", (user_id, list_id))
+            c.execute("DELETE FROM Payment_Logs WHERE User_ID = ? AND List_ID = ? AND Status = 'Unpaid'", (user_id, list_id))
+            conn.commit()
+            _invalidate_members([user_id])
+            return True, None
+        except Exception as e:
+            conn.rollback()
+            return False, str(e)
 
 def delete_fund(list_id):
-    """Deletes a fund, including all memberships and payment logs."""
-    conn = get_db_connection()
-    c = conn.cursor()
+    """Deletes a fund, including all memberships and payment logs, archived ones too."""
+    directory = _archive_dir()
+    owner = f"{os.getpid()}:{threading.get_ident()}"
+    if not acquire_job_lock(ARCHIVE_LOCK, owner, 3600):
+        return False, "An archive run is in progress; try again once it finishes."
     try:
-        c.execute("BEGIN TRANSACTION;")
-        c.execute("DELETE FROM Payment_Logs WHERE List_ID = ?", (list_id,))
-        c.execute("DELETE FROM Memberships WHERE List_ID = ?", (list_id,))
-        c.execute("DELETE FROM Fund_Lists WHERE List_ID = ?", (list_id,))
-        conn.commit()
+        with db_connection() as conn:
+            c = conn.cursor()
+            written = []
+            try:
+                c.execute("BEGIN TRANSACTION;")
+                c.execute("DELETE FROM Payment_Logs WHERE List_ID = ?", (list_id,))
+                c.execute("DELETE FROM Memberships WHERE List_ID = ?", (list_id,))
+                c.execute("DELETE FROM Fund_Lists WHERE List_ID = ?", (list_id,))
+                # Archived logs of the fund go too, or the archive totals would keep counting them
+                c.execute("SELECT Path FROM Archive_Files")
+                written, replaced = archive.rewrite_excluding(directory, [row['Path'] for row in c.fetchall()],
+                                                              pc.field('List_ID') == int(list_id))
+                c.executemany("DELETE FROM Archive_Files WHERE Path = ?", [(path,) for path in replaced])
+                c.executemany("""
+                    INSERT INTO Archive_Files (Path, Year, Rows, Total_Amount, Min_DueDate, Max_DueDate)
+                    VALUES (:Path, :Year, :Rows, :Total_Amount, :Min_DueDate, :Max_DueDate)
+                """, written)
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                archive.remove_files(directory, [entry['Path'] for entry in written])
+                return False, str(e)
+        # A crash before this leaves only unlisted files, which the next archive run removes
+        archive.remove_files(directory, replaced)
+        invalidate('funds', 'archive')
         return True, None
-    except Exception as e:
-        conn.rollback()
-        return False, str(e)
     finally:
-        conn.close()
+        release_job_lock(ARCHIVE_LOCK, owner)
 
 def get_reminders_preview(list_id=None):
     """Fetches a preview of members with unpaid dues for reminders."""
-    conn = get_db_connection()
-    base_query = "SELECT u.Username, u.PhoneNumber FROM Payment_Logs pl JOIN Users u ON pl.User_ID = u.User_ID WHERE pl.Status = 'Unpaid'"
-    params = []
-    if list_id:
-        base_query += " AND pl.List_ID = ?"
-        params.append(list_id)
-    df = pd.read_sql_query(base_query, conn, params=params)
-    conn.close()
-    return df
+    with db_connection() as conn:
+        base_query = "SELECT u.Username, u.PhoneNumber FROM Payment_Logs pl JOIN Users u ON pl.User_ID = u.User_ID WHERE pl.Status = 'Unpaid'"
+        params = []
+        if list_id:
+            base_query += " AND pl.List_ID = ?"
+            params.append(list_id)
+        df = pd.read_sql_query(base_query, conn, params=params)
+        return df
 
 def get_reminders_to_send(list_id=None):
     """Fetches the full details of reminders to be sent."""
-    conn = get_db_connection()
-    base_query = """
-        SELECT pl.User_ID, pl.List_ID, u.Username, u.PhoneNumber, u.Email, fl.ListName, pl.Amount
-        FROM Payment_Logs pl
-        JOIN Users u ON pl.User_ID = u.User_ID
-        JOIN Fund_Lists fl ON pl.List_ID = fl.List_ID
-        WHERE pl.Status = 'Unpaid'
+    with db_connection() as conn:
+        base_query = """
+            SELECT pl.Log_ID, pl.User_ID, pl.List_ID, u.Username, u.PhoneNumber, u.Email, fl.ListName, pl.Amount
+            FROM Payment_Logs pl
+            JOIN Users u ON pl.User_ID = u.User_ID
+            JOIN Fund_Lists fl ON pl.List_ID = fl.List_ID
+            WHERE pl.Status = 'Unpaid'
+        """
+        params = []
+        if list_id:
+            base_query += " AND pl.List_ID = ?"
+            params.append(list_id)
+        df = pd.read_sql_query(base_query, conn, params=params)
+        return df.to_dict('records')
+
+# One line per member and fund over the open runs of _ARREARS_RUNS. The last log of a run already
+# carries the run's compounded arrears, so a fund's amount owed is the sum of its runs' last logs.
+_REMINDER_DIGESTS = _ARREARS_RUNS + """
+    , fund_lines AS (
+        SELECT r.User_ID, r.List_ID, SUM(CASE WHEN r.Period = r.Run_Length THEN r.Amount END) AS Amount,
+               COUNT(*) AS Periods, MIN(r.DueDate) AS Oldest_Due
+        FROM open_runs r
+        GROUP BY r.User_ID, r.List_ID
+    ),
+    lines AS (
+        SELECT f.User_ID, f.List_ID, f.Amount, f.Periods,
+               fl.ListName || ': ₹' || printf('%.2f', f.Amount) ||
+               CASE WHEN f.Periods > 1 THEN ' (' || f.Periods || ' periods, since ' || f.Oldest_Due || ')'
+                    ELSE ' (due ' || f.Oldest_Due || ')' END AS Line
+        FROM fund_lines f
+        JOIN Fund_Lists fl ON fl.List_ID = f.List_ID
+        ORDER BY f.User_ID, fl.ListName
+    )
+    SELECT f.User_ID, u.Username, u.PhoneNumber, u.Email, COUNT(*) AS Funds, SUM(f.Periods) AS Periods,
+           SUM(f.Amount) AS Total_Amount, group_concat(f.List_ID) AS List_IDs, group_concat(f.Line, char(10)) AS Fund_Lines
+    FROM lines f
+    JOIN Users u ON u.User_ID = f.User_ID
+    {throttle}
+    GROUP BY f.User_ID
+    ORDER BY u.Username
+"""
+
+def get_reminder_digests(list_id=None, skip_reminded_within_hours=0):
     """
-    params = []
+    Aggregates the open (Unpaid or Rejected) logs of each member into one reminder: Funds, Periods, Total_Amount, List_IDs
+    (comma-separated) and Fund_Lines, one 'Fund: ₹amount (...)' line per fund. Members reminded within
+    the last skip_reminded_within_hours hours (about list_id, if given) are left out.
+    """
+    fund_filter, throttle, params = "", "", []
     if list_id:
-        base_query += " AND pl.List_ID = ?"
+        fund_filter = " AND pl.List_ID = ?"
         params.append(list_id)
-    df = pd.read_sql_query(base_query, conn, params=params)
-    conn.close()
-    return df.to_dict('records')
+    if skip_reminded_within_hours:
+        # Served by idx_notification_user_sent, or idx_notification_user_list for one fund
+        throttle = f"""
+            WHERE NOT EXISTS (
+                SELECT 1 FROM Notification_Log nl
+                WHERE nl.User_ID = f.User_ID AND nl.SentTimestamp >= datetime('now', ?) {'AND nl.List_ID = ?' if list_id else ''}
+            )
+        """
+        params.append(f"-{float(skip_reminded_within_hours)} hours")
+        if list_id:
+            params.append(list_id)
+    with db_connection() as conn:
+        df = pd.read_sql_query(_REMINDER_DIGESTS.format(filters=fund_filter, throttle=throttle), conn, params=params)
+        return df
 
 def log_notification(user_id, list_id):
     """Logs that a notification has been sent to a user for a fund."""
-    conn = get_db_connection()
-    c = conn.cursor()
-    try:
-        c.execute("INSERT INTO Notification_Log (User_ID, List_ID) VALUES (?, ?)", (user_id, list_id))
+    with db_connection() as conn:
+        c = conn.cursor()
+        try:
+            c.execute("INSERT INTO Notification_Log (User_ID, List_ID) VALUES (?, ?)", (user_id, list_id))
+            conn.commit()
+        except Exception as e:
+            print(f"Error logging notification: {e}") # Or use a proper logger
+
+def enqueue_notifications(batch_id, messages):
+    """
+    Queues outbound messages for the notification dispatcher. Each message is a dict with
+    Idempotency_Key, User_ID, List_ID, Channel, Recipient, Subject and Body, plus List_IDs for a
+    digest covering several funds; messages whose key was already queued are skipped.
+    Returns (success, number queued, error).
+    """
+    rows = [(batch_id, m['Idempotency_Key'], m['User_ID'], m['List_ID'], m['Channel'], m['Recipient'], m.get('Subject'), m['Body'])
+            for m in messages]
+    fund_rows = [(list_id, m['Idempotency_Key']) for m in messages for list_id in m.get('List_IDs', ())]
+    with db_connection() as conn:
+        c = conn.cursor()
+        try:
+            before = conn.total_changes
+            c.executemany("""
+                INSERT OR IGNORE INTO Notification_Outbox (Batch_ID, Idempotency_Key, User_ID, List_ID, Channel, Recipient, Subject, Body)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """, rows)
+            queued = conn.total_changes - before
+            c.executemany("""
+                INSERT OR IGNORE INTO Notification_Outbox_Funds (Outbox_ID, List_ID)
+                SELECT Outbox_ID, ? FROM Notification_Outbox WHERE Idempotency_Key = ?
+            """, fund_rows)
+            conn.commit()
+            return True, queued, None
+        except Exception as e:
+            conn.rollback()
+            return False, 0, str(e)
+
+def claim_outbox_messages(channel, limit):
+    """Marks up to `limit` due messages of a channel as Sending and returns them, oldest first."""
+    with db_connection() as conn:
+        c = conn.cursor()
+        try:
+            c.execute("BEGIN IMMEDIATE")
+            c.execute("""
+                SELECT * FROM Notification_Outbox
+                WHERE Status = 'Queued' AND Channel = ? AND Next_Attempt_At <= CURRENT_TIMESTAMP
+                ORDER BY Next_Attempt_At, Outbox_ID
+                LIMIT ?
+            """, (channel, limit))
+            # Returned as claimed, so Attempts counts the attempt about to be made
+            messages = [dict(m, Status='Sending', Attempts=m['Attempts'] + 1) for m in c.fetchall()]
+            c.executemany("UPDATE Notification_Outbox SET Status = 'Sending', Attempts = Attempts + 1, Claimed_At = CURRENT_TIMESTAMP WHERE Outbox_ID = ?",
+                          [(m['Outbox_ID'],) for m in messages])
+            conn.commit()
+            return messages
+        except Exception:
+            conn.rollback()
+            raise
+
+def mark_outbox_sent(outbox_id):
+    """Marks a message as delivered and records it in Notification_Log exactly once per fund it covers."""
+    with db_connection() as conn:
+        c = conn.cursor()
+        try:
+            c.execute("UPDATE Notification_Outbox SET Status = 'Sent', Sent_At = CURRENT_TIMESTAMP, Last_Error = NULL WHERE Outbox_ID = ?",
+                      (outbox_id,))
+            c.execute("""
+                INSERT OR IGNORE INTO Notification_Log (User_ID, List_ID, Outbox_ID)
+                SELECT o.User_ID, COALESCE(f.List_ID, o.List_ID), o.Outbox_ID
+                FROM Notification_Outbox o
+                LEFT JOIN Notification_Outbox_Funds f ON f.Outbox_ID = o.Outbox_ID
+                WHERE o.Outbox_ID = ?
+            """, (outbox_id,))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+def mark_outbox_failed(outbox_id, error, retry_in=None):
+    """Records a failed attempt. The message is queued again after `retry_in` seconds, or given up on if None."""
+    with db_connection() as conn:
+        c = conn.cursor()
+        try:
+            if retry_in is None:
+                c.execute("UPDATE Notification_Outbox SET Status = 'Failed', Last_Error = ? WHERE Outbox_ID = ?", (error, outbox_id))
+            else:
+                c.execute("""
+                    UPDATE Notification_Outbox
+                    SET Status = 'Queued', Last_Error = ?, Next_Attempt_At = datetime('now', ?)
+                    WHERE Outbox_ID = ?
+                """, (error, f"+{int(retry_in)} seconds", outbox_id))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+def requeue_stale_outbox_messages(older_than_seconds=None):
+    """
+    Puts messages left in Sending back in the queue: all of them, as when a process starts, or
+    only those claimed more than `older_than_seconds` ago, whose outcome was never recorded.
+    """
+    with db_connection() as conn:
+        c = conn.cursor()
+        if older_than_seconds is None:
+            c.execute("UPDATE Notification_Outbox SET Status = 'Queued' WHERE Status = 'Sending'")
+        else:
+            c.execute("""
+                UPDATE Notification_Outbox SET Status = 'Queued'
+                WHERE Status = 'Sending' AND COALESCE(Claimed_At, '') <= datetime('now', ?)
+            """, (f"-{int(older_than_seconds)} seconds",))
         conn.commit()
-    except Exception as e:
-        print(f"Error logging notification: {e}") # Or use a proper logger
-    finally:
-        conn.close()
+        return c.rowcount
+
+def get_outbox_progress(batch_id):
+    """Returns the number of messages per channel and status for a batch."""
+    with db_connection() as conn:
+        query = """
+            SELECT Channel, Status, COUNT(*) AS Messages
+            FROM Notification_Outbox
+            WHERE Batch_ID = ?
+            GROUP BY Channel, Status
+        """
+        df = pd.read_sql_query(query, conn, params=(batch_id,))
+        return df
+
+def get_outbox_failures(batch_id):
+    """Fetches the messages of a batch that could not be delivered."""
+    with db_connection() as conn:
+        query = """
+            SELECT o.Channel, u.Username, o.Recipient, o.Attempts, o.Last_Error
+            FROM Notification_Outbox o
+            JOIN Users u ON o.User_ID = u.User_ID
+            WHERE o.Batch_ID = ? AND o.Status = 'Failed'
+        """
+        df = pd.read_sql_query(query, conn, params=(batch_id,))
+        return df
 
 def get_unverified_transactions():
     """Fetches all transaction IDs pending verification."""
-    conn = get_db_connection()
-    query = """
-        SELECT ut.ID, pl.Log_ID, ut.Transaction_ID, u.Username, fl.ListName, pl.Amount
+    with db_connection() as conn:
+        query = """
+            SELECT ut.ID, pl.Log_ID, ut.Transaction_ID, u.Username, fl.ListName, pl.Amount
+            FROM Unverified_Transaction_IDs ut
+            JOIN Payment_Logs pl ON ut.Log_ID = pl.Log_ID
+            JOIN Users u ON pl.User_ID = u.User_ID
+            JOIN Fund_Lists fl ON pl.List_ID = fl.List_ID
+            WHERE pl.Status = 'Pending Verification'
+        """
+        df = pd.read_sql_query(query, conn)
+        return df
+
+def import_bank_statement(source, txn_id_col, amount_col, source_name=None):
+    """
+    Adds a statement CSV's lines to the Bank_Transactions ledger, reading it in chunks. Lines whose
+    transaction ID is already stored, from this or an earlier statement, are skipped, so overlapping
+    exports can be imported as they come. Returns (success, number of new lines, error).
+    """
+    with db_connection() as conn:
+        c = conn.cursor()
+        try:
+            before = conn.total_changes
+            for lookup in reconciliation.iter_statement_lookups(source, txn_id_col, amount_col):
+                c.executemany("INSERT OR IGNORE INTO Bank_Transactions (Transaction_ID, Amount, Source) VALUES (?, ?, ?)",
+                              [(txn_id, amount, source_name) for txn_id, amount in zip(lookup.index.tolist(), lookup.tolist())])
+            imported = conn.total_changes - before
+            conn.commit()
+            return True, imported, None
+        except Exception as e:
+            conn.rollback()
+            return False, 0, str(e)
+
+def get_bank_ledger_summary():
+    """Returns the number of imported statement lines and when the latest was imported."""
+    with db_connection() as conn:
+        c = conn.cursor()
+        c.execute("SELECT COUNT(*) AS Lines, MAX(Imported_At) AS Last_Imported FROM Bank_Transactions")
+        row = c.fetchone()
+        return {'lines': row['Lines'], 'last_imported': row['Last_Imported']}
+
+def match_bank_transactions(log_ids=None):
+    """
+    Settles the pending submissions whose transaction ID is on the Bank_Transactions ledger: approved
+    when the amounts agree and the statement line has not paid for another log yet, rejected otherwise.
+    Submissions not on the ledger yet stay pending for a later import. Pass log_ids to match just those
+    payment logs. Returns (success, approved rows, rejected rows with a Reason, error).
+    """
+    filters, params = "", []
+    if log_ids:
+        filters = f"AND ut.Log_ID IN ({', '.join('?' * len(log_ids))})"
+        params = list(log_ids)
+    # Each pending submission is one primary-key probe into the ledger
+    query = f"""
+        SELECT ut.ID, pl.Log_ID, ut.Transaction_ID, u.Username, fl.ListName, pl.Amount,
+               bt.Amount AS Bank_Amount, bt.Matched_Log_ID
         FROM Unverified_Transaction_IDs ut
+        JOIN Bank_Transactions bt ON bt.Transaction_ID = ut.Transaction_ID
         JOIN Payment_Logs pl ON ut.Log_ID = pl.Log_ID
         JOIN Users u ON pl.User_ID = u.User_ID
         JOIN Fund_Lists fl ON pl.List_ID = fl.List_ID
-        WHERE pl.Status = 'Pending Verification'
+        WHERE pl.Status = 'Pending Verification' {filters}
+        ORDER BY ut.ID
     """
-    df = pd.read_sql_query(query, conn)
-    conn.close()
-    return df
+    with db_connection() as conn:
+        c = conn.cursor()
+        try:
+            # The write lock is taken before the lookup so two matches cannot use the same statement line
+            c.execute("BEGIN IMMEDIATE")
+            matched_df = pd.read_sql_query(query, conn, params=params)
+            if matched_df.empty:
+                conn.rollback()
+                return True, [], [], None
+            # A statement line pays for one log: the earliest submission of an unused line gets it
+            used = matched_df['Matched_Log_ID'].notna() | matched_df.duplicated(subset='Transaction_ID')
+            statement_lookup = matched_df[~used].set_index('Transaction_ID')['Bank_Amount']
+            reconciled_df = reconciliation.reconcile(matched_df.drop(columns=['Bank_Amount', 'Matched_Log_ID']), statement_lookup)
+            reconciled_df.loc[used, 'Approved'] = False
+            reconciled_df.loc[used, 'Reason'] = "Transaction ID already used for another payment"
 
-def verify_transactions(unverified_df, bank_df, txn_id_col, amount_col):
-    """Cross-verifies transactions against a bank statement, checking both transaction ID and amount."""
-    conn = get_db_connection()
-    c = conn.cursor()
-    found_txns_details = []
-    rejected_txns = [] # This will now be a list of dicts with reasons
+            user_ids = _write_reconciliation(c, reconciled_df)
+            approved = reconciled_df[reconciled_df['Approved']]
+            c.executemany("UPDATE Bank_Transactions SET Matched_Log_ID = ? WHERE Transaction_ID = ?",
+                          list(zip(approved['Log_ID'].tolist(), approved['Transaction_ID'].tolist())))
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            return False, [], [], str(e)
+    _invalidate_members(user_ids)
+    return (True, *_reconciliation_report(reconciled_df), None)
+
+def _write_reconciliation(c, reconciled_df):
+    """Writes the outcome of reconciliation.reconcile on the caller's transaction; returns the affected User_IDs."""
+    approved = reconciled_df[reconciled_df['Approved']]
+    rejected = reconciled_df[~reconciled_df['Approved']]
+    payment_date = datetime.now().date()
+    c.executemany("UPDATE Payment_Logs SET Status = 'Paid', PaymentDate = ? WHERE Log_ID = ?",
+                  [(payment_date, log_id) for log_id in approved['Log_ID'].tolist()])
+    c.executemany("INSERT OR IGNORE INTO Verified_Transactions (Transaction_ID) VALUES (?)",
+                  [(txn_id,) for txn_id in approved['Submitted_ID'].tolist()])
+    c.executemany("UPDATE Payment_Logs SET Status = 'Rejected' WHERE Log_ID = ?",
+                  [(log_id,) for log_id in rejected['Log_ID'].tolist()])
+    # Remove from unverified table regardless of outcome
+    c.executemany("DELETE FROM Unverified_Transaction_IDs WHERE ID = ?",
+                  [(submission_id,) for submission_id in reconciled_df['ID'].tolist()])
+    return _log_user_ids(c, reconciled_df['Log_ID'].tolist())
+
+def _reconciliation_report(reconciled_df):
+    """The approved and rejected submissions as rows for display."""
+    approved = reconciled_df[reconciled_df['Approved']]
+    rejected = reconciled_df[~reconciled_df['Approved']]
+    found_txns_details = [
+        {"Transaction ID": txn_id, "Username": username, "Fund": fund, "Amount": amount}
+        for txn_id, username, fund, amount in zip(approved['Submitted_ID'].tolist(), approved['Username'].tolist(),
+                                                  approved['ListName'].tolist(), approved['Submitted_Amount'].tolist())
+    ]
+    rejected_txns = [
+        {"Transaction ID": txn_id, "Username": username, "Amount": amount, "Reason": reason}
+        for txn_id, username, amount, reason in zip(rejected['Submitted_ID'].tolist(), rejected['Username'].tolist(),
+                                                    rejected['Submitted_Amount'].tolist(), rejected['Reason'].tolist())
+    ]
+    return found_txns_details, rejected_txns
 
-    try:
-        # --- Data Cleaning ---
-        # Handle potential whitespace, quotes, and ensure consistent data types
-        bank_df[txn_id_col] = bank_df[txn_id_col].astype(str).str.strip().str.strip("'\"")
-        # Additional step to handle potential '.0' suffix for purely numeric IDs
-        bank_df[txn_id_col] = bank_df[txn_id_col].apply(lambda x: x.split('.')[0] if isinstance(x, str) and '.' in x and x.replace('.', '').isdigit() else x)
-
-        # Coerce errors will turn non-numeric values into NaN, which are then dropped.
-        bank_df[amount_col] = pd.to_numeric(bank_df[amount_col].astype(str).str.strip().str.strip("'\""), errors='coerce')
-        bank_df.dropna(subset=[amount_col], inplace=True)
-        
-        bank_df_indexed = bank_df.set_index(txn_id_col)
-
-        with conn:
-            for _, row in unverified_df.iterrows():
-                log_id_to_update = row['Log_ID']
-                submitted_txn_id = str(row['Transaction_ID']).strip()
-                submitted_amount = float(row['Amount'])
-                
-                rejection_reason = None
-                is_approved = False
-
-                if submitted_txn_id in bank_df_indexed.index:
-                    # Use .loc and handle potential duplicates by taking the first one
-                    bank_record = bank_df_indexed.loc[[submitted_txn_id]].iloc[0]
-                    bank_amount = float(bank_record[amount_col])
-                    
-                    if bank_amount == submitted_amount:
-                        is_approved = True
-                    else:
-                        rejection_reason = f"Amount Mismatch (Bank: {bank_amount}, Submitted: {submitted_amount})"
-                else:
-                    rejection_reason = "Transaction ID not found in statement"
-
-                if is_approved:
-                    # Found and amount matches: Update status to 'Paid'
-                    c.execute("UPDATE Payment_Logs SET Status = 'Paid', PaymentDate = ? WHERE Log_ID = ?", 
-                              (datetime.now().date(), log_id_to_update))
-                    # Add the transaction ID to the permanent verified list
-                    c.execute("INSERT OR IGNORE INTO Verified_Transactions (Transaction_ID) VALUES (?)", (submitted_txn_id,))
-                    found_txns_details.append({
-                        "Transaction ID": submitted_txn_id,
-                        "Username": row['Username'],
-                        "Fund": row['ListName'],
-                        "Amount": submitted_amount
-                    })
-                else:
-                    # ID not found or amount mismatch: Update status to 'Rejected'
-                    c.execute("UPDATE Payment_Logs SET Status = 'Rejected' WHERE Log_ID = ?", (log_id_to_update,))
-                    rejected_txns.append({
-                        "Transaction ID": submitted_txn_id,
-                        "Username": row['Username'],
-                        "Amount": submitted_amount,
-                        "Reason": rejection_reason
-                    })
-                
-                # Remove from unverified table regardless of outcome
-                c.execute("DELETE FROM Unverified_Transaction_IDs WHERE ID = ?", (row['ID'],))
-                
-        return True, found_txns_details, rejected_txns, None
-    except Exception as e:
-        return False, [], [], str(e)
-    finally:
-        conn.close()
-        
 def get_member_dues(user_id):
     """Fetches all outstanding dues for a specific member."""
-    conn = get_db_connection()
-    query = """
-        SELECT pl.Log_ID, fl.ListName, pl.Amount, pl.DueDate, pl.Status 
-        FROM Payment_Logs pl 
-        JOIN Fund_Lists fl ON pl.List_ID = fl.List_ID 
-        WHERE pl.User_ID = ? AND pl.Status IN ('Unpaid', 'Rejected', 'Pending Verification', 'Flagged') 
-        ORDER BY pl.DueDate ASC
-    """
-    df = pd.read_sql_query(query, conn, params=(user_id,))
-    conn.close()
-    return df
+    with db_connection() as conn:
+        query = """
+            SELECT pl.Log_ID, fl.ListName, pl.Amount, pl.DueDate, pl.Status 
+            FROM Payment_Logs pl 
+            JOIN Fund_Lists fl ON pl.List_ID = fl.List_ID 
+            WHERE pl.User_ID = ? AND pl.Status IN ('Unpaid', 'Rejected', 'Pending Verification', 'Flagged') 
+            ORDER BY pl.DueDate ASC
+        """
+        df = pd.read_sql_query(query, conn, params=(user_id,))
+        return categorize_ledger(df)
 
+@cached_query('funds')
 def get_fund_vpa(list_name):
     """Fetches the VPA for a specific fund."""
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute("SELECT VPA FROM Fund_Lists WHERE ListName = ?", (list_name,))
-    result = c.fetchone()
-    conn.close()
-    return result['VPA'] if result else None
+    with db_connection() as conn:
+        c = conn.cursor()
+        c.execute("SELECT VPA FROM Fund_Lists WHERE ListName = ?", (list_name,))
+        result = c.fetchone()
+        return result['VPA'] if result else None
 
 def submit_transaction_for_verification(log_id, transaction_id):
-    """Submits a transaction ID for verification by an admin."""
-    conn = get_db_connection()
-    c = conn.cursor()
-    try:
-        with conn:
-            # Update payment log status
-            c.execute("UPDATE Payment_Logs SET Status = 'Pending Verification', Transaction_ID = ? WHERE Log_ID = ?", 
-                      (transaction_id, log_id))
-            # Store transaction ID for admin verification
-            c.execute("INSERT INTO Unverified_Transaction_IDs (Log_ID, Transaction_ID) VALUES (?, ?)",
-                      (log_id, transaction_id))
-        return True, None
-    except Exception as e:
-        return False, str(e)
-    finally:
-        conn.close()
+    """Submits a transaction ID for verification; it is settled at once if an imported statement already has it."""
+    with db_connection() as conn:
+        c = conn.cursor()
+        try:
+            with conn:
+                # Update payment log status
+                c.execute("UPDATE Payment_Logs SET Status = 'Pending Verification', Transaction_ID = ? WHERE Log_ID = ?", 
+                          (transaction_id, log_id))
+                # Store transaction ID for admin verification
+                c.execute("INSERT INTO Unverified_Transaction_IDs (Log_ID, Transaction_ID) VALUES (?, ?)",
+                          (log_id, transaction_id))
+            _invalidate_members(_log_user_ids(c, [log_id]))
+        except Exception as e:
+            return False, str(e)
+    # Settle it straight away if the payment is already on an imported statement
+    success, _, _, error_message = match_bank_transactions(log_ids=[log_id])
+    if not success:
+        # The submission itself is saved and stays pending for the next import or admin verification
+        logger.warning("Could not match log %s against the bank ledger: %s", log_id, error_message)
+    return True, None
 
 def get_payment_history(user_id):
-    """Fetches the payment history for a specific member."""
-    conn = get_db_connection()
-    query = """
-        SELECT fl.ListName, pl.Amount, pl.DueDate, pl.Status, pl.PaymentDate 
-        FROM Payment_Logs pl 
-        JOIN Fund_Lists fl ON pl.List_ID = fl.List_ID 
-        WHERE pl.User_ID = ? AND pl.Status != 'Unpaid' 
-        ORDER BY pl.DueDate DESC
+    """Fetches the payment history for a specific member, archived logs included."""
+    with db_connection() as conn:
+        query = """
+            SELECT fl.ListName, pl.Amount, pl.DueDate, pl.Status, pl.PaymentDate 
+            FROM Payment_Logs pl 
+            JOIN Fund_Lists fl ON pl.List_ID = fl.List_ID 
+            WHERE pl.User_ID = ? AND pl.Status != 'Unpaid' 
+            ORDER BY pl.DueDate DESC
+        """
+        df = pd.read_sql_query(query, conn, params=(user_id,))
+        archived_df = _read_archive(conn, user_id=user_id)
+    if not archived_df.empty:
+        df = _union_archive(df, archived_df).sort_values('DueDate', ascending=False, kind='stable').reset_index(drop=True)
+    return categorize_ledger(df)
+
+def get_payment_history_page(user_id, cursor=None, page_size=50, as_arrow=False):
+    """Fetches one page of a member's payment history, newest due date first. Returns (DataFrame, next_cursor)."""
+    return get_ledger_page(statuses=HISTORY_STATUSES, user_id=user_id,
+                           sort_by='DueDate', descending=True, cursor=cursor, page_size=page_size, as_arrow=as_arrow)
+
+def _member_tag(user_id):
+    return f"member:{int(user_id)}"
+
+def _invalidate_members(user_ids):
+    """Drops the cached snapshots of the members whose payment logs were just written."""
+    invalidate(*{_member_tag(user_id) for user_id in user_ids})
+
+def _log_user_ids(c, log_ids, chunk_size=500):
+    user_ids = set()
+    log_ids = list(log_ids)
+    for start in range(0, len(log_ids), chunk_size):
+        chunk = log_ids[start:start + chunk_size]
+        c.execute(f"SELECT DISTINCT User_ID FROM Payment_Logs WHERE Log_ID IN ({', '.join('?' * len(chunk))})", chunk)
+        user_ids.update(row[0] for row in c.fetchall())
+    return user_ids
+
+@cached_query('funds', 'archive', arg_tag=_member_tag)
+def get_member_snapshot(user_id):
     """
-    df = pd.read_sql_query(query, conn, params=(user_id,))
-    conn.close()
-    return df
+    Everything the member dashboard shows, read on one connection and cached until the member's logs change.
+    Returns a dict with 'dues' (as get_member_dues), 'paid_total', 'fund_vpas' (ListName -> VPA of each
+    fund with an outstanding due) and 'history', the first get_payment_history_page as (pyarrow.Table, next_cursor).
+    """
+    with db_connection() as conn:
+        query = """
+            SELECT pl.Log_ID, fl.ListName, pl.Amount, pl.DueDate, pl.Status, fl.VPA
+            FROM Payment_Logs pl
+            JOIN Fund_Lists fl ON pl.List_ID = fl.List_ID
+            WHERE pl.User_ID = ? AND pl.Status IN ('Unpaid', 'Rejected', 'Pending Verification', 'Flagged')
+            ORDER BY pl.DueDate ASC
+        """
+        dues_df = pd.read_sql_query(query, conn, params=(user_id,))
+        c = conn.cursor()
+        c.execute("SELECT COALESCE(SUM(Amount), 0) FROM Payment_Logs WHERE User_ID = ? AND Status = 'Paid'", (user_id,))
+        paid_total = c.fetchone()[0]
+        history = _ledger_page(conn, HISTORY_STATUSES, None, user_id, None, None, 'DueDate', True, None, MEMBER_HISTORY_PAGE_SIZE, True)
+    paths = _archive_paths()
+    if paths:
+        paid_total += archive.sum_amount(archive.scan(_archive_dir(), paths, archive.build_filter(user_id=user_id), columns=['Amount']))
+
+    fund_vpas = {list_name: vpa if pd.notna(vpa) else None for list_name, vpa in zip(dues_df['ListName'], dues_df['VPA'])}
+    return {
+        'dues': categorize_ledger(dues_df.drop(columns='VPA')),
+        'paid_total': paid_total,
+        'fund_vpas': fund_vpas,
+        'history': history,
+    }
 
+@cached_query('funds')
 def get_fund_details(list_id):
     """Fetches the amount and due date for a specific fund."""
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute("SELECT Amount, DueDate FROM Fund_Lists WHERE List_ID = ?", (list_id,))
-    result = c.fetchone()
-    conn.close()
-    return result
+    with db_connection() as conn:
+        c = conn.cursor()
+        c.execute("SELECT Amount, DueDate FROM Fund_Lists WHERE List_ID = ?", (list_id,))
+        result = c.fetchone()
+        return result
 
 def payment_log_exists(user_id, list_id, due_date):
     """Checks if a payment log already exists for a user, fund, and due date."""
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute("SELECT 1 FROM Payment_Logs WHERE User_ID = ? AND List_ID = ? AND DueDate = ?", (user_id, list_id, due_date))
-    result = c.fetchone()
-    conn.close()
-    return result is not None
+    with db_connection() as conn:
+        c = conn.cursor()
+        c.execute("SELECT 1 FROM Payment_Logs WHERE User_ID = ? AND List_ID = ? AND DueDate = ?", (user_id, list_id, due_date))
+        result = c.fetchone()
+        return result is not None
 
 def is_transaction_id_verified(transaction_id):
     """Checks if a transaction ID has already been verified and stored."""
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute("SELECT 1 FROM Verified_Transactions WHERE Transaction_ID = ?", (transaction_id,))
-    result = c.fetchone()
-    conn.close()
-    return result is not None
+    with db_connection() as conn:
+        c = conn.cursor()
+        c.execute("SELECT 1 FROM Verified_Transactions WHERE Transaction_ID = ?", (transaction_id,))
+        result = c.fetchone()
+        return result is not None
 
 def clear_verified_transactions():
     """Clears all records from the Verified_Transactions table."""
-    conn = get_db_connection()
-    c = conn.cursor()
-    try:
-        c.execute("DELETE FROM Verified_Transactions")
-        conn.commit()
-        return True, None
-    except Exception as e:
-        conn.rollback()
-        return False, str(e)
-    finally:
-        conn.close()
+    with db_connection() as conn:
+        c = conn.cursor()
+        try:
+            c.execute("DELETE FROM Verified_Transactions")
+            conn.commit()
+            return True, None
+        except Exception as e:
+            conn.rollback()
+            return False, str(e)
 
 def get_verified_transactions():
     """Fetches all stored verified transaction IDs."""
-    conn = get_db_connection()
-    df = pd.read_sql_query("SELECT Transaction_ID, Verified_Timestamp FROM Verified_Transactions", conn)
-    conn.close()
-    return df
+    with db_connection() as conn:
+        df = pd.read_sql_query("SELECT Transaction_ID, Verified_Timestamp FROM Verified_Transactions", conn)
+        return df
 
 
+@cached_query('funds')
 def get_recurring_funds():
     """Fetches all funds with a recurring interval type."""
-    conn = get_db_connection()
-    df = pd.read_sql_query("SELECT * FROM Fund_Lists WHERE Interval_Type != 'One-Time'", conn)
-    conn.close()
-    return df
+    with db_connection() as conn:
+        df = pd.read_sql_query("SELECT * FROM Fund_Lists WHERE Interval_Type != 'One-Time'", conn)
+        return df
 
 def get_memberships():
     """Fetches all membership records."""
-    conn = get_db_connection()
-    df = pd.read_sql_query("SELECT * FROM Memberships", conn)
-    conn.close()
-    return df
+    with db_connection() as conn:
+        df = pd.read_sql_query("SELECT * FROM Memberships", conn)
+        return df
 
 def get_latest_payment_log(user_id, list_id):
     """Fetches the most recent payment log for a specific user and fund."""
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute(
-        "SELECT * FROM Payment_Logs WHERE User_ID = ? AND List_ID = ? ORDER BY DueDate DESC LIMIT 1",
-        (user_id, list_id)
-    )
-    result = c.fetchone()
-    conn.close()
-    return result
+    with db_connection() as conn:
+        c = conn.cursor()
+        c.execute(
+            "SELECT * FROM Payment_Logs WHERE User_ID = ? AND List_ID = ? ORDER BY DueDate DESC LIMIT 1",
+            (user_id, list_id)
+        )
+        result = c.fetchone()
+        return result
 
 def create_payment_log(user_id, list_id, amount, due_date, status='Unpaid'):
     """Creates a single new payment log entry."""
-    conn = get_db_connection()
-    c = conn.cursor()
-    try:
-        c.execute(
-            "INSERT INTO Payment_Logs (User_ID, List_ID, Amount, DueDate, Status) VALUES (?, ?, ?, ?, ?)",
-            (user_id, list_id, amount, due_date, status)
-        )
+    with db_connection() as conn:
+        c = conn.cursor()
+        try:
+            c.execute(
+                "INSERT INTO Payment_Logs (User_ID, List_ID, Amount, DueDate, Status) VALUES (?, ?, ?, ?, ?)",
+                (user_id, list_id, amount, due_date, status)
+            )
+            conn.commit()
+            _invalidate_members([user_id])
+            return True, None
+        except Exception as e:
+            conn.rollback()
+            return False, str(e)
+
+def get_max_log_id():
+    """Returns the highest Log_ID in Payment_Logs, or 0 if there are none."""
+    with db_connection() as conn:
+        c = conn.cursor()
+        c.execute("SELECT COALESCE(MAX(Log_ID), 0) FROM Payment_Logs")
+        return c.fetchone()[0]
+
+def get_unpaid_payment_details(after_log_id=0):
+    """Fetches what a payment QR code needs for every Unpaid log newer than after_log_id."""
+    with db_connection() as conn:
+        c = conn.cursor()
+        c.execute("""
+            SELECT pl.Log_ID, pl.User_ID, pl.Amount, fl.VPA
+            FROM Payment_Logs pl
+            JOIN Fund_Lists fl ON pl.List_ID = fl.List_ID
+            WHERE pl.Log_ID > ? AND pl.Status = 'Unpaid'
+        """, (after_log_id,))
+        return c.fetchall()
+
+def get_latest_recurring_payment_logs(list_ids=None):
+    """
+    Fetches the most recent payment log for every member of every recurring fund in one query.
+    Pass list_ids to restrict it to some funds.
+    """
+    params = []
+    fund_filter = ""
+    if list_ids is not None:
+        fund_filter = f"AND fl.List_ID IN ({', '.join('?' * len(list_ids))})"
+        params.extend(list_ids)
+    with db_connection() as conn:
+        c = conn.cursor()
+        # SQLite returns the bare columns from the row holding MAX(DueDate) within each group
+        c.execute(f"""
+            SELECT pl.User_ID, pl.List_ID, pl.Amount, pl.Status, MAX(pl.DueDate) AS DueDate,
+                   fl.Amount AS FundAmount, fl.Interval_Type
+            FROM Memberships m
+            JOIN Fund_Lists fl ON m.List_ID = fl.List_ID
+            JOIN Payment_Logs pl ON pl.User_ID = m.User_ID AND pl.List_ID = m.List_ID
+            WHERE fl.Interval_Type != 'One-Time' {fund_filter}
+            GROUP BY pl.User_ID, pl.List_ID
+            ORDER BY fl.List_ID, m.Membership_ID
+        """, params)
+        result = c.fetchall()
+        return result
+
+def acquire_job_lock(name, owner, lease_seconds):
+    """Takes or renews a named lease. Returns False if another owner holds an unexpired one."""
+    with db_connection() as conn:
+        c = conn.cursor()
+        try:
+            c.execute("BEGIN IMMEDIATE")
+            c.execute("DELETE FROM Job_Locks WHERE Name = ? AND Expires_At <= CURRENT_TIMESTAMP", (name,))
+            c.execute("""
+                INSERT INTO Job_Locks (Name, Owner, Expires_At) VALUES (?, ?, datetime('now', ?))
+                ON CONFLICT (Name) DO UPDATE SET Expires_At = excluded.Expires_At WHERE Owner = excluded.Owner
+            """, (name, owner, f"+{int(lease_seconds)} seconds"))
+            c.execute("SELECT Owner FROM Job_Locks WHERE Name = ?", (name,))
+            acquired = c.fetchone()['Owner'] == owner
+            conn.commit()
+            return acquired
+        except Exception:
+            conn.rollback()
+            raise
+
+def release_job_lock(name, owner):
+    with db_connection() as conn:
+        c = conn.cursor()
+        c.execute("DELETE FROM Job_Locks WHERE Name = ? AND Owner = ?", (name, owner))
         conn.commit()
-        return True, None
-    except Exception as e:
-        conn.rollback()
-        return False, str(e)
-    finally:
-        conn.close()
\ No newline at end of file
+
+def start_dues_run(trigger, interval_types, funds_total, checkpoint_list_id=0, funds_processed=0):
+    """Records the start of a dues generation run and returns its Run_ID."""
+    with db_connection() as conn:
+        c = conn.cursor()
+        c.execute("""
+            INSERT INTO Dues_Runs (Trigger, Interval_Types, Status, Funds_Total, Funds_Processed, Checkpoint_List_ID)
+            VALUES (?, ?, 'Running', ?, ?, ?)
+        """, (trigger, ','.join(interval_types), funds_total, funds_processed, checkpoint_list_id))
+        conn.commit()
+        return c.lastrowid
+
+def checkpoint_dues_run(run_id, checkpoint_list_id, funds_processed, logs_created):
+    """Records progress after a batch of funds has been committed."""
+    with db_connection() as conn:
+        c = conn.cursor()
+        c.execute("""
+            UPDATE Dues_Runs
+            SET Checkpoint_List_ID = ?, Funds_Processed = Funds_Processed + ?, Logs_Created = Logs_Created + ?
+            WHERE Run_ID = ?
+        """, (checkpoint_list_id, funds_processed, logs_created, run_id))
+        conn.commit()
+
+def finish_dues_run(run_id, status, duration_seconds, error=None):
+    with db_connection() as conn:
+        c = conn.cursor()
+        c.execute("UPDATE Dues_Runs SET Status = ?, Finished_At = CURRENT_TIMESTAMP, Duration_Seconds = ?, Error = ? WHERE Run_ID = ?",
+                  (status, duration_seconds, error, run_id))
+        conn.commit()
+
+def get_interrupted_dues_run(interval_types):
+    """
+    Marks runs left in Running by a stopped process as Interrupted and returns the latest one
+    for the same interval types, so a new run can resume from its checkpoint.
+    """
+    with db_connection() as conn:
+        c = conn.cursor()
+        c.execute("UPDATE Dues_Runs SET Status = 'Interrupted', Finished_At = CURRENT_TIMESTAMP WHERE Status = 'Running'")
+        c.execute("""
+            SELECT * FROM Dues_Runs
+            WHERE Status = 'Interrupted' AND Interval_Types = ?
+              AND Run_ID > COALESCE((SELECT MAX(Run_ID) FROM Dues_Runs WHERE Status = 'Succeeded' AND Interval_Types = ?), 0)
+            ORDER BY Run_ID DESC LIMIT 1
+        """, (','.join(interval_types), ','.join(interval_types)))
+        result = c.fetchone()
+        conn.commit()
+        return result
+
+def get_dues_runs(limit=20):
+    """Fetches the most recent dues generation runs."""
+    with db_connection() as conn:
+        query = """
+            SELECT Run_ID, Trigger, Interval_Types, Status, Started_At, Finished_At, Duration_Seconds,
+                   Funds_Processed, Funds_Total, Logs_Created, Error
+            FROM Dues_Runs
+            ORDER BY Run_ID DESC
+            LIMIT ?
+        """
+        df = pd.read_sql_query(query, conn, params=(limit,))
+        return df
+
+def get_last_successful_dues_runs():
+    """Returns when each interval type was last brought up to date, as {Interval_Type: 'YYYY-MM-DD HH:MM:SS'}."""
+    with db_connection() as conn:
+        c = conn.cursor()
+        c.execute("SELECT Interval_Types, MAX(Finished_At) AS Finished_At FROM Dues_Runs WHERE Status = 'Succeeded' GROUP BY Interval_Types")
+        last_runs = {}
+        for row in c.fetchall():
+            for interval_type in row['Interval_Types'].split(','):
+                last_runs[interval_type] = max(last_runs.get(interval_type, ''), row['Finished_At'])
+        return last_runs
+
+def create_payment_logs(payment_logs_to_create):
+    """Creates many payment log entries in a single transaction."""
+    with db_connection() as conn:
+        c = conn.cursor()
+        try:
+            c.executemany(
+                "INSERT INTO Payment_Logs (User_ID, List_ID, Amount, DueDate, Status) VALUES (?, ?, ?, ?, ?)",
+                payment_logs_to_create
+            )
+            conn.commit()
+            _invalidate_members(log[0] for log in payment_logs_to_create)
+            return True, None
+        except Exception as e:
+            conn.rollback()
+            return False, str(e)
+
+# Attribute every query to the public function that ran it
+instrumentation.instrument_module(globals())
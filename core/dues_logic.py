@@ -1,6 +1,14 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+import numpy as np
 from dateutil.relativedelta import relativedelta
-from core import db
+from core import db, instrumentation, qr_cache
+
+PARALLEL_THRESHOLD = 500000 # Latest logs below this are computed in-process; starting workers costs more than it saves
+CHUNKS_PER_WORKER = 4 # Smaller chunks even out workers whose members are further behind
+MONTHS_PER_PERIOD = {'Monthly': 1, 'Quarterly': 3, 'Yearly': 12}
 
 def get_next_due_date(last_due_date, interval_type):
     """Calculates the next due date based on the interval."""
@@ -15,54 +23,142 @@ def get_next_due_date(last_due_date, interval_type):
     else:
         return None
 
-def update_recurring_dues():
+def _positions_in_segments(counts):
+    """For segment lengths [2, 3] returns segment ids [0, 0, 1, 1, 1] and 1-based positions [1, 2, 1, 2, 3]."""
+    segment = np.repeat(np.arange(len(counts)), counts)
+    position = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts) + 1
+    return segment, position
+
+def due_date_schedules(starts, today):
     """
-    Processes all recurring funds to create new payment logs for the next period.
+    Computes the due dates after each (last_due_date, Interval_Type) in starts, up to and including
+    today, for all of them at once. Month-based intervals clamp to short months exactly like adding
+    relativedelta one period at a time: a schedule that falls on Feb 28 from Jan 31 stays on the 28th.
+    Returns {(last_due_date, Interval_Type): ['YYYY-MM-DD', ...]}.
+    """
+    starts = list(starts)
+    schedules = {start: [] for start in starts}
+    today = np.datetime64(today, 'D')
+
+    weekly = [start for start in starts if start[1] == 'Weekly']
+    if weekly:
+        first = np.array([start[0] for start in weekly], dtype='datetime64[D]')
+        counts = np.maximum((today - first).astype(np.int64) // 7, 0)
+        segment, position = _positions_in_segments(counts)
+        _store_schedules(schedules, weekly, counts, first[segment] + 7 * position)
+
+    monthly = [start for start in starts if start[1] in MONTHS_PER_PERIOD]
+    if monthly:
+        first = np.array([start[0] for start in monthly], dtype='datetime64[D]')
+        step = np.array([MONTHS_PER_PERIOD[start[1]] for start in monthly])
+        first_month = first.astype('datetime64[M]')
+        first_day = (first - first_month.astype('datetime64[D]')).astype(np.int64) + 1
+        # The last period counted may still fall after today within today's month; it is dropped below
+        counts = np.maximum((today.astype('datetime64[M]') - first_month).astype(np.int64) // step, 0)
+        segment, position = _positions_in_segments(counts)
+
+        months = first_month[segment] + position * step[segment]
+        month_lengths = ((months + 1).astype('datetime64[D]') - months.astype('datetime64[D]')).astype(np.int64)
+        # The day of month is the running minimum of the month lengths so far within each schedule.
+        # Shifting each schedule below the previous one keeps the running minimum from crossing schedules.
+        shift = segment * 64
+        days = np.minimum(np.minimum.accumulate(month_lengths - shift) + shift, first_day[segment])
+        _store_schedules(schedules, monthly, counts, months.astype('datetime64[D]') + (days - 1), today)
+
+    return schedules
+
+def _store_schedules(schedules, starts, counts, dates, today=None):
+    date_strings = np.datetime_as_string(dates, unit='D').tolist()
+    in_range = (dates <= today).tolist() if today is not None else None
+    end = 0
+    for start, count in zip(starts, counts.tolist()):
+        begin, end = end, end + count
+        if in_range is None:
+            schedules[start] = date_strings[begin:end]
+        else:
+            schedules[start] = [d for d, keep in zip(date_strings[begin:end], in_range[begin:end]) if keep]
+
+def compounded_arrears(carried_amount, fund_amount, periods):
+    """
+    The amount due in each of `periods` new periods when every one goes unpaid: the n-th is the
+    carried amount plus n fund amounts. Works element-wise on NumPy arrays. Rounded to paise.
+    """
+    return np.round(carried_amount + fund_amount * periods, 2)
+
+def compute_recurring_dues(latest_logs, today):
+    """
+    Computes every missing payment log for the given latest logs in memory.
+    Each entry needs User_ID, List_ID, Amount, Status, DueDate, FundAmount and Interval_Type.
+    Unpaid or rejected amounts are carried forward into each new period.
+    Returns a list of (User_ID, List_ID, Amount, DueDate, Status) tuples.
+    """
+    # Members of a fund mostly share their last due date, so each distinct schedule is computed once
+    schedules = due_date_schedules(sorted({(log['DueDate'], log['Interval_Type']) for log in latest_logs}), today)
+    member_schedules = [schedules[(log['DueDate'], log['Interval_Type'])] for log in latest_logs]
+
+    # Every new log is Unpaid, so each period compounds into the next; all amounts are computed in one pass
+    counts = np.array([len(schedule) for schedule in member_schedules], dtype=np.int64)
+    carried = np.array([log['Amount'] if log['Status'] in ['Unpaid', 'Rejected'] else 0 for log in latest_logs], dtype=float)
+    fund_amounts = np.array([log['FundAmount'] for log in latest_logs], dtype=float)
+    segment, position = _positions_in_segments(counts)
+    amounts = compounded_arrears(carried[segment], fund_amounts[segment], position).tolist()
+
+    new_logs = []
+    index = 0
+    for latest_log, schedule in zip(latest_logs, member_schedules):
+        for due_date in schedule:
+            new_logs.append((latest_log['User_ID'], latest_log['List_ID'], amounts[index], due_date, 'Unpaid'))
+            index += 1
+
+    return new_logs
+
+def _compute_chunk(args):
+    latest_logs, today = args
+    return compute_recurring_dues(latest_logs, today)
+
+def compute_recurring_dues_parallel(latest_logs, today, workers=None):
+    """
+    Computes the same list as compute_recurring_dues, in the same order, across a process pool.
+    Each log is computed independently, so the rows are split into contiguous chunks (which keeps
+    them ordered by List_ID) and the workers' results are joined back in chunk order.
+    """
+    workers = workers or os.cpu_count() or 1
+    latest_logs = [dict(log) for log in latest_logs] # sqlite3.Row cannot be pickled
+    chunk_size = max(1, -(-len(latest_logs) // (workers * CHUNKS_PER_WORKER)))
+    chunks = [(latest_logs[i:i + chunk_size], today) for i in range(0, len(latest_logs), chunk_size)]
+
+    new_logs = []
+    # Spawned rather than forked: the caller is a multi-threaded server process
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+        for chunk_logs in executor.map(_compute_chunk, chunks):
+            new_logs.extend(chunk_logs)
+    return new_logs
+
+def update_recurring_dues(list_ids=None, workers=None):
+    """
+    Processes all recurring funds, or just those in list_ids, to create new payment logs for the next period.
     It also compounds any unpaid amounts from the previous period.
+    Large backlogs are computed across `workers` processes (all cores by default; 1 forces serial),
+    and the new logs are always written by this process in one transaction.
     Returns the number of new logs created.
     """
     today = datetime.now().date()
-    new_logs_created = 0
-    
-    recurring_funds = db.get_recurring_funds()
-    all_memberships = db.get_memberships()
-
-    for fund in recurring_funds.itertuples():
-        fund_members = all_memberships[all_memberships['List_ID'] == fund.List_ID]
-        
-        for member in fund_members.itertuples():
-            latest_log = db.get_latest_payment_log(member.User_ID, fund.List_ID)
-            
-            if not latest_log:
-                continue
-
-            last_due_date = datetime.strptime(latest_log['DueDate'], '%Y-%m-%d').date()
-            
-            # Keep generating new logs until the next due date is in the future
-            while True:
-                next_due_date = get_next_due_date(last_due_date, fund.Interval_Type)
-                
-                if not next_due_date or next_due_date > today:
-                    break # Stop if we've caught up to the present
-
-                # Check if a log for this next period already exists to prevent duplicates
-                if not db.payment_log_exists(member.User_ID, fund.List_ID, next_due_date.strftime('%Y-%m-%d')):
-                    
-                    new_amount = fund.Amount
-                    # Check if the last period's due is unpaid and compound it
-                    last_log_for_compounding = db.get_latest_payment_log(member.User_ID, fund.List_ID)
-                    if last_log_for_compounding and last_log_for_compounding['Status'] in ['Unpaid', 'Rejected']:
-                        new_amount += last_log_for_compounding['Amount']
-                    
-                    # Create the new payment log for the next period
-                    db.create_payment_log(
-                        user_id=member.User_ID,
-                        list_id=fund.List_ID,
-                        amount=new_amount,
-                        due_date=next_due_date.strftime('%Y-%m-%d')
-                    )
-                    new_logs_created += 1
-                
-                last_due_date = next_due_date # Move to the next period to check again
-
-    return new_logs_created
+
+    # Logs after the latest due date cannot exist yet, so no per-period existence check is needed
+    latest_logs = db.get_latest_recurring_payment_logs(list_ids)
+    if workers != 1 and len(latest_logs) >= PARALLEL_THRESHOLD:
+        new_logs = compute_recurring_dues_parallel(latest_logs, today, workers)
+    else:
+        new_logs = compute_recurring_dues(latest_logs, today)
+
+    if new_logs:
+        last_log_id = db.get_max_log_id()
+        success, error_message = db.create_payment_logs(new_logs)
+        if not success:
+            raise RuntimeError(error_message)
+        # Render the new dues' payment QR codes before members open them
+        qr_cache.pregenerate_in_background(db.get_unpaid_payment_details(last_log_id))
+
+    return len(new_logs)
+
+instrumentation.instrument_module(globals())
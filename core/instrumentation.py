@@ -0,0 +1,216 @@
+import contextvars
+import functools
+import inspect
+import logging
+import sqlite3
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+import config
+
+# Statements slower than this many milliseconds go to the slow-query log; override in config.py
+SLOW_QUERY_MS = getattr(config, 'SLOW_QUERY_MS', 200)
+SLOW_LOG_SIZE = 100
+
+logger = logging.getLogger("core.db.slow_queries")
+section_logger = logging.getLogger("core.sections")
+
+_current_function = contextvars.ContextVar('db_function', default='(direct)')
+_current_section = contextvars.ContextVar('db_section', default='(background)')
+_current_rerun = contextvars.ContextVar('db_rerun', default=None)
+
+_lock = threading.Lock()
+_function_stats = {} # (section, function) -> counters
+_slow_queries = deque(maxlen=SLOW_LOG_SIZE)
+_section_stats = {} # section -> render counters
+
+def _new_counters():
+    return {'calls': 0, 'time': 0.0, 'statements': 0, 'statement_time': 0.0, 'rows': 0, 'connections_opened': 0}
+
+def _record(**increments):
+    """Adds to the counters of the current section and function, and to the current rerun's."""
+    key = (_current_section.get(), _current_function.get())
+    rerun = _current_rerun.get()
+    with _lock:
+        counters = _function_stats.setdefault(key, _new_counters())
+        for name, value in increments.items():
+            counters[name] += value
+        if rerun is not None:
+            rerun_counters = rerun.setdefault(key[1], _new_counters())
+            for name, value in increments.items():
+                rerun_counters[name] += value
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """A cursor that times each statement, including fetching its rows, and counts the rows returned."""
+
+    def _start(self, sql, params, many):
+        self._sql, self._params, self._many = sql, params, many
+        self._elapsed = 0.0
+        self._logged_slow = False
+
+    def _add_time(self, elapsed, rows=0):
+        self._elapsed += elapsed
+        _record(statement_time=elapsed, rows=rows)
+        if not self._logged_slow and self._elapsed * 1000 >= SLOW_QUERY_MS:
+            self._logged_slow = True
+            _log_slow_query(self.connection, self._sql, self._params, self._many, self._elapsed)
+
+    def execute(self, sql, parameters=()):
+        self._start(sql, parameters, False)
+        _record(statements=1)
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._add_time(time.perf_counter() - started)
+
+    def executemany(self, sql, seq_of_parameters):
+        seq_of_parameters = list(seq_of_parameters)
+        self._start(sql, seq_of_parameters[0] if seq_of_parameters else (), True)
+        _record(statements=1)
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self._add_time(time.perf_counter() - started)
+
+    def _timed_fetch(self, fetch, *args):
+        started = time.perf_counter()
+        result = fetch(*args)
+        rows = len(result) if isinstance(result, list) else int(result is not None)
+        if hasattr(self, '_sql'):
+            self._add_time(time.perf_counter() - started, rows)
+        return result
+
+    def fetchone(self):
+        return self._timed_fetch(super().fetchone)
+
+    def fetchmany(self, size=None):
+        return self._timed_fetch(super().fetchmany, size if size is not None else self.arraysize)
+
+    def fetchall(self):
+        return self._timed_fetch(super().fetchall)
+
+class InstrumentedConnection(sqlite3.Connection):
+    """A connection whose cursors, including those made by execute() shortcuts, are instrumented."""
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+def count_connection_open(conn):
+    """Connection hook for the pool: attributes each newly opened connection to the current function."""
+    _record(connections_opened=1)
+
+def _log_slow_query(conn, sql, params, many, elapsed):
+    plan = []
+    keyword = sql.split(None, 1)[:1]
+    if keyword and keyword[0].upper() in ('SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE'):
+        try:
+            # A plain cursor, so the EXPLAIN is neither timed nor able to land in this log itself
+            plan = [row[3] for row in sqlite3.Cursor(conn).execute("EXPLAIN QUERY PLAN " + sql, params)]
+        except sqlite3.Error as e:
+            plan = [f"(plan unavailable: {e})"]
+    entry = {
+        'logged_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'section': _current_section.get(),
+        'function': _current_function.get(),
+        'ms': round(elapsed * 1000, 1),
+        'sql': ' '.join(sql.split()),
+        'executemany': many,
+        'plan': plan,
+    }
+    with _lock:
+        _slow_queries.append(entry)
+    logger.warning("Slow query (%.0f ms) in %s [%s]: %s | plan: %s",
+                   entry['ms'], entry['function'], entry['section'], entry['sql'], ' | '.join(plan))
+
+def instrument_module(namespace):
+    """Wraps every public function defined in a module so its queries are attributed to it."""
+    module_name = namespace['__name__']
+    for name, func in list(namespace.items()):
+        if name.startswith('_') or not inspect.isfunction(func) or func.__module__ != module_name:
+            continue
+        if inspect.isgeneratorfunction(inspect.unwrap(func)):
+            continue
+        namespace[name] = _instrumented(func)
+
+def _instrumented(func):
+    name = func.__name__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        token = _current_function.set(name)
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - started
+            _record(calls=1, time=elapsed)
+            _current_function.reset(token)
+    return wrapper
+
+@contextmanager
+def section(name):
+    """
+    Attributes the queries run inside the block to a page or tab, e.g. 'Admin / Notifications',
+    and records how long the block took to render.
+    """
+    token = _current_section.set(name)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        _current_section.reset(token)
+        with _lock:
+            stats = _section_stats.setdefault(name, {'renders': 0, 'time': 0.0, 'max_time': 0.0, 'last_time': 0.0})
+            stats['renders'] += 1
+            stats['time'] += elapsed
+            stats['max_time'] = max(stats['max_time'], elapsed)
+            stats['last_time'] = elapsed
+        section_logger.info("Rendered %s in %.1f ms", name, elapsed * 1000)
+
+def begin_rerun():
+    """Starts collecting counters for one script run; returns them for summarize_rerun."""
+    counters = {}
+    _current_rerun.set(counters)
+    return counters
+
+def summarize_rerun(counters):
+    """Totals and per-function rows for the counters returned by begin_rerun."""
+    with _lock:
+        rows = [dict(function=name, **values) for name, values in counters.items()]
+    totals = _new_counters()
+    for row in rows:
+        for key in totals:
+            totals[key] += row[key]
+    rows.sort(key=lambda row: row['time'], reverse=True)
+    return totals, rows
+
+def function_stats():
+    """Returns cumulative counters per (section, function) since start-up or the last reset."""
+    with _lock:
+        return [dict(section=section_name, function=function, **values)
+                for (section_name, function), values in _function_stats.items()]
+
+def section_stats():
+    """Returns render counts and wall-clock times per section since start-up or the last reset."""
+    with _lock:
+        return [dict(section=name, **values) for name, values in _section_stats.items()]
+
+def slow_queries():
+    with _lock:
+        return list(_slow_queries)
+
+def reset():
+    with _lock:
+        _function_stats.clear()
+        _section_stats.clear()
+        _slow_queries.clear()
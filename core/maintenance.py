@@ -0,0 +1,77 @@
+"""
+Command-line maintenance tasks for the society database.
+
+Usage: python -m core.maintenance check-summary [--repair]
+       python -m core.maintenance audit-arrears [--user-id ID] [--list-id ID] [--repair]
+       python -m core.maintenance archive-paid [--older-than-months 24 | --before YYYY-MM-DD]
+"""
+import argparse
+import sys
+from datetime import date
+from dateutil.relativedelta import relativedelta
+from core import db
+
+def check_summary(args):
+    """Reports drift between Payment_Summary and the totals recomputed from Payment_Logs."""
+    drift_df = db.check_payment_summary(repair=args.repair)
+    if drift_df.empty:
+        print("Payment summary is consistent with Payment_Logs.")
+        return 0
+
+    print(f"Found {len(drift_df)} drifted summary row(s):")
+    print(drift_df.to_string(index=False))
+    if args.repair:
+        print("Payment summary rebuilt from Payment_Logs.")
+        return 0
+    return 1
+
+def audit_arrears(args):
+    """Reports members whose outstanding arrears disagree with the compounding rule."""
+    drift_df = db.audit_arrears(user_id=args.user_id, list_id=args.list_id, repair=args.repair)
+    if drift_df.empty:
+        print("Outstanding arrears match the compounding rule.")
+        return 0
+
+    print(f"Found {len(drift_df)} membership(s) with drifted arrears:")
+    print(drift_df.to_string(index=False))
+    if args.repair:
+        print("Drifted payment logs recomputed.")
+        return 0
+    return 1
+
+def archive_paid(args):
+    """Moves old Paid logs out of Payment_Logs into the Parquet archive."""
+    before = args.before or (date.today() - relativedelta(months=args.older_than_months)).isoformat()
+    success, archived, error = db.archive_paid_logs(before)
+    print(f"Archived {archived} Paid log(s) due before {before}.")
+    if not success:
+        print(f"Archiving stopped: {error}")
+        return 1
+    return 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m core.maintenance", description="Society database maintenance tasks.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    summary_parser = subparsers.add_parser("check-summary", help="Recompute the dashboard totals and report any drift.")
+    summary_parser.add_argument("--repair", action="store_true", help="Rebuild the summary if it has drifted.")
+    summary_parser.set_defaults(handler=check_summary)
+
+    arrears_parser = subparsers.add_parser("audit-arrears", help="Recompute outstanding arrears and report any that disagree.")
+    arrears_parser.add_argument("--user-id", type=int, help="Only audit this member.")
+    arrears_parser.add_argument("--list-id", type=int, help="Only audit this fund.")
+    arrears_parser.add_argument("--repair", action="store_true", help="Set drifted logs to their recomputed amounts.")
+    arrears_parser.set_defaults(handler=audit_arrears)
+
+    archive_parser = subparsers.add_parser("archive-paid", help="Move old Paid logs into the Parquet archive.")
+    cutoff = archive_parser.add_mutually_exclusive_group()
+    cutoff.add_argument("--older-than-months", type=int, default=24, help="Archive logs due more than this many months ago.")
+    cutoff.add_argument("--before", help="Archive logs due before this date (YYYY-MM-DD).")
+    archive_parser.set_defaults(handler=archive_paid)
+
+    args = parser.parse_args(argv)
+    db.setup_database()
+    return args.handler(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
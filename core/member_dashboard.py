@@ -1,10 +1,9 @@
 import streamlit as st
 import pandas as pd
-import pyqrcode
-from io import BytesIO
 import time
-from core import db
-from config import SOCIETY_VPA, SOCIETY_NAME
+from core import assets, db, instrumentation, qr_cache
+from core.widgets import paged_dataframe
+from config import SOCIETY_VPA
 
 def create_dashboard_card(icon, title, value, description):
     st.markdown(
@@ -23,23 +22,24 @@ def member_dashboard():
     st.header(f"Member Dashboard | Welcome, {st.session_state['username']}")
     user_id = st.session_state['user_id']
     
-    dues_df = db.get_member_dues(user_id)
-    history_df = db.get_payment_history(user_id)
+    with instrumentation.section("Member / Summary"):
+        # One cached read for the whole page; submitting or verifying a payment refreshes it
+        snapshot = db.get_member_snapshot(user_id)
+        dues_df, total_paid = snapshot['dues'], snapshot['paid_total']
 
     total_dues = dues_df['Amount'].sum()
-    total_paid = history_df[history_df['Status'] == 'Paid']['Amount'].sum()
 
     col1, col2 = st.columns(2)
     with col1:
-        create_dashboard_card("https://img.icons8.com/plasticine/100/000000/request-money.png", "Outstanding Dues", f"₹{total_dues:,.2f}", "Total amount due")
+        create_dashboard_card(assets.icon_url("request-money"), "Outstanding Dues", f"₹{total_dues:,.2f}", "Total amount due")
     with col2:
-        create_dashboard_card("https://img.icons8.com/plasticine/100/000000/initiate-money-transfer.png", "Total Paid", f"₹{total_paid:,.2f}", "Total amount paid")
+        create_dashboard_card(assets.icon_url("initiate-money-transfer"), "Total Paid", f"₹{total_paid:,.2f}", "Total amount paid")
 
     st.divider()
 
     tab1, tab2 = st.tabs(["💰 My Payments", "📜 Payment History"])
 
-    with tab1:
+    with tab1, instrumentation.section("Member / My Payments"):
         st.subheader("Outstanding Dues")
         if dues_df.empty:
             st.success("You have no outstanding dues. Well done! 🎉")
@@ -66,7 +66,7 @@ def member_dashboard():
                 else:
                     amount_to_pay, list_name = details['Amount'], details['ListName']
                     
-                    target_vpa = db.get_fund_vpa(list_name) or SOCIETY_VPA
+                    target_vpa = snapshot['fund_vpas'].get(list_name) or SOCIETY_VPA
 
                     st.subheader(f"Pay for: {list_name}")
                     if details['Status'] == 'Rejected':
@@ -77,12 +77,8 @@ def member_dashboard():
                     col1, col2 = st.columns([1, 2])
 
                     with col1:
-                        tn = f"M{user_id}L{selected_log_id}"
-                        upi_string = f"upi://pay?pa={target_vpa}&pn={SOCIETY_NAME}&am={amount_to_pay}&tn={tn}"
-                        qr_code = pyqrcode.create(upi_string)
-                        buffer = BytesIO()
-                        qr_code.png(buffer, scale=5)
-                        st.image(buffer.getvalue(), caption="Scan to Pay", width=200)
+                        upi_string = qr_cache.upi_payment_string(target_vpa, amount_to_pay, user_id, selected_log_id)
+                        st.image(qr_cache.get_qr_png(upi_string), caption="Scan to Pay", width=200)
                         st.info(f"Amount: ₹{amount_to_pay}")
                         st.caption(f"Paying to: {target_vpa}")
                     
@@ -106,7 +102,15 @@ def member_dashboard():
                                         st.rerun()
                                     else:
                                         st.error(f"An error occurred: {error_message}")
-    with tab2:
+    with tab2, instrumentation.section("Member / Payment History"):
         st.subheader("Completed and Pending Payments")
-        history_df = db.get_payment_history(user_id)
-        st.dataframe(history_df, width='stretch')
+        history_df = paged_dataframe(
+            "payment_history",
+            lambda cursor, page_size: snapshot['history'] if cursor is None
+                else db.get_payment_history_page(user_id, cursor=cursor, page_size=page_size, as_arrow=True),
+            filters=(user_id,),
+            page_size=db.MEMBER_HISTORY_PAGE_SIZE,
+            columns=['ListName', 'Amount', 'DueDate', 'Status', 'PaymentDate'],
+        )
+        if len(history_df) == 0:
+            st.info("No payments recorded yet.")
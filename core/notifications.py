@@ -0,0 +1,311 @@
+import logging
+import smtplib
+import threading
+import time
+import uuid
+import webbrowser
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from email.mime.text import MIMEText
+from email.mime.multipart import MIMEMultipart
+from urllib.parse import quote
+from core import db
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 5
+RETRY_BACKOFF = 30 # Seconds before the first retry; doubles on every further attempt
+POLL_INTERVAL = 2 # Seconds between outbox polls when there is nothing to send
+ERROR_BACKOFF = 30 # Seconds to wait after the outbox could not be polled, e.g. while the database is locked
+SENDING_TIMEOUT = 300 # Messages claimed longer ago than this whose outcome was never recorded are sent again
+STALE_CHECK_INTERVAL = 60 # Seconds between checks for such messages
+DEFAULT_REMINDER_WINDOW_HOURS = 72 # Digest mode skips members reminded this recently; the Settings key reminder_window_hours overrides it
+
+class ChannelPolicy:
+    """How many messages of a channel may be in flight at once, and how many may start per second."""
+
+    def __init__(self, concurrency, per_second):
+        self.concurrency = concurrency
+        self.min_interval = 1.0 / per_second
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+
+    def wait_for_slot(self):
+        """Blocks the calling worker until the channel's rate limit allows another send."""
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.min_interval
+        if slot > now:
+            time.sleep(slot - now)
+
+class WhatsAppTransport:
+    """Opens a prefilled WhatsApp desktop chat. The channel's rate limit gives the app time to send it."""
+
+    def send(self, message):
+        whatsapp_url = f"whatsapp://send?phone={message['Recipient']}&text={quote(message['Body'])}"
+        if not webbrowser.open(whatsapp_url):
+            raise RuntimeError("No handler is registered for whatsapp:// links.")
+
+    def close(self):
+        pass
+
+class SmtpTransport:
+    """
+    Sends email through the SMTP server configured in Settings. Every worker thread keeps
+    its own session open between messages instead of reconnecting for each one.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._sessions = []
+        self._lock = threading.Lock()
+
+    def _settings(self):
+        return {key: db.get_setting(key) for key in ("smtp_server", "smtp_port", "smtp_user", "smtp_password")}
+
+    def _session(self):
+        server = getattr(self._local, 'server', None)
+        if server is not None:
+            return server
+
+        settings = self._settings()
+        if not (settings["smtp_server"] and settings["smtp_port"]):
+            raise RuntimeError("SMTP server is not configured.")
+        server = smtplib.SMTP(settings["smtp_server"], int(settings["smtp_port"]), timeout=30)
+        server.ehlo()
+        if server.has_extn("starttls"):
+            server.starttls()
+            server.ehlo()
+        if settings["smtp_user"] and settings["smtp_password"]:
+            server.login(settings["smtp_user"], settings["smtp_password"])
+        self._local.server = server
+        self._local.sender = settings["smtp_user"] or "society@localhost"
+        with self._lock:
+            self._sessions.append(server)
+        return server
+
+    def send(self, message):
+        server = self._session()
+        msg = MIMEMultipart()
+        msg['From'] = self._local.sender
+        msg['To'] = message['Recipient']
+        msg['Subject'] = message['Subject']
+        msg.attach(MIMEText(message['Body'], 'plain'))
+        try:
+            server.send_message(msg)
+        except smtplib.SMTPServerDisconnected:
+            # Drop the dead session so the retry opens a fresh one
+            self._local.server = None
+            raise
+
+    def close(self):
+        with self._lock:
+            for server in self._sessions:
+                try:
+                    server.quit()
+                except Exception:
+                    pass
+            self._sessions = []
+
+def default_transports():
+    return {'whatsapp': WhatsAppTransport(), 'email': SmtpTransport()}
+
+def default_policies():
+    return {
+        'whatsapp': ChannelPolicy(concurrency=1, per_second=0.1), # One chat every 10 seconds
+        'email': ChannelPolicy(concurrency=4, per_second=5),
+    }
+
+class NotificationDispatcher:
+    """
+    Drains Notification_Outbox on a background thread. Each channel has its own worker pool
+    sized by its policy; failed sends are retried with exponential backoff up to MAX_ATTEMPTS.
+    """
+
+    def __init__(self, transports=None, policies=None, poll_interval=POLL_INTERVAL):
+        self.transports = transports or default_transports()
+        self.policies = policies or default_policies()
+        self.poll_interval = poll_interval
+        self._executors = {channel: ThreadPoolExecutor(max_workers=policy.concurrency, thread_name_prefix=f"notify-{channel}")
+                           for channel, policy in self.policies.items()}
+        self._in_flight = {channel: 0 for channel in self.policies}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        db.requeue_stale_outbox_messages()
+        self._thread = threading.Thread(target=self._run, name="notification-dispatcher", daemon=True)
+        self._thread.start()
+
+    def stop(self, wait=True):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None and wait:
+            self._thread.join()
+        for executor in self._executors.values():
+            executor.shutdown(wait=wait)
+        for transport in self.transports.values():
+            transport.close()
+
+    def is_alive(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def wake(self):
+        """Polls the outbox immediately instead of waiting for the next interval."""
+        self._wake.set()
+
+    def _run(self):
+        next_stale_check = time.monotonic() + STALE_CHECK_INTERVAL
+        while not self._stop.is_set():
+            try:
+                if time.monotonic() >= next_stale_check:
+                    next_stale_check = time.monotonic() + STALE_CHECK_INTERVAL
+                    requeued = db.requeue_stale_outbox_messages(SENDING_TIMEOUT)
+                    if requeued:
+                        logger.warning("Requeued %s outbox message(s) stuck in Sending", requeued)
+                claimed = self._claim()
+            except Exception:
+                logger.exception("Could not poll the notification outbox; retrying in %s seconds", ERROR_BACKOFF)
+                self._stop.wait(ERROR_BACKOFF)
+                continue
+            if not claimed:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+            else:
+                # Let the workers free up slots before claiming more
+                time.sleep(0.05)
+
+    def _claim(self):
+        """Hands due messages to the channel workers that have free slots. Returns how many were claimed."""
+        claimed = 0
+        for channel, policy in self.policies.items():
+            with self._lock:
+                free_slots = policy.concurrency - self._in_flight[channel]
+            if free_slots <= 0:
+                continue
+            for message in db.claim_outbox_messages(channel, free_slots):
+                with self._lock:
+                    self._in_flight[channel] += 1
+                self._executors[channel].submit(self._deliver, channel, message)
+                claimed += 1
+        return claimed
+
+    def _deliver(self, channel, message):
+        try:
+            try:
+                self.policies[channel].wait_for_slot()
+                self.transports[channel].send(message)
+            except Exception as e:
+                if message['Attempts'] >= MAX_ATTEMPTS:
+                    db.mark_outbox_failed(message['Outbox_ID'], str(e))
+                else:
+                    db.mark_outbox_failed(message['Outbox_ID'], str(e), retry_in=RETRY_BACKOFF * 2 ** (message['Attempts'] - 1))
+            else:
+                db.mark_outbox_sent(message['Outbox_ID'])
+        except Exception:
+            # The message stays in Sending until the stale check in _run queues it again
+            logger.exception("Could not record the outcome of outbox message %s", message['Outbox_ID'])
+        finally:
+            with self._lock:
+                self._in_flight[channel] -= 1
+            self._wake.set()
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+def get_dispatcher():
+    """Returns the process-wide dispatcher, starting it on first use or if its thread has died."""
+    global _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is None or not _dispatcher.is_alive():
+            if _dispatcher is not None:
+                logger.warning("Notification dispatcher thread has stopped; starting a new one")
+                _dispatcher.stop(wait=False)
+            _dispatcher = NotificationDispatcher()
+            _dispatcher.start()
+        return _dispatcher
+
+def build_reminder_messages(reminders, email_enabled=True):
+    """Turns reminder rows from db.get_reminders_to_send into WhatsApp and email outbox messages."""
+    today = date.today().isoformat()
+    messages = []
+    for reminder in reminders:
+        # One message per channel, payment log and day, however often the button is pressed
+        key = f"{reminder['Log_ID']}:{today}"
+        messages.append({
+            'Idempotency_Key': f"whatsapp:{key}",
+            'User_ID': reminder['User_ID'],
+            'List_ID': reminder['List_ID'],
+            'Channel': 'whatsapp',
+            'Recipient': reminder['PhoneNumber'],
+            'Subject': None,
+            'Body': f"Hi {reminder['Username']}, this is a friendly reminder that your contribution of ₹{reminder['Amount']} for '{reminder['ListName']}' is due. Please pay via the portal. Thank you!",
+        })
+        if email_enabled and reminder['Email']:
+            messages.append({
+                'Idempotency_Key': f"email:{key}",
+                'User_ID': reminder['User_ID'],
+                'List_ID': reminder['List_ID'],
+                'Channel': 'email',
+                'Recipient': reminder['Email'],
+                'Subject': f"Payment Reminder: {reminder['ListName']}",
+                'Body': f"Dear {reminder['Username']},\n\nThis is a friendly reminder that your contribution of ₹{reminder['Amount']} for '{reminder['ListName']}' is due.\n\nPlease make the payment at your earliest convenience.\n\nThank you,\nSociety Welfare Committee",
+            })
+    return messages
+
+def build_digest_messages(digests, email_enabled=True):
+    """Turns digest rows from db.get_reminder_digests into one WhatsApp and one email message per member."""
+    today = date.today().isoformat()
+    messages = []
+    for digest in digests:
+        list_ids = [int(list_id) for list_id in str(digest['List_IDs']).split(',')]
+        # One digest per channel, member, set of funds and day, however often the button is pressed
+        key = f"digest:{digest['User_ID']}:{digest['List_IDs']}:{today}"
+        total = f"₹{digest['Total_Amount']:,.2f}"
+        messages.append({
+            'Idempotency_Key': f"whatsapp:{key}",
+            'User_ID': digest['User_ID'],
+            'List_ID': list_ids[0],
+            'List_IDs': list_ids,
+            'Channel': 'whatsapp',
+            'Recipient': digest['PhoneNumber'],
+            'Subject': None,
+            'Body': f"Hi {digest['Username']}, this is a friendly reminder that {total} is due:\n{digest['Fund_Lines']}\nPlease pay via the portal. Thank you!",
+        })
+        if email_enabled and digest['Email']:
+            messages.append({
+                'Idempotency_Key': f"email:{key}",
+                'User_ID': digest['User_ID'],
+                'List_ID': list_ids[0],
+                'List_IDs': list_ids,
+                'Channel': 'email',
+                'Recipient': digest['Email'],
+                'Subject': f"Payment Reminder: {total} due",
+                'Body': f"Dear {digest['Username']},\n\nThis is a friendly reminder that the following contributions are due:\n\n{digest['Fund_Lines']}\n\nTotal: {total}\n\nPlease make the payment at your earliest convenience.\n\nThank you,\nSociety Welfare Committee",
+            })
+    return messages
+
+def get_reminder_window_hours():
+    value = db.get_setting("reminder_window_hours")
+    return float(value if value is not None else DEFAULT_REMINDER_WINDOW_HOURS)
+
+def _enqueue(messages):
+    batch_id = uuid.uuid4().hex
+    success, queued, error_message = db.enqueue_notifications(batch_id, messages)
+    if not success:
+        raise RuntimeError(error_message)
+    get_dispatcher().wake()
+    return batch_id, queued
+
+def enqueue_reminders(reminders, email_enabled=True):
+    """Queues reminders for background delivery. Returns (batch_id, number queued)."""
+    return _enqueue(build_reminder_messages(reminders, email_enabled))
+
+def enqueue_reminder_digests(digests, email_enabled=True):
+    """Queues one digest per member for background delivery. Returns (batch_id, number queued)."""
+    return _enqueue(build_digest_messages(digests, email_enabled))
@@ -0,0 +1,161 @@
+import sqlite3
+import threading
+import time
+
+# PRAGMAs applied once when a connection is opened
+CONNECTION_PRAGMAS = [
+    "PRAGMA journal_mode=WAL;",
+    "PRAGMA synchronous=NORMAL;",
+    "PRAGMA cache_size=-16000;", # 16 MB page cache per connection
+    "PRAGMA mmap_size=268435456;", # 256 MB memory-mapped I/O
+    "PRAGMA busy_timeout=5000;",
+]
+
+class ConnectionPool:
+    """
+    A bounded pool of SQLite connections shared by all threads of the process.
+    A thread that already holds a connection gets the same one back when it asks again,
+    and released connections are reused by the next caller until they sit idle too long.
+    """
+
+    def __init__(self, db_file, max_connections=8, idle_timeout=300, acquire_timeout=30, connection_factory=sqlite3.Connection):
+        self.db_file = db_file
+        self.connection_factory = connection_factory
+        self.max_connections = max_connections
+        self.idle_timeout = idle_timeout
+        self.acquire_timeout = acquire_timeout
+
+        self._lock = threading.Condition()
+        self._idle = [] # (connection, released_at), most recently released last
+        self._open_count = 0
+        self._local = threading.local()
+        self._connect_hooks = []
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'reentrant_hits': 0,
+            'waits': 0,
+            'wait_time': 0.0,
+            'max_wait_time': 0.0,
+            'idle_closed': 0,
+        }
+
+    def _open_connection(self):
+        conn = sqlite3.connect(self.db_file, check_same_thread=False, factory=self.connection_factory)
+        conn.row_factory = sqlite3.Row
+        for pragma in CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+        for hook in self._connect_hooks:
+            hook(conn)
+        return conn
+
+    def add_connect_hook(self, hook):
+        """Registers hook(conn) to run on every connection the pool opens from now on."""
+        self._connect_hooks.append(hook)
+
+    def _close_idle(self):
+        """Closes connections that have been idle longer than idle_timeout. Caller holds the lock."""
+        cutoff = time.monotonic() - self.idle_timeout
+        still_idle = []
+        for conn, released_at in self._idle:
+            if released_at < cutoff:
+                conn.close()
+                self._open_count -= 1
+                self._stats['idle_closed'] += 1
+            else:
+                still_idle.append((conn, released_at))
+        self._idle = still_idle
+
+    def acquire(self):
+        """Returns a connection for the calling thread, waiting if the pool is exhausted."""
+        held = getattr(self._local, 'conn', None)
+        if held is not None:
+            self._local.depth += 1
+            with self._lock:
+                self._stats['reentrant_hits'] += 1
+            return held
+
+        with self._lock:
+            self._close_idle()
+            started = time.monotonic()
+            waited = False
+            while not self._idle and self._open_count >= self.max_connections:
+                waited = True
+                remaining = self.acquire_timeout - (time.monotonic() - started)
+                if remaining <= 0:
+                    raise TimeoutError("Timed out waiting for a database connection.")
+                self._lock.wait(remaining)
+
+            if waited:
+                wait_time = time.monotonic() - started
+                self._stats['waits'] += 1
+                self._stats['wait_time'] += wait_time
+                self._stats['max_wait_time'] = max(self._stats['max_wait_time'], wait_time)
+
+            if self._idle:
+                conn, _ = self._idle.pop()
+                self._stats['hits'] += 1
+            else:
+                conn = None
+                self._open_count += 1
+                self._stats['misses'] += 1
+
+        if conn is None:
+            try:
+                conn = self._open_connection()
+            except Exception:
+                with self._lock:
+                    self._open_count -= 1
+                    self._lock.notify()
+                raise
+
+        self._local.conn = conn
+        self._local.depth = 1
+        return conn
+
+    def release(self, conn):
+        """Hands a connection back to the pool once the outermost holder is done with it."""
+        self._local.depth -= 1
+        if self._local.depth > 0:
+            return
+        self._local.conn = None
+
+        # Never hand an open transaction to the next caller
+        if conn.in_transaction:
+            try:
+                conn.rollback()
+            except BaseException:
+                # The connection can't be trusted any more; close it and free its slot
+                self._discard(conn)
+                raise
+
+        with self._lock:
+            self._idle.append((conn, time.monotonic()))
+            self._close_idle()
+            self._lock.notify()
+
+    def _discard(self, conn):
+        """Closes a connection that is not going back to the pool and frees its slot."""
+        try:
+            conn.close()
+        finally:
+            with self._lock:
+                self._open_count -= 1
+                self._lock.notify()
+
+    def close_all(self):
+        """Closes every idle connection. Connections currently in use are unaffected."""
+        with self._lock:
+            for conn, _ in self._idle:
+                conn.close()
+                self._open_count -= 1
+            self._idle = []
+
+    def stats(self):
+        """Returns a snapshot of the pool counters."""
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot['open_connections'] = self._open_count
+            snapshot['idle_connections'] = len(self._idle)
+            snapshot['max_connections'] = self.max_connections
+            return snapshot
@@ -0,0 +1,160 @@
+import hashlib
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+import pyqrcode
+from cachetools import LRUCache
+import config
+from config import SOCIETY_VPA, SOCIETY_NAME
+
+QR_CACHE_SIZE = 512
+QR_SCALE = 5
+POOL_THRESHOLD = 32 # Smaller batches are rendered in-process; starting workers costs more than it saves
+
+# Optional on-disk tier that survives restarts; set QR_CACHE_DIR in config.py to enable it
+QR_CACHE_DIR = getattr(config, 'QR_CACHE_DIR', None)
+
+logger = logging.getLogger(__name__)
+
+_memory_cache = LRUCache(maxsize=QR_CACHE_SIZE)
+_lock = threading.Lock()
+
+# One render pool and one background worker per process, shared by every pregeneration request
+_render_pool = None
+_render_pool_lock = threading.Lock()
+_pending = queue.Queue()
+_worker = None
+_worker_lock = threading.Lock()
+_shutting_down = threading.Event()
+
+def upi_payment_string(vpa, amount, user_id, log_id):
+    """Builds the UPI deep link a member scans to pay a payment log."""
+    tn = f"M{user_id}L{log_id}"
+    return f"upi://pay?pa={vpa or SOCIETY_VPA}&pn={SOCIETY_NAME}&am={amount}&tn={tn}"
+
+def render_qr_png(upi_string):
+    """Renders a UPI string as a PNG. Module-level so process pool workers can run it."""
+    buffer = BytesIO()
+    pyqrcode.create(upi_string).png(buffer, scale=QR_SCALE)
+    return buffer.getvalue()
+
+def _disk_path(upi_string):
+    return os.path.join(QR_CACHE_DIR, hashlib.sha256(upi_string.encode()).hexdigest() + ".png")
+
+def _store(upi_string, png):
+    with _lock:
+        _memory_cache[upi_string] = png
+    if QR_CACHE_DIR:
+        os.makedirs(QR_CACHE_DIR, exist_ok=True)
+        path = _disk_path(upi_string)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(png)
+        os.replace(tmp_path, path)
+
+def _lookup(upi_string):
+    with _lock:
+        png = _memory_cache.get(upi_string)
+    if png is None and QR_CACHE_DIR:
+        try:
+            with open(_disk_path(upi_string), "rb") as f:
+                png = f.read()
+        except OSError:
+            return None
+        with _lock:
+            _memory_cache[upi_string] = png
+    return png
+
+def get_qr_png(upi_string):
+    """Returns the PNG for a UPI string, rendering it only if neither cache tier has it."""
+    png = _lookup(upi_string)
+    if png is None:
+        png = render_qr_png(upi_string)
+        _store(upi_string, png)
+    return png
+
+def _render_in_pool(upi_strings):
+    """Renders on the shared process pool, starting it on first use and replacing it if a worker died."""
+    global _render_pool
+    with _render_pool_lock:
+        if _render_pool is None:
+            # Spawned rather than forked: the caller is a multi-threaded server process
+            _render_pool = ProcessPoolExecutor(mp_context=multiprocessing.get_context('spawn'))
+        pool = _render_pool
+    try:
+        return list(pool.map(render_qr_png, upi_strings, chunksize=16))
+    except BrokenProcessPool:
+        with _render_pool_lock:
+            if _render_pool is pool:
+                _render_pool = None
+        raise
+
+def pregenerate_qr_codes(payment_details):
+    """
+    Renders QR codes for payment logs that are not cached yet, on the shared process pool for large
+    batches. Each entry needs Log_ID, User_ID, Amount and VPA. Without the disk tier only the first
+    QR_CACHE_SIZE are rendered, as the rest would just evict them. Returns the number of codes rendered.
+    """
+    upi_strings = dict.fromkeys(upi_payment_string(d['VPA'], d['Amount'], d['User_ID'], d['Log_ID']) for d in payment_details)
+    missing = [s for s in upi_strings if _lookup(s) is None]
+    if not QR_CACHE_DIR:
+        missing = missing[:QR_CACHE_SIZE]
+    if not missing:
+        return 0
+
+    if len(missing) < POOL_THRESHOLD:
+        rendered = map(render_qr_png, missing)
+    else:
+        rendered = _render_in_pool(missing)
+    for upi_string, png in zip(missing, rendered):
+        _store(upi_string, png)
+    return len(missing)
+
+def _pregenerate_worker():
+    while True:
+        payment_details = _pending.get()
+        try:
+            if payment_details is None or _shutting_down.is_set():
+                return
+            pregenerate_qr_codes(payment_details)
+        except Exception:
+            # A batch cut short by interpreter exit is expected, not an error
+            if not _shutting_down.is_set():
+                logger.exception("QR code pregeneration failed")
+        finally:
+            _pending.task_done()
+
+def _stop_worker():
+    """Drops queued batches and stops the worker, so nothing is sent to a render pool that is shutting down."""
+    _shutting_down.set()
+    while True:
+        try:
+            _pending.get_nowait()
+        except queue.Empty:
+            break
+        _pending.task_done()
+    _pending.put(None)
+
+# Runs at exit before concurrent.futures shuts the render pool down, which happens before atexit handlers run
+threading._register_atexit(_stop_worker)
+
+def pregenerate_in_background(payment_details):
+    """Queues pregenerate_qr_codes for the background worker so the caller's page is not held up."""
+    global _worker
+    payment_details = [dict(d) for d in payment_details]
+    if not payment_details or _shutting_down.is_set():
+        return
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_pregenerate_worker, name="qr-pregenerate", daemon=True)
+            _worker.start()
+    _pending.put(payment_details)
+
+def cache_stats():
+    with _lock:
+        return {'cached': len(_memory_cache), 'max_cached': _memory_cache.maxsize, 'disk_tier': bool(QR_CACHE_DIR)}
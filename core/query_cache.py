@@ -0,0 +1,107 @@
+import copy
+import functools
+import sqlite3
+import threading
+import pandas as pd
+import pyarrow as pa
+from cachetools import TTLCache
+
+DEFAULT_TTL = 300 # Seconds; bounds staleness for writes made by another process
+MAX_ENTRIES = 1024
+
+class _TaggedCache(TTLCache):
+    """A TTLCache that also unfiles a key from its tags when it expires or is evicted."""
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        _untag(key)
+
+    def expire(self, time=None):
+        expired = super().expire(time)
+        for key, _ in expired:
+            _untag(key)
+        return expired
+
+_lock = threading.Lock()
+_cache = _TaggedCache(maxsize=MAX_ENTRIES, ttl=DEFAULT_TTL)
+_keys_by_tag = {} # tag -> set of cache keys to drop when the tag is invalidated
+_tags_by_key = {} # cache key -> the tags it is filed under
+_stats = {} # function name -> {'hits': n, 'misses': n}
+_generations = {} # tag -> number of times it has been invalidated
+
+def _copy(value):
+    # Callers get their own copy so mutating a result cannot corrupt the cache
+    if isinstance(value, pd.DataFrame):
+        return value.copy()
+    if isinstance(value, dict):
+        return {key: _copy(item) for key, item in value.items()}
+    if isinstance(value, (sqlite3.Row, pa.Table, str, int, float, type(None))):
+        return value # Immutable
+    return copy.deepcopy(value)
+
+def _untag(key):
+    # Called with _lock held, from inside the cache
+    for tag in _tags_by_key.pop(key, ()):
+        keys = _keys_by_tag.get(tag)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del _keys_by_tag[tag]
+
+def cached_query(*tags, arg_tag=None):
+    """
+    Caches a read-only query's result per set of arguments for DEFAULT_TTL seconds.
+    Writers drop every result filed under a tag by calling invalidate(tag). arg_tag, if given,
+    maps a call's arguments to one more tag, so a writer can drop e.g. just one member's results.
+    """
+    def decorator(func):
+        name = func.__name__
+        _stats[name] = {'hits': 0, 'misses': 0}
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = (name, args, tuple(sorted(kwargs.items())))
+            call_tags = tags + (arg_tag(*args, **kwargs),) if arg_tag else tags
+            with _lock:
+                if key in _cache:
+                    _stats[name]['hits'] += 1
+                    return _copy(_cache[key])
+                _stats[name]['misses'] += 1
+                generations = [_generations.get(tag, 0) for tag in call_tags]
+
+            result = func(*args, **kwargs)
+            with _lock:
+                # Don't cache a result that a concurrent write may have made stale
+                if generations == [_generations.get(tag, 0) for tag in call_tags]:
+                    _cache[key] = result
+                    _tags_by_key[key] = call_tags
+                    for tag in call_tags:
+                        _keys_by_tag.setdefault(tag, set()).add(key)
+            return _copy(result)
+
+        wrapper.uncached = func
+        return wrapper
+    return decorator
+
+def invalidate(*tags):
+    """Drops every cached result filed under any of the given tags."""
+    with _lock:
+        for tag in tags:
+            _generations[tag] = _generations.get(tag, 0) + 1
+            for key in _keys_by_tag.pop(tag, ()):
+                _cache.pop(key, None)
+
+def clear():
+    with _lock:
+        _cache.clear()
+        _keys_by_tag.clear()
+        _tags_by_key.clear()
+
+def stats():
+    """Returns hits, misses and hit rate per cached function."""
+    with _lock:
+        snapshot = {}
+        for name, counts in _stats.items():
+            calls = counts['hits'] + counts['misses']
+            snapshot[name] = dict(counts, hit_rate=counts['hits'] / calls if calls else 0.0)
+        return snapshot
@@ -0,0 +1,99 @@
+import io
+import pandas as pd
+
+def _strip_quotes(values):
+    """Handles potential whitespace and quotes, and ensures consistent string data."""
+    return values.astype(str).str.strip().str.strip("'\"")
+
+def normalize_transaction_ids(values):
+    """Cleans statement transaction IDs, dropping a '.0'-style suffix from purely numeric IDs."""
+    ids = _strip_quotes(values)
+    numeric_with_dot = ids.str.contains('.', regex=False) & ids.str.replace('.', '', regex=False).str.isdigit()
+    return ids.where(~numeric_with_dot, ids.str.split('.', n=1).str[0])
+
+def normalize_amounts(values):
+    """Converts statement amounts to floats; anything non-numeric becomes NaN."""
+    return pd.to_numeric(_strip_quotes(values), errors='coerce').astype(float)
+
+def build_statement_lookup(bank_df, txn_id_col, amount_col):
+    """
+    Returns a Series of statement amounts indexed by cleaned transaction ID. Lines without
+    a numeric amount are dropped, and when an ID repeats its first line wins.
+    """
+    lookup = pd.DataFrame({
+        'Transaction_ID': normalize_transaction_ids(bank_df[txn_id_col]),
+        'Bank_Amount': normalize_amounts(bank_df[amount_col]),
+    }).dropna(subset=['Bank_Amount'])
+    lookup = lookup.drop_duplicates(subset='Transaction_ID', keep='first')
+    return lookup.set_index('Transaction_ID')['Bank_Amount']
+
+def reconcile(unverified_df, statement_lookup):
+    """
+    Matches pending submissions against a statement lookup from build_statement_lookup.
+    A submission is approved when its transaction ID is on the statement with exactly the
+    submitted amount. Returns the submissions with Submitted_ID, Submitted_Amount,
+    Bank_Amount, Approved and Reason columns added, in their original order.
+    """
+    result = unverified_df.copy()
+    result['Submitted_ID'] = result['Transaction_ID'].astype(str).str.strip()
+    result['Submitted_Amount'] = result['Amount'].astype(float)
+    result['Bank_Amount'] = result['Submitted_ID'].map(statement_lookup)
+
+    found = result['Bank_Amount'].notna()
+    result['Approved'] = found & (result['Bank_Amount'] == result['Submitted_Amount'])
+
+    result['Reason'] = None
+    result.loc[~found, 'Reason'] = "Transaction ID not found in statement"
+    mismatched = found & ~result['Approved']
+    if mismatched.any():
+        result.loc[mismatched, 'Reason'] = [
+            f"Amount Mismatch (Bank: {bank_amount}, Submitted: {submitted_amount})"
+            for bank_amount, submitted_amount in zip(result.loc[mismatched, 'Bank_Amount'].tolist(),
+                                                     result.loc[mismatched, 'Submitted_Amount'].tolist())
+        ]
+    return result
+
+STATEMENT_CHUNK_ROWS = 100_000
+PREVIEW_BYTES = 64 * 1024
+
+def read_statement_preview(source, rows=5, sample_bytes=PREVIEW_BYTES):
+    """Parses the first few rows of a statement CSV from its first `sample_bytes` only, then rewinds it."""
+    sample = source.read(sample_bytes)
+    source.seek(0)
+    if isinstance(sample, str):
+        sample = sample.encode()
+    # Drop the trailing partial line unless the whole file fit in the sample
+    if len(sample) == sample_bytes and b'\n' in sample:
+        sample = sample[:sample.rindex(b'\n') + 1]
+    return pd.read_csv(io.BytesIO(sample), nrows=rows)
+
+def iter_statement_lookups(source, txn_id_col, amount_col, chunksize=STATEMENT_CHUNK_ROWS):
+    """Reads a statement CSV in chunks of `chunksize` lines, yielding a build_statement_lookup Series for each."""
+    reader = pd.read_csv(source, usecols=[txn_id_col, amount_col], dtype=str, chunksize=chunksize)
+    for chunk in reader:
+        yield build_statement_lookup(chunk, txn_id_col, amount_col)
+
+def stream_statement_lookup(source, txn_id_col, amount_col, wanted_ids=None, chunksize=STATEMENT_CHUNK_ROWS):
+    """
+    Builds the same lookup as build_statement_lookup while reading the statement in chunks,
+    keeping only the ID and amount columns. When `wanted_ids` is given, only lines for those
+    IDs are kept, so peak memory depends on the chunk size and the number of pending
+    submissions rather than on the size of the statement.
+    """
+    if wanted_ids is not None:
+        wanted_ids = pd.Index(pd.unique(pd.Series(list(wanted_ids), dtype=object).astype(str).str.strip()))
+
+    parts = []
+    seen = pd.Index([], dtype=object)
+    for lookup in iter_statement_lookups(source, txn_id_col, amount_col, chunksize):
+        if wanted_ids is not None:
+            lookup = lookup[lookup.index.isin(wanted_ids)]
+        # An ID's first line in the whole statement wins, not just its first line in this chunk
+        lookup = lookup[~lookup.index.isin(seen)]
+        if not lookup.empty:
+            parts.append(lookup)
+            seen = seen.append(lookup.index)
+
+    if not parts:
+        return pd.Series([], index=pd.Index([], dtype=object, name='Transaction_ID'), name='Bank_Amount', dtype=float)
+    return pd.concat(parts)
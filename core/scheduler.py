@@ -0,0 +1,232 @@
+"""
+Runs recurring dues generation in the background so it never blocks a Streamlit session.
+
+Each Interval_Type has its own cadence in hours, stored in Settings as
+dues_cadence_hours_<Interval_Type> (0 disables it). Runs take a database lease so two
+threads or processes cannot generate the same dues, work through funds in batches and
+checkpoint after each one, so an interrupted run resumes where it stopped.
+
+Usage: python -m core.scheduler [--once]
+"""
+import argparse
+import logging
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+import config
+from core import db, dues_logic, instrumentation
+
+INTERVAL_TYPES = ['Weekly', 'Monthly', 'Quarterly', 'Yearly']
+DEFAULT_CADENCE_HOURS = {'Weekly': 6, 'Monthly': 12, 'Quarterly': 24, 'Yearly': 24}
+BATCH_SIZE = 5 # Funds per committed batch
+LOCK_NAME = 'dues_generation'
+LEASE_SECONDS = 600 # A crashed run's lease lapses after this
+LEASE_RENEW_SECONDS = LEASE_SECONDS / 3 # Renewed this often while a batch runs, and after every batch
+POLL_INTERVAL = 60
+# Whether the Streamlit app runs the scheduler itself. Set DUES_SCHEDULER_IN_APP = False in config.py
+# when several app processes serve the site, and run `python -m core.scheduler` once instead.
+IN_APP = getattr(config, 'DUES_SCHEDULER_IN_APP', True)
+
+logger = logging.getLogger(__name__)
+
+def get_cadence_hours(interval_type):
+    value = db.get_setting(f"dues_cadence_hours_{interval_type}")
+    return float(value if value is not None else DEFAULT_CADENCE_HOURS[interval_type])
+
+def due_interval_types(now=None):
+    """Interval types whose last successful run is older than their cadence. `now` is an aware datetime."""
+    now = now or datetime.now(timezone.utc)
+    last_runs = db.get_last_successful_dues_runs()
+    due = []
+    for interval_type in INTERVAL_TYPES:
+        cadence = get_cadence_hours(interval_type)
+        if cadence <= 0:
+            continue
+        last_run = last_runs.get(interval_type)
+        if last_run is not None:
+            # Dues_Runs timestamps are SQLite CURRENT_TIMESTAMP text: UTC without an offset
+            last_run = datetime.strptime(last_run, '%Y-%m-%d %H:%M:%S').replace(tzinfo=timezone.utc)
+        if last_run is None or last_run + timedelta(hours=cadence) <= now:
+            due.append(interval_type)
+    return due
+
+class _LeaseRenewer:
+    """Renews a job lease on a daemon thread so it cannot lapse during a long batch."""
+
+    def __init__(self, owner, interval=LEASE_RENEW_SECONDS):
+        self.owner = owner
+        self.interval = interval
+        self.lost = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="dues-lease", daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                if not db.acquire_job_lock(LOCK_NAME, self.owner, LEASE_SECONDS):
+                    self.lost.set()
+                    return
+            except Exception:
+                logger.exception("Could not renew the %s lease; retrying", LOCK_NAME)
+
+def _started_today(run):
+    """
+    Whether a run started on today's local date, the date dues are generated for. Funds up to its
+    checkpoint have had every period due today; on a later day a new one may have begun for them.
+    """
+    started_at = datetime.strptime(run['Started_At'], '%Y-%m-%d %H:%M:%S').replace(tzinfo=timezone.utc)
+    return started_at.astimezone().date() == datetime.now().date()
+
+def run_dues_generation(interval_types=None, trigger='Manual', batch_size=BATCH_SIZE):
+    """
+    Generates dues for the recurring funds of the given interval types, all by default.
+    Returns (Run_ID, logs created), or (None, 0) if another run holds the lock. If the lease
+    is lost part way, the run stops after the current batch and is left Interrupted to resume.
+    An interrupted run is resumed from its checkpoint only on the day it started; after that
+    every fund is processed again, which only adds the periods that have come due since.
+    """
+    interval_types = sorted(interval_types or INTERVAL_TYPES)
+    owner = f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+    if not db.acquire_job_lock(LOCK_NAME, owner, LEASE_SECONDS):
+        return None, 0
+
+    try:
+        # With the lock held no other run is live, so any run still marked Running was cut short
+        interrupted = db.get_interrupted_dues_run(interval_types)
+        checkpoint = interrupted['Checkpoint_List_ID'] if interrupted and _started_today(interrupted) else 0
+        funds_df = db.get_recurring_funds()
+        list_ids = sorted(int(list_id) for list_id in funds_df.loc[funds_df['Interval_Type'].isin(interval_types), 'List_ID'])
+        pending_ids = [list_id for list_id in list_ids if list_id > checkpoint]
+
+        # Funds up to the checkpoint were processed by the interrupted run
+        run_id = db.start_dues_run(trigger, interval_types, len(list_ids), checkpoint, len(list_ids) - len(pending_ids))
+        if checkpoint:
+            logger.info("Dues run %s resumes run %s after List_ID %s", run_id, interrupted['Run_ID'], checkpoint)
+        elif interrupted:
+            logger.info("Dues run %s redoes run %s from the start, as a new period may have begun since", run_id, interrupted['Run_ID'])
+        started = time.perf_counter()
+        logs_created = 0
+        try:
+            with _LeaseRenewer(owner) as lease:
+                for start in range(0, len(pending_ids), batch_size):
+                    batch = pending_ids[start:start + batch_size]
+                    created = dues_logic.update_recurring_dues(batch)
+                    logs_created += created
+                    db.checkpoint_dues_run(run_id, batch[-1], len(batch), created)
+                    if lease.lost.is_set() or not db.acquire_job_lock(LOCK_NAME, owner, LEASE_SECONDS):
+                        logger.warning("Dues run %s lost the %s lease after List_ID %s; stopping", run_id, LOCK_NAME, batch[-1])
+                        db.finish_dues_run(run_id, 'Interrupted', time.perf_counter() - started, "Lost the job lock")
+                        return run_id, logs_created
+        except Exception as e:
+            logger.exception("Dues run %s failed", run_id)
+            db.finish_dues_run(run_id, 'Failed', time.perf_counter() - started, str(e))
+            raise
+        db.finish_dues_run(run_id, 'Succeeded', time.perf_counter() - started)
+        return run_id, logs_created
+    finally:
+        db.release_job_lock(LOCK_NAME, owner)
+
+class DuesScheduler:
+    """Checks every poll_interval seconds which interval types are due and generates their dues."""
+
+    def __init__(self, poll_interval=POLL_INTERVAL):
+        self.poll_interval = poll_interval
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._manual_requested = False
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="dues-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self, wait=True):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None and wait:
+            self._thread.join()
+
+    def request_run(self):
+        """Runs every interval type on the scheduler thread as soon as possible."""
+        with self._lock:
+            self._manual_requested = True
+        self._wake.set()
+
+    def run_pending(self):
+        with self._lock:
+            manual, self._manual_requested = self._manual_requested, False
+        if manual:
+            return run_dues_generation(INTERVAL_TYPES, 'Manual')
+        interval_types = due_interval_types()
+        if interval_types:
+            return run_dues_generation(interval_types, 'Scheduled')
+        return None, 0
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                with instrumentation.section("Dues Scheduler"):
+                    self.run_pending()
+            except Exception:
+                logger.exception("Dues scheduler poll failed") # Try again on the next poll
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+def get_scheduler():
+    """Returns the process-wide scheduler, starting it on first use."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = DuesScheduler()
+            _scheduler.start()
+        return _scheduler
+
+def start_in_app():
+    """Starts the process-wide scheduler from the app, unless it is configured to run on its own."""
+    if IN_APP:
+        get_scheduler()
+
+def request_run():
+    """Generates every interval type's dues as soon as possible, in the background."""
+    if IN_APP:
+        get_scheduler().request_run()
+    else:
+        threading.Thread(target=run_dues_generation, args=(INTERVAL_TYPES, 'Manual'), name="dues-manual", daemon=True).start()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--once", action="store_true", help="Run whatever is due once and exit")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    db.setup_database()
+    if args.once:
+        run_id, logs_created = DuesScheduler().run_pending()
+        print(f"Run {run_id}: {logs_created} new payment log(s)" if run_id else "Nothing due, or another run holds the lock.")
+        return
+    scheduler = DuesScheduler()
+    scheduler.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        scheduler.stop()
+
+if __name__ == "__main__":
+    main()
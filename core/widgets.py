@@ -0,0 +1,39 @@
+import pyarrow as pa
+import streamlit as st
+
+def paged_dataframe(key, fetch_page, filters=(), columns=None, page_size=50):
+    """
+    Shows a keyset-paginated table with Previous/Next buttons, fetching only the visible page.
+    fetch_page(cursor, page_size) must return (DataFrame or pyarrow.Table, next_cursor), like db.get_ledger_page.
+    The table returns to its first page whenever `filters` changes.
+    """
+    state_key = f"{key}_pages"
+    state = st.session_state.get(state_key)
+    if state is None or state['filters'] != filters:
+        # cursors[i] is the cursor that fetches page i; page 0 starts from the beginning
+        state = {'filters': filters, 'cursors': [None], 'page': 0}
+        st.session_state[state_key] = state
+
+    page_df, next_cursor = fetch_page(state['cursors'][state['page']], page_size)
+    if len(page_df) == 0 and state['page'] == 0:
+        return page_df
+
+    shown = page_df
+    if columns:
+        shown = page_df.select(columns) if isinstance(page_df, pa.Table) else page_df[columns]
+    st.dataframe(shown, width='stretch')
+
+    col1, col2, col3 = st.columns([1, 2, 1])
+    with col1:
+        if st.button("◀ Previous", key=f"{key}_prev", disabled=state['page'] == 0):
+            state['page'] -= 1
+            st.rerun()
+    with col2:
+        st.caption(f"Page {state['page'] + 1}")
+    with col3:
+        if st.button("Next ▶", key=f"{key}_next", disabled=next_cursor is None):
+            del state['cursors'][state['page'] + 1:]
+            state['cursors'].append(next_cursor)
+            state['page'] += 1
+            st.rerun()
+    return page_df
@@ -0,0 +1,30 @@
+import os
+import sys
+import tempfile
+
+# config.py is local to each deployment and not in the repository; give core a throwaway one.
+# It is a real module on sys.path so spawned worker processes can import it too.
+if 'config' not in sys.modules:
+    config_dir = tempfile.mkdtemp()
+    with open(os.path.join(config_dir, "config.py"), "w") as f:
+        f.write(f"DB_FILE = {os.path.join(config_dir, 'society.db')!r}\n"
+                "SOCIETY_VPA = 'society@upi'\n"
+                "SOCIETY_NAME = 'Test Society'\n")
+    sys.path.insert(0, config_dir)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from core import db
+
+@pytest.fixture
+def fund(tmp_path):
+    db.configure_database(str(tmp_path / "society.db"))
+    db.setup_database()
+    with db.db_connection() as conn:
+        conn.execute("INSERT INTO Users (Username, PasswordHash, Role, PhoneNumber) VALUES ('member', 'x', 'Member', '+911')")
+        conn.commit()
+        user_id = conn.execute("SELECT User_ID FROM Users WHERE Username = 'member'").fetchone()[0]
+    db.create_fund("F", 100.0, "Monthly", "2026-08-16", None)
+    list_id = int(db.get_fund_options()['List_ID'].iloc[0])
+    return user_id, list_id
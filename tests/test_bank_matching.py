@@ -0,0 +1,53 @@
+import io
+from core import db
+
+def _import(lines):
+    statement = io.StringIO("Txn,Amount\n" + "".join(f"{txn_id},{amount}\n" for txn_id, amount in lines))
+    return db.import_bank_statement(statement, "Txn", "Amount")
+
+def _log(user_id, list_id, due_date):
+    db.create_payment_log(user_id, list_id, 100.0, due_date, "Unpaid")
+    with db.db_connection() as conn:
+        return conn.execute("SELECT Log_ID FROM Payment_Logs WHERE DueDate = ?", (due_date,)).fetchone()[0]
+
+def _status(log_id):
+    with db.db_connection() as conn:
+        return conn.execute("SELECT Status FROM Payment_Logs WHERE Log_ID = ?", (log_id,)).fetchone()[0]
+
+def test_statement_line_settles_only_one_log(fund):
+    user_id, list_id = fund
+    first = _log(user_id, list_id, "2026-08-16")
+    second = _log(user_id, list_id, "2026-09-16")
+    _import([("TXN1", 100.0)])
+
+    db.submit_transaction_for_verification(first, "TXN1")
+    db.submit_transaction_for_verification(second, "TXN1")
+    assert _status(first) == 'Paid'
+    assert _status(second) == 'Rejected'
+
+def test_cleared_ids_do_not_free_a_matched_line(fund):
+    user_id, list_id = fund
+    first = _log(user_id, list_id, "2026-08-16")
+    second = _log(user_id, list_id, "2026-09-16")
+    _import([("TXN1", 100.0)])
+    db.submit_transaction_for_verification(first, "TXN1")
+    db.clear_verified_transactions()
+
+    db.submit_transaction_for_verification(second, "TXN1")
+    assert _status(second) == 'Rejected'
+    with db.db_connection() as conn:
+        assert conn.execute("SELECT Matched_Log_ID FROM Bank_Transactions WHERE Transaction_ID = 'TXN1'").fetchone()[0] == first
+
+def test_one_run_gives_a_shared_line_to_the_earliest_submission(fund):
+    user_id, list_id = fund
+    first = _log(user_id, list_id, "2026-08-16")
+    second = _log(user_id, list_id, "2026-09-16")
+    db.submit_transaction_for_verification(first, "TXN1")
+    db.submit_transaction_for_verification(second, "TXN1")
+    _import([("TXN1", 100.0)])
+
+    success, found, rejected, error = db.match_bank_transactions()
+    assert success and error is None
+    assert [row['Transaction ID'] for row in found] == ["TXN1"]
+    assert rejected[0]['Reason'] == "Transaction ID already used for another payment"
+    assert (_status(first), _status(second)) == ('Paid', 'Rejected')
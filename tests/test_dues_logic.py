@@ -0,0 +1,99 @@
+from datetime import date
+import numpy as np
+import pytest
+from core import db, dues_logic
+
+def _member(name, list_id):
+    with db.db_connection() as conn:
+        c = conn.cursor()
+        c.execute("INSERT INTO Users (Username, PasswordHash, Role, PhoneNumber) VALUES (?, 'x', 'Member', ?)", (name, f"+91{name}"))
+        user_id = c.lastrowid
+        c.execute("INSERT INTO Memberships (User_ID, List_ID) VALUES (?, ?)", (user_id, list_id))
+        conn.commit()
+        return user_id
+
+def test_recurring_dues_match_the_per_member_rules(fund):
+    _, list_id = fund # Monthly, ₹100
+    latest_logs = {
+        'paid': (100.0, "2026-08-16", "Paid"),
+        'unpaid': (150.0, "2026-09-16", "Unpaid"),
+        'rejected': (100.0, "2026-09-16", "Rejected"),
+        'pending': (100.0, "2026-09-16", "Pending Verification"),
+        'behind': (100.0, "2026-05-16", "Unpaid"),
+        'current': (100.0, "2026-10-16", "Paid"),
+    }
+    users = {}
+    for name, (amount, due_date, status) in latest_logs.items():
+        users[name] = _member(name, list_id)
+        db.create_payment_log(users[name], list_id, 100.0, "2026-04-16", "Paid") # Older history is ignored
+        db.create_payment_log(users[name], list_id, amount, due_date, status)
+
+    new_logs = dues_logic.compute_recurring_dues(db.get_latest_recurring_payment_logs(), date(2026, 10, 20))
+
+    expected = [
+        ('paid', 100.0, "2026-09-16"), ('paid', 200.0, "2026-10-16"),
+        ('unpaid', 250.0, "2026-10-16"),
+        ('rejected', 200.0, "2026-10-16"),
+        ('pending', 100.0, "2026-10-16"),
+        ('behind', 200.0, "2026-06-16"), ('behind', 300.0, "2026-07-16"), ('behind', 400.0, "2026-08-16"),
+        ('behind', 500.0, "2026-09-16"), ('behind', 600.0, "2026-10-16"),
+    ]
+    assert sorted(new_logs) == sorted((users[name], list_id, amount, due_date, 'Unpaid') for name, amount, due_date in expected)
+
+def _stepped_schedule(start, interval_type, today):
+    """The due dates the per-member loop produced, one relativedelta step at a time."""
+    schedule = []
+    due_date = dues_logic.get_next_due_date(date.fromisoformat(start), interval_type)
+    while due_date <= today:
+        schedule.append(due_date.isoformat())
+        due_date = dues_logic.get_next_due_date(due_date, interval_type)
+    return schedule
+
+MONTH_END_STARTS = ["2024-01-31", "2024-01-30", "2024-02-29", "2023-02-28", "2024-03-31", "2024-05-31",
+                    "2024-08-31", "2024-11-30", "2024-12-31", "2025-01-29", "2024-01-15"]
+
+@pytest.mark.parametrize("interval_type", ['Weekly', 'Monthly', 'Quarterly', 'Yearly'])
+@pytest.mark.parametrize("start", MONTH_END_STARTS)
+def test_due_date_schedule_matches_relativedelta(start, interval_type):
+    today = date(2032, 3, 30)
+    schedules = dues_logic.due_date_schedules([(start, interval_type)], today)
+    assert schedules[(start, interval_type)] == _stepped_schedule(start, interval_type, today)
+
+def test_due_date_schedules_computed_together_do_not_affect_each_other():
+    # A short month in one schedule must not clamp the day of the next one
+    starts = [(start, interval_type) for start in MONTH_END_STARTS for interval_type in ['Monthly', 'Quarterly', 'Yearly']]
+    today = date(2030, 2, 28)
+    schedules = dues_logic.due_date_schedules(starts, today)
+    assert schedules == {start: _stepped_schedule(*start, today) for start in starts}
+
+def test_due_date_schedule_is_empty_before_the_next_period():
+    assert dues_logic.due_date_schedules([("2026-10-16", 'Monthly')], date(2026, 11, 15)) == {("2026-10-16", 'Monthly'): []}
+
+@pytest.mark.parametrize("carried_amount", [0.0, 100.0, 0.1, 1234.56, 333.33])
+@pytest.mark.parametrize("fund_amount", [100.0, 0.1, 33.33, 99.99, 1499.5])
+def test_compounded_arrears_match_compounding_period_by_period(carried_amount, fund_amount):
+    # The per-member loop added the fund amount to the previous log's amount once per period
+    expected, amount = [], carried_amount
+    for _ in range(120):
+        amount = amount + fund_amount
+        expected.append(round(amount, 2))
+
+    periods = np.arange(1, 121)
+    assert dues_logic.compounded_arrears(carried_amount, fund_amount, periods).tolist() == expected
+    # Element-wise over many members at once, as compute_recurring_dues calls it
+    carried = np.full(len(periods), carried_amount)
+    assert dues_logic.compounded_arrears(carried, np.full(len(periods), fund_amount), periods).tolist() == expected
+
+def test_parallel_dues_match_serial():
+    latest_logs = [
+        {'User_ID': user_id, 'List_ID': list_id, 'Amount': 100.0 + user_id, 'Status': status, 'DueDate': due_date,
+         'FundAmount': 100.0 * list_id, 'Interval_Type': interval_type}
+        for list_id, interval_type in enumerate(['Weekly', 'Monthly', 'Quarterly', 'Yearly'], start=1)
+        for user_id, (status, due_date) in enumerate([('Paid', "2025-01-31"), ('Unpaid', "2024-02-29"),
+                                                      ('Rejected', "2026-03-31"), ('Pending Verification', "2026-10-01")])
+    ]
+    today = date(2026, 10, 20)
+    serial = dues_logic.compute_recurring_dues(latest_logs, today)
+    assert len(serial) > len(latest_logs)
+    # Called directly, so PARALLEL_THRESHOLD does not apply; the chunks really go to spawned workers
+    assert dues_logic.compute_recurring_dues_parallel(latest_logs, today, workers=2) == serial
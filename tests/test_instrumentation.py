@@ -0,0 +1,34 @@
+import sqlite3
+import pytest
+from core import instrumentation
+
+@pytest.fixture
+def conn(monkeypatch):
+    monkeypatch.setattr(instrumentation, 'SLOW_QUERY_MS', 0) # Log every statement
+    conn = sqlite3.connect(":memory:", factory=instrumentation.InstrumentedConnection)
+    conn.execute("CREATE TABLE t (x INTEGER)")
+    instrumentation.reset()
+    yield conn
+    conn.close()
+    instrumentation.reset()
+
+def test_slow_query_plan_is_not_itself_counted_or_logged(conn, monkeypatch):
+    explained = []
+    execute = instrumentation.InstrumentedCursor.execute
+    def spy(self, sql, parameters=()):
+        explained.append(sql)
+        return execute(self, sql, parameters)
+    monkeypatch.setattr(instrumentation.InstrumentedCursor, 'execute', spy)
+
+    conn.execute("SELECT x FROM t WHERE x = ?", (1,)).fetchall()
+    assert explained == ["SELECT x FROM t WHERE x = ?"]
+    [stats] = instrumentation.function_stats()
+    assert stats['statements'] == 1
+    [entry] = instrumentation.slow_queries()
+    assert entry['plan'] == ["SCAN t"]
+
+@pytest.mark.parametrize("sql", ["", "   ", "\n"])
+def test_slow_query_log_accepts_blank_sql(conn, sql):
+    conn.execute(sql)
+    [entry] = instrumentation.slow_queries()
+    assert entry['plan'] == []
@@ -0,0 +1,144 @@
+import socket
+import threading
+import time
+import pytest
+from core import db, notifications
+
+aiosmtpd_controller = pytest.importorskip("aiosmtpd.controller")
+
+class RecordingHandler:
+    def __init__(self):
+        self.messages = []
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages.append(envelope)
+        return '250 OK'
+
+class FakeWhatsApp:
+    """Records every send; recipients in fail_times fail that many times first."""
+
+    def __init__(self, fail_times=None):
+        self.fail_times = dict(fail_times or {})
+        self.attempts = []
+        self.sent = []
+        self._lock = threading.Lock()
+
+    def send(self, message):
+        with self._lock:
+            self.attempts.append((message['Recipient'], time.monotonic()))
+            if self.fail_times.get(message['Recipient'], 0) > 0:
+                self.fail_times[message['Recipient']] -= 1
+                raise RuntimeError("WhatsApp is not running")
+            self.sent.append(message['Recipient'])
+
+    def close(self):
+        pass
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def _wait_until(condition, timeout=15):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return
+        time.sleep(0.05)
+    raise AssertionError("timed out waiting for the dispatcher")
+
+def _progress(batch_id):
+    progress_df = db.get_outbox_progress(batch_id)
+    return {(row.Channel, row.Status): row.Messages for row in progress_df.itertuples()}
+
+@pytest.fixture
+def smtp_server(fund):
+    handler = RecordingHandler()
+    controller = aiosmtpd_controller.Controller(handler, hostname='127.0.0.1', port=_free_port())
+    controller.start()
+    db.set_setting("smtp_server", '127.0.0.1')
+    db.set_setting("smtp_port", str(controller.port))
+    yield handler
+    controller.stop()
+
+@pytest.fixture
+def dispatch(monkeypatch):
+    monkeypatch.setattr(notifications, 'RETRY_BACKOFF', 2)
+    monkeypatch.setattr(notifications, 'MAX_ATTEMPTS', 2)
+    dispatchers = []
+
+    def start(whatsapp):
+        dispatcher = notifications.NotificationDispatcher(
+            transports={'whatsapp': whatsapp, 'email': notifications.SmtpTransport()},
+            policies={'whatsapp': notifications.ChannelPolicy(concurrency=1, per_second=100),
+                      'email': notifications.ChannelPolicy(concurrency=2, per_second=100)},
+            poll_interval=0.1)
+        dispatcher.start()
+        dispatchers.append(dispatcher)
+        return dispatcher
+    yield start
+    for dispatcher in dispatchers:
+        dispatcher.stop()
+
+def _reminders(user_id, list_id, phone_numbers):
+    return [{'Log_ID': log_id, 'User_ID': user_id, 'List_ID': list_id, 'PhoneNumber': phone_number, 'Username': 'member',
+             'Amount': 100.0, 'ListName': 'F', 'Email': f"member{log_id}@example.com"}
+            for log_id, phone_number in enumerate(phone_numbers, start=1)]
+
+def _enqueue(messages):
+    success, queued, error_message = db.enqueue_notifications("batch", messages)
+    assert success, error_message
+    return queued
+
+def test_dispatcher_sends_retries_and_gives_up(fund, smtp_server, dispatch):
+    user_id, list_id = fund
+    whatsapp = FakeWhatsApp(fail_times={'+912': 1, '+913': 99})
+    messages = notifications.build_reminder_messages(_reminders(user_id, list_id, ['+911', '+912', '+913']))
+    assert _enqueue(messages) == 6
+    dispatch(whatsapp)
+
+    _wait_until(lambda: _progress("batch") == {('email', 'Sent'): 3, ('whatsapp', 'Sent'): 2, ('whatsapp', 'Failed'): 1})
+    assert len(smtp_server.messages) == 3
+    assert sorted(envelope.rcpt_tos[0] for envelope in smtp_server.messages) == [f"member{i}@example.com" for i in (1, 2, 3)]
+    assert sorted(whatsapp.sent) == ['+911', '+912']
+
+    # The retry waited out the backoff, and the hopeless message stopped after MAX_ATTEMPTS
+    retried = [at for recipient, at in whatsapp.attempts if recipient == '+912']
+    assert len(retried) == 2 and retried[1] - retried[0] >= 1
+    assert [recipient for recipient, _ in whatsapp.attempts].count('+913') == 2
+    failures_df = db.get_outbox_failures("batch")
+    assert failures_df[['Recipient', 'Attempts', 'Last_Error']].values.tolist() == [['+913', 2, "WhatsApp is not running"]]
+
+def test_enqueueing_the_same_reminders_again_sends_nothing_more(fund, smtp_server, dispatch):
+    user_id, list_id = fund
+    whatsapp = FakeWhatsApp()
+    messages = notifications.build_reminder_messages(_reminders(user_id, list_id, ['+911', '+912']))
+    assert _enqueue(messages) == 4
+    dispatch(whatsapp)
+    _wait_until(lambda: _progress("batch") == {('email', 'Sent'): 2, ('whatsapp', 'Sent'): 2})
+
+    assert _enqueue(notifications.build_reminder_messages(_reminders(user_id, list_id, ['+911', '+912']))) == 0
+    time.sleep(0.5)
+    assert len(smtp_server.messages) == 2
+    assert sorted(whatsapp.sent) == ['+911', '+912']
+
+def test_message_whose_outcome_was_not_recorded_is_sent_again(fund, smtp_server, dispatch, monkeypatch):
+    user_id, list_id = fund
+    monkeypatch.setattr(notifications, 'SENDING_TIMEOUT', 2)
+    monkeypatch.setattr(notifications, 'STALE_CHECK_INTERVAL', 0.2)
+    mark_outbox_sent = db.mark_outbox_sent
+    calls = []
+
+    def locked_once(outbox_id):
+        calls.append(outbox_id)
+        if len(calls) == 1:
+            raise RuntimeError("database is locked")
+        mark_outbox_sent(outbox_id)
+    monkeypatch.setattr(db, 'mark_outbox_sent', locked_once)
+
+    whatsapp = FakeWhatsApp()
+    assert _enqueue(notifications.build_reminder_messages(_reminders(user_id, list_id, ['+911']), email_enabled=False)) == 1
+    dispatcher = dispatch(whatsapp)
+    _wait_until(lambda: _progress("batch") == {('whatsapp', 'Sent'): 1})
+    assert whatsapp.sent == ['+911', '+911']
+    assert dispatcher.is_alive()
@@ -0,0 +1,21 @@
+from core import db
+
+def test_digest_counts_rejected_logs_in_the_run(fund):
+    user_id, list_id = fund
+    # August was still pending when September was generated, so September did not carry it; then it was rejected
+    db.create_payment_log(user_id, list_id, 100.0, "2026-08-16", "Rejected")
+    db.create_payment_log(user_id, list_id, 100.0, "2026-09-16", "Unpaid")
+
+    digest = db.get_reminder_digests().iloc[0]
+    assert digest['Total_Amount'] == 200.0
+    assert digest['Periods'] == 2
+    assert digest['Fund_Lines'] == "F: ₹200.00 (2 periods, since 2026-08-16)"
+
+def test_digest_owes_only_the_latest_compounded_log(fund):
+    user_id, list_id = fund
+    db.create_payment_log(user_id, list_id, 100.0, "2026-08-16", "Rejected")
+    db.create_payment_log(user_id, list_id, 200.0, "2026-09-16", "Unpaid")
+
+    digest = db.get_reminder_digests().iloc[0]
+    assert digest['Total_Amount'] == 200.0
+    assert digest['Periods'] == 2
@@ -0,0 +1,46 @@
+from core import db, scheduler
+
+def _interrupted_run(checkpoint_list_id, started_days_ago):
+    run_id = db.start_dues_run('Scheduled', ['Monthly'], 2, 0)
+    db.checkpoint_dues_run(run_id, checkpoint_list_id, 1, 0)
+    with db.db_connection() as conn:
+        conn.execute("UPDATE Dues_Runs SET Status = 'Interrupted', Started_At = datetime('now', ?) WHERE Run_ID = ?",
+                     (f"-{started_days_ago} days", run_id))
+        conn.commit()
+
+def _log_counts():
+    with db.db_connection() as conn:
+        return dict(conn.execute("SELECT List_ID, COUNT(*) FROM Payment_Logs GROUP BY List_ID").fetchall())
+
+def _two_enrolled_funds(fund):
+    _, first_id = fund
+    db.create_fund("G", 50.0, "Monthly", "2026-08-16", None)
+    second_id = int(db.get_fund_options().set_index('ListName').loc['G', 'List_ID'])
+    for list_id in (first_id, second_id):
+        db.bulk_enroll_members(list_id, ['+911'])
+    return first_id, second_id
+
+def test_resume_on_the_same_day_skips_funds_up_to_the_checkpoint(fund):
+    first_id, second_id = _two_enrolled_funds(fund)
+    _interrupted_run(first_id, started_days_ago=0)
+
+    run_id, _ = scheduler.run_dues_generation(['Monthly'])
+    counts = _log_counts()
+    assert counts[first_id] == 1 # Taken as done by the interrupted run
+    assert counts[second_id] > 1
+    run = db.get_dues_runs().set_index('Run_ID').loc[run_id]
+    assert (run['Status'], run['Funds_Processed'], run['Funds_Total']) == ('Succeeded', 2, 2)
+
+def test_resume_on_a_later_day_processes_every_fund_again(fund):
+    first_id, second_id = _two_enrolled_funds(fund)
+    _interrupted_run(first_id, started_days_ago=2)
+
+    run_id, _ = scheduler.run_dues_generation(['Monthly'])
+    counts = _log_counts()
+    assert counts[first_id] == counts[second_id] > 1
+    run = db.get_dues_runs().set_index('Run_ID').loc[run_id]
+    assert (run['Status'], run['Funds_Processed'], run['Funds_Total']) == ('Succeeded', 2, 2)
+
+    # Running again the same day adds nothing
+    assert scheduler.run_dues_generation(['Monthly'])[1] == 0
+    assert _log_counts() == counts